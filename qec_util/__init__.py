@@ -1,4 +1,5 @@
 from . import (
+    cache,
     circuits,
     data_processing,
     dem_instrs,
@@ -21,4 +22,5 @@ __all__ = [
     "threshold",
     "mod2",
     "samplers",
+    "cache",
 ]
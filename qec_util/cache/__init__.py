@@ -0,0 +1,3 @@
+from .cache import DemCache
+
+__all__ = ["DemCache"]
@@ -0,0 +1,211 @@
+import functools
+import hashlib
+import inspect
+import os
+import pathlib
+import pickle
+import tempfile
+from collections import OrderedDict
+from collections.abc import Callable
+
+import numpy as np
+import stim
+
+from ..dems import DemArrays
+
+SUFFIX = ".pkl"
+DEM_ARRAYS_BUFFERS = [
+    "probs",
+    "dets",
+    "det_ptr",
+    "obs",
+    "obs_ptr",
+    "sep_dets",
+    "sep_obs",
+    "sep_ptr",
+]
+
+
+class DemCache:
+    """Memoization cache for functions whose arguments are DEMs, e.g.
+    ``get_circuit_distance`` or ``decomposed_graphlike_dem``.
+
+    The outputs are stored in an in-memory LRU cache and, optionally, in
+    a directory so that they can be reused in other sessions or jobs.
+    The cache is keyed by a hash of the name of the function and the type and
+    content of its arguments, in which DEMs and circuits are represented by
+    their text, and ``DemArrays`` and numpy arrays by their buffers.
+
+    Parameters
+    ----------
+    maxsize
+        Maximum number of outputs to store in memory. By default ``128``.
+    cache_dir
+        Directory in which to store the outputs. By default ``None``,
+        which does not store them on disk.
+    max_disk_size
+        Maximum size of the files in ``cache_dir``, in bytes. When the size is
+        exceeded, the least recently used files are deleted. By default ``2**30``.
+
+    Notes
+    -----
+    The outputs must be picklable. Each call to a cached function returns
+    a new copy of the output, so that modifying it does not modify the cache.
+
+    The rest of arguments are represented by their ``repr``,
+    thus arguments whose ``repr`` depends on their memory address (e.g. lambdas)
+    are not cached across sessions.
+
+    For example, ``DemCache(cache_dir="cache")(get_circuit_distance)`` returns
+    a version of ``get_circuit_distance`` whose outputs are stored in ``"cache"``.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        cache_dir: str | pathlib.Path | None = None,
+        max_disk_size: int = 2**30,
+    ):
+        if not isinstance(maxsize, int):
+            raise TypeError(f"'maxsize' must be an int, but {type(maxsize)} was given.")
+        if maxsize < 0:
+            raise ValueError(
+                f"'maxsize' must be non-negative, but {maxsize} was given."
+            )
+        if not isinstance(cache_dir, (str, pathlib.Path, type(None))):
+            raise TypeError(
+                "'cache_dir' must be a str or pathlib.Path, "
+                f"but {type(cache_dir)} was given."
+            )
+        if not isinstance(max_disk_size, int):
+            raise TypeError(
+                f"'max_disk_size' must be an int, but {type(max_disk_size)} was given."
+            )
+
+        self.maxsize = maxsize
+        self.cache_dir = None if cache_dir is None else pathlib.Path(cache_dir)
+        self.max_disk_size = max_disk_size
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        return
+
+    def __call__(self, func: Callable) -> Callable:
+        """Returns the cached version of the given function."""
+        if not callable(func):
+            raise TypeError(f"'func' must be callable, but {type(func)} was given.")
+
+        signature = inspect.signature(func)
+        name = f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def cached_func(*args, **kargs):
+            bound = signature.bind(*args, **kargs)
+            bound.apply_defaults()
+            key = _cache_key(name, bound.arguments)
+
+            data = self._load(key)
+            if data is None:
+                data = pickle.dumps(func(*args, **kargs))
+                self._store(key, data)
+            return pickle.loads(data)
+
+        return cached_func
+
+    def clear(self):
+        """Removes all the outputs stored in memory and in ``cache_dir``."""
+        self._memory.clear()
+        for file in self._files():
+            file.unlink(missing_ok=True)
+        return
+
+    def _files(self) -> list[pathlib.Path]:
+        if self.cache_dir is None:
+            return []
+        return list(self.cache_dir.glob(f"*{SUFFIX}"))
+
+    def _load(self, key: str) -> bytes | None:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if self.cache_dir is None:
+            return None
+
+        file = self.cache_dir / (key + SUFFIX)
+        try:
+            data = file.read_bytes()
+            os.utime(file)  # used for the least-recently-used eviction
+        except FileNotFoundError:
+            return None
+        self._store_memory(key, data)
+        return data
+
+    def _store(self, key: str, data: bytes):
+        self._store_memory(key, data)
+        if self.cache_dir is None or len(data) > self.max_disk_size:
+            return
+
+        # the file is written atomically so that other processes do not
+        # read incomplete files.
+        with tempfile.NamedTemporaryFile(
+            dir=self.cache_dir, suffix=".tmp", delete=False
+        ) as file:
+            file.write(data)
+        os.replace(file.name, self.cache_dir / (key + SUFFIX))
+        self._evict()
+        return
+
+    def _store_memory(self, key: str, data: bytes):
+        if self.maxsize == 0:
+            return
+        self._memory[key] = data
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+        return
+
+    def _evict(self):
+        files = []
+        for file in self._files():
+            try:
+                stat = file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, file))
+
+        size = sum(f[1] for f in files)
+        for _, file_size, file in sorted(files, key=lambda f: f[0]):
+            if size <= self.max_disk_size:
+                break
+            file.unlink(missing_ok=True)
+            size -= file_size
+        return
+
+
+def _cache_key(name: str, arguments: dict[str, object]) -> str:
+    """Returns the hash of the function name and its arguments.
+    The type of each argument is part of the key, so that e.g. a DEM and its
+    ``DemArrays`` do not share outputs."""
+    hasher = hashlib.sha256(name.encode())
+    for arg_name, value in arguments.items():
+        arg_type = f"{type(value).__module__}.{type(value).__qualname__}"
+        hasher.update(f"\n{arg_name}:{arg_type}=".encode())
+        _update_hash(hasher, value)
+    return hasher.hexdigest()
+
+
+def _update_hash(hasher, value: object):
+    """Updates the hash with the content of the given value."""
+    if isinstance(value, np.ndarray):
+        # the 'repr' of large arrays is truncated.
+        hasher.update(f"{value.dtype.str}{value.shape}".encode())
+        hasher.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, DemArrays):
+        for buffer in DEM_ARRAYS_BUFFERS:
+            _update_hash(hasher, getattr(value, buffer))
+        _update_hash(hasher, value.attributes)
+    elif isinstance(value, (stim.DetectorErrorModel, stim.Circuit)):
+        hasher.update(str(value).encode())
+    else:
+        hasher.update(repr(value).encode())
+    return
@@ -1,3 +1,4 @@
+from .circuit_record_index import CircuitRecordIndex
 from .circuits import (
     format_rec_targets,
     format_to_rec_targets,
@@ -13,6 +14,7 @@ from .circuits import (
 )
 
 __all__ = [
+    "CircuitRecordIndex",
     "remove_gauge_detectors",
     "remove_detectors",
     "observables_to_detectors",
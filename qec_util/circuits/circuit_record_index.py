@@ -0,0 +1,113 @@
+from bisect import bisect_left
+from itertools import accumulate
+
+import stim
+
+# measurement instructions in which each target corresponds to one measurement
+# of a single qubit.
+SQ_MEAS_INSTRS = ["M", "MX", "MY", "MZ", "MR", "MRX", "MRY", "MRZ"]
+
+
+class CircuitRecordIndex:
+    """Index of the measurement and detector records of a (flattened) circuit.
+
+    It precomputes in a single pass the number of measurements and detectors
+    before each instruction and the measurement history of each qubit, so
+    that the ``rec[-k]`` bookkeeping (e.g. shifting the ``rec[-k]`` targets
+    when moving an instruction) does not require to iterate over the circuit.
+
+    Parameters
+    ----------
+    circuit
+        Stim circuit. It is flattened, and the instruction indices used in
+        the methods correspond to the instructions in ``self.circuit``.
+
+    Notes
+    -----
+    The measurements that are not of the type ``SQ_MEAS_INSTRS`` (e.g. ``MPP``,
+    ``MZZ`` or heralds) are not associated with any qubit, and their qubit
+    is set to ``-1``.
+    """
+
+    def __init__(self, circuit: stim.Circuit):
+        if not isinstance(circuit, stim.Circuit):
+            raise TypeError(
+                f"'circuit' must be a stim.Circuit, but {type(circuit)} was given."
+            )
+
+        self.circuit = circuit.flattened()
+
+        num_meas, num_dets = [], []
+        meas_qubits: list[int] = []
+        qubit_meas_inds: list[int] = []
+        histories: dict[int, list[int]] = {}
+        for instr in self.circuit:
+            num_meas.append(instr.num_measurements)
+            num_dets.append(int(instr.name == "DETECTOR"))
+            if instr.num_measurements == 0:
+                continue
+
+            if instr.name not in SQ_MEAS_INSTRS:
+                meas_qubits += [-1] * instr.num_measurements
+                qubit_meas_inds += [-1] * instr.num_measurements
+                continue
+
+            for t in instr.targets_copy():
+                history = histories.setdefault(t.value, [])
+                meas_qubits.append(t.value)
+                qubit_meas_inds.append(len(history))
+                history.append(len(meas_qubits) - 1)
+
+        # plain lists are faster than numpy arrays for single-element queries.
+        self._meas_prefix = list(accumulate(num_meas, initial=0))
+        self._det_prefix = list(accumulate(num_dets, initial=0))
+        self.meas_qubits = meas_qubits
+        self.qubit_meas_inds = qubit_meas_inds
+        self.histories = histories
+        return
+
+    def __len__(self) -> int:
+        return len(self.circuit)
+
+    @property
+    def num_measurements(self) -> int:
+        return self._meas_prefix[-1]
+
+    @property
+    def num_detectors(self) -> int:
+        return self._det_prefix[-1]
+
+    def num_measurements_before(self, instr_ind: int) -> int:
+        """Returns the number of measurements before the given instruction."""
+        return self._meas_prefix[instr_ind]
+
+    def num_measurements_after(self, instr_ind: int) -> int:
+        """Returns the number of measurements in the given instruction and
+        in the ones after it."""
+        return self._meas_prefix[-1] - self._meas_prefix[instr_ind]
+
+    def num_measurements_between(self, start: int, stop: int) -> int:
+        """Returns the number of measurements in the instructions
+        ``self.circuit[start:stop]``."""
+        return self._meas_prefix[stop] - self._meas_prefix[start]
+
+    def num_detectors_before(self, instr_ind: int) -> int:
+        """Returns the number of detectors before the given instruction, which
+        corresponds to the index of the detector if the instruction is one."""
+        return self._det_prefix[instr_ind]
+
+    def measurement_index(self, instr_ind: int, rec: int) -> int:
+        """Returns the (absolute) index of the measurement referred by the
+        ``rec[rec]`` target in the given instruction."""
+        return self._meas_prefix[instr_ind] + rec
+
+    def qubit_measurement(self, meas_ind: int) -> tuple[int, int]:
+        """Returns the qubit of the given (absolute) measurement index and
+        the index of this measurement among the measurements of the qubit."""
+        return self.meas_qubits[meas_ind], self.qubit_meas_inds[meas_ind]
+
+    def num_qubit_measurements_before(self, qubit: int, instr_ind: int) -> int:
+        """Returns the number of measurements of the given qubit before the
+        given instruction."""
+        history = self.histories.get(qubit, [])
+        return bisect_left(history, self._meas_prefix[instr_ind])
@@ -2,6 +2,8 @@ from collections.abc import Sequence
 
 import stim
 
+from .circuit_record_index import CircuitRecordIndex
+
 SQ_MEASUREMENTS = ["M", "MX", "MY", "MZ"]
 SQ_RESETS = ["R", "RX", "RY", "RZ"]
 ANNOTATIONS = [
@@ -96,24 +98,19 @@ STIM_INSTRS = (
 def move_first_resets_to_beginning(circuit: stim.Circuit) -> stim.Circuit:
     """Moves (backwards in time) the first resets for each qubit to appear
     as the first (layer of) operations in the circuit.
-    This is a workaround for issue 971 in Stim."""
+    This is a workaround for issue 971 in Stim.
+
+    The ``REPEAT`` blocks are not flattened. A block is only split into its
+    first iteration and the remaining ones if the first iteration contains
+    the first reset of a qubit."""
     if not isinstance(circuit, stim.Circuit):
         raise TypeError(
             f"'circuit' must be a stim.Circuit, but {type(circuit)} was given."
         )
-    circuit = circuit.flattened()
 
-    resets: dict[int, None | str] = {i: None for i in range(circuit.num_qubits)}
-    for instr in circuit[::-1]:
-        # avoid annotations, noise channels, and identity,
-        # as they do not count as "physical operation".
-        if instr.name in ANNOTATIONS + NOISE_CHANNELS + ["I"]:
-            continue
-        name = instr.name if instr.name in SQ_RESETS else None
-        for q in instr.targets_copy():
-            if q.value < 0:  # corresponds to a rec[-k] from e.g. a detector definition
-                break
-            resets[q.value] = name
+    first_ops: dict[int, None | str] = {}
+    _get_first_operations(circuit, first_ops)
+    resets = {i: first_ops.get(i) for i in range(circuit.num_qubits)}
 
     if any(r is None for r in resets.values()):
         raise ValueError(
@@ -135,10 +132,62 @@ def move_first_resets_to_beginning(circuit: stim.Circuit) -> stim.Circuit:
         new_circuit.append(new_instr)
 
     # add remaining operations.
-    # remove noise before the reset.
-    # keep ordering of noise as it is important for e.g. DEPOLARIZE2.
     missing_qubits = set(range(circuit.num_qubits))
+    new_circuit += _remove_ops_before_resets(circuit, missing_qubits)
+
+    return new_circuit
+
+
+def _get_first_operations(circuit: stim.Circuit, first_ops: dict[int, None | str]):
+    """Stores in ``first_ops`` the first operation of each qubit, which is
+    the name of the reset or ``None`` if it is not a reset."""
+    for instr in circuit:
+        if isinstance(instr, stim.CircuitRepeatBlock):
+            # the first iteration already contains the first operations.
+            _get_first_operations(instr.body_copy(), first_ops)
+            continue
+        # avoid annotations, noise channels, and identity,
+        # as they do not count as "physical operation".
+        if instr.name in ANNOTATIONS + NOISE_CHANNELS + ["I"]:
+            continue
+        name = instr.name if instr.name in SQ_RESETS else None
+        for q in instr.targets_copy():
+            if q.value < 0:  # corresponds to a rec[-k] from e.g. a detector definition
+                break
+            first_ops.setdefault(q.value, name)
+    return
+
+
+def _remove_ops_before_resets(
+    circuit: stim.Circuit, missing_qubits: set[int]
+) -> stim.Circuit:
+    """Returns the circuit without the resets, noise channels and identities
+    acting on ``missing_qubits`` before their first reset. It updates
+    ``missing_qubits`` by removing the qubits that have been reset."""
+    new_circuit = stim.Circuit()
     for instr in circuit:
+        if isinstance(instr, stim.CircuitRepeatBlock):
+            body, reps = instr.body_copy(), instr.repeat_count
+            if not missing_qubits:
+                new_circuit.append(instr)
+                continue
+
+            prev_missing_qubits = set(missing_qubits)
+            new_body = _remove_ops_before_resets(body, missing_qubits)
+            if missing_qubits == prev_missing_qubits:
+                # all iterations are modified in the same way
+                new_circuit += _repeat(new_body, reps, instr.tag)
+                continue
+
+            # the qubits reset in the first iteration are not missing anymore,
+            # thus the remaining iterations are modified in the same way.
+            new_circuit += new_body
+            new_body = _remove_ops_before_resets(body, missing_qubits)
+            new_circuit += _repeat(new_body, reps - 1, instr.tag)
+            continue
+
+        # remove noise before the reset.
+        # keep ordering of noise as it is important for e.g. DEPOLARIZE2.
         if instr.name not in SQ_RESETS + NOISE_CHANNELS + ["I"]:
             new_circuit.append(instr)
             continue
@@ -149,7 +198,9 @@ def move_first_resets_to_beginning(circuit: stim.Circuit) -> stim.Circuit:
         new_targets = [t for t in instr.targets_copy() if t.value not in missing_qubits]
         if new_targets:
             new_instr = stim.CircuitInstruction(
-                name=instr.name, targets=new_targets, gate_args=instr.gate_args_copy()
+                name=instr.name,
+                targets=new_targets,
+                gate_args=instr.gate_args_copy(),
             )
             new_circuit.append(new_instr)
 
@@ -159,8 +210,22 @@ def move_first_resets_to_beginning(circuit: stim.Circuit) -> stim.Circuit:
     return new_circuit
 
 
+def _repeat(body: stim.Circuit, repeat_count: int, tag: str = "") -> stim.Circuit:
+    """Returns the circuit corresponding to ``body`` repeated ``repeat_count``
+    times, using a ``REPEAT`` block if needed."""
+    if repeat_count == 0 or len(body) == 0:
+        return stim.Circuit()
+    if repeat_count == 1:
+        return body.copy()
+    new_circuit = stim.Circuit()
+    new_circuit.append(stim.CircuitRepeatBlock(repeat_count, body, tag=tag))
+    return new_circuit
+
+
 def remove_gauge_detectors(circuit: stim.Circuit) -> stim.Circuit:
-    """Removes the gauge detectors from the given circuit."""
+    """Removes the gauge detectors from the given circuit.
+    The ``REPEAT`` blocks are only split around the iterations that
+    contain a gauge detector."""
     if not isinstance(circuit, stim.Circuit):
         raise TypeError(
             f"'circuit' must be a stim.Circuit, but {type(circuit)} was given."
@@ -177,15 +242,57 @@ def remove_gauge_detectors(circuit: stim.Circuit) -> stim.Circuit:
     if len(gauge_dets) == 0:
         return circuit
 
-    current_det = -1
+    return _filter_detectors(circuit, set(gauge_dets), keep=False)
+
+
+def _filter_detectors(
+    circuit: stim.Circuit, det_ids: set[int], keep: bool, det_offset: int = 0
+) -> stim.Circuit:
+    """Returns the circuit that only keeps the detectors in ``det_ids`` if
+    ``keep = True``, or that only removes the detectors in ``det_ids`` if
+    ``keep = False``. The detector indices start at ``det_offset``.
+
+    The ``REPEAT`` blocks are only split around the iterations that contain
+    a detector in ``det_ids``, as all the other iterations are modified in
+    the same way.
+    """
     new_circuit = stim.Circuit()
-    for instr in circuit.flattened():
-        if instr.name == "DETECTOR":
-            current_det += 1
-            if current_det in gauge_dets:
-                continue
+    for instr in circuit:
+        if isinstance(instr, stim.CircuitRepeatBlock):
+            body, reps = instr.body_copy(), instr.repeat_count
+            num_dets = body.num_detectors
+            end = det_offset + reps * num_dets
+            special_iters = sorted(
+                set(
+                    (d - det_offset) // num_dets
+                    for d in det_ids
+                    if det_offset <= d < end
+                )
+            )
+
+            prev_iter, new_body = 0, None
+            for special_iter in special_iters + [reps]:
+                if special_iter > prev_iter:
+                    if new_body is None:
+                        new_body = _filter_detectors(body, set(), keep)
+                    new_circuit += _repeat(
+                        new_body, special_iter - prev_iter, instr.tag
+                    )
+                if special_iter < reps:
+                    offset = det_offset + special_iter * num_dets
+                    new_circuit += _filter_detectors(body, det_ids, keep, offset)
+                prev_iter = special_iter + 1
+
+            det_offset = end
+            continue
 
-        new_circuit.append(instr)
+        if instr.name != "DETECTOR":
+            new_circuit.append(instr)
+            continue
+
+        if (det_offset in det_ids) == keep:
+            new_circuit.append(instr)
+        det_offset += 1
 
     return new_circuit
 
@@ -206,6 +313,8 @@ def remove_detectors(
     -------
     new_circuit
         Stim circuit without detectors except the ones in ``det_ids_exception``.
+        The ``REPEAT`` blocks are only split around the iterations that
+        contain a detector in ``det_ids_exception``.
     """
     if not isinstance(circuit, stim.Circuit):
         raise TypeError(
@@ -221,18 +330,7 @@ def remove_detectors(
             f"{det_ids_exception} was given."
         )
 
-    new_circuit = stim.Circuit()
-    current_det_id = -1
-    for instr in circuit.flattened():
-        if instr.name != "DETECTOR":
-            new_circuit.append(instr)
-            continue
-
-        current_det_id += 1
-        if current_det_id in det_ids_exception:
-            new_circuit.append(instr)
-
-    return new_circuit
+    return _filter_detectors(circuit, set(det_ids_exception), keep=True)
 
 
 def remove_observables(
@@ -266,13 +364,25 @@ def remove_observables(
             f"{obs_ids_exception} was given."
         )
 
+    return _filter_observables(circuit, set(obs_ids_exception))
+
+
+def _filter_observables(circuit: stim.Circuit, obs_ids: set[int]) -> stim.Circuit:
+    """Returns the circuit that only keeps the observables in ``obs_ids``.
+    The ``REPEAT`` blocks are not split because all their iterations
+    are modified in the same way."""
     new_circuit = stim.Circuit()
-    for instr in circuit.flattened():
+    for instr in circuit:
+        if isinstance(instr, stim.CircuitRepeatBlock):
+            new_body = _filter_observables(instr.body_copy(), obs_ids)
+            new_circuit += _repeat(new_body, instr.repeat_count, instr.tag)
+            continue
+
         if instr.name != "OBSERVABLE_INCLUDE":
             new_circuit.append(instr)
             continue
 
-        if instr.gate_args_copy()[0] in obs_ids_exception:
+        if instr.gate_args_copy()[0] in obs_ids:
             new_circuit.append(instr)
 
     return new_circuit
@@ -302,6 +412,11 @@ def observables_to_detectors(
         Mapping of the observable to the detector they have been converted to.
         This is useful for reverting this conversion with
         ``qec_util.dems.detectors_to_observables``.
+
+    Notes
+    -----
+    The ``REPEAT`` blocks are not flattened, thus the observables to convert
+    cannot be defined inside a ``REPEAT`` block with more than one iteration.
     """
     if not isinstance(circuit, stim.Circuit):
         raise TypeError(
@@ -316,44 +431,89 @@ def observables_to_detectors(
     if min(observables) < 0 or max(observables) > circuit.num_observables:
         raise ValueError("Elements in 'observables' must be valid observable indices.")
 
-    new_circuit = stim.Circuit()
     obs_to_dets: dict[stim.DemTarget, stim.DemTarget] = {}
     moved_observables = set()
     curr_detector = 0
-    for instr in circuit.flattened():
-        if instr.name == "DETECTOR":
-            curr_detector += 1
-        if instr.name != "OBSERVABLE_INCLUDE":
-            new_circuit.append(instr)
-            continue
-        if instr.gate_args_copy()[0] not in observables:
-            new_circuit.append(instr)
-            continue
+    # the detector coordinates are shifted by 'SHIFT_COORDS', thus the
+    # first coordinate of the new detectors is corrected to match the
+    # observable index.
+    coord_shift = 0.0
 
-        targets = instr.targets_copy()
-        if any(t.is_x_target or t.is_y_target or t.is_z_target for t in targets):
-            raise ValueError(
-                f"Targets in observable definition cannot be Paulis, but '{instr}' was found."
+    def convert(block: stim.Circuit) -> stim.Circuit:
+        nonlocal curr_detector, coord_shift
+        new_block = stim.Circuit()
+        for instr in block:
+            if isinstance(instr, stim.CircuitRepeatBlock):
+                body, reps = instr.body_copy(), instr.repeat_count
+                if reps == 1:
+                    new_block += convert(body)
+                    continue
+                # the blocks with more than one iteration are kept as they are
+                # because their observables would be defined in multiple lines.
+                for body_instr in body.flattened():
+                    if (body_instr.name == "OBSERVABLE_INCLUDE") and (
+                        body_instr.gate_args_copy()[0] in observables
+                    ):
+                        obs = int(body_instr.gate_args_copy()[0])
+                        raise ValueError(
+                            "Observables cannot be defined in multiple lines, "
+                            f"but L{obs} is defined inside a REPEAT block."
+                            "See 'qec_util.circuits.merge_observable_definitions'."
+                        )
+                new_block.append(instr)
+                curr_detector += reps * body.num_detectors
+                coord_shift += reps * _get_coord_shift(body)
+                continue
+
+            if instr.name == "SHIFT_COORDS":
+                coord_shift += (instr.gate_args_copy() or [0])[0]
+            if instr.name == "DETECTOR":
+                curr_detector += 1
+            if instr.name != "OBSERVABLE_INCLUDE":
+                new_block.append(instr)
+                continue
+            if instr.gate_args_copy()[0] not in observables:
+                new_block.append(instr)
+                continue
+
+            targets = instr.targets_copy()
+            if any(t.is_x_target or t.is_y_target or t.is_z_target for t in targets):
+                raise ValueError(
+                    f"Targets in observable definition cannot be Paulis, but '{instr}' was found."
+                )
+            obs = int(instr.gate_args_copy()[0])
+            if obs in moved_observables:
+                raise ValueError(
+                    f"Observables cannot be defined in multiple lines, but L{obs} is."
+                    "See 'qec_util.circuits.merge_observable_definitions'."
+                )
+            moved_observables.add(obs)
+            new_instr = stim.CircuitInstruction(
+                "DETECTOR", gate_args=[obs - coord_shift], targets=targets
             )
-        obs = int(instr.gate_args_copy()[0])
-        if obs in moved_observables:
-            raise ValueError(
-                f"Observables cannot be defined in multiple lines, but L{obs} is."
-                "See 'qec_util.circuits.merge_observable_definitions'."
+            new_block.append(new_instr)
+            obs_to_dets[stim.target_logical_observable_id(obs)] = (
+                stim.target_relative_detector_id(curr_detector)
             )
-        moved_observables.add(obs)
-        new_instr = stim.CircuitInstruction(
-            "DETECTOR", gate_args=[obs], targets=targets
-        )
-        new_circuit.append(new_instr)
-        obs_to_dets[stim.target_logical_observable_id(obs)] = (
-            stim.target_relative_detector_id(curr_detector)
-        )
-        curr_detector += 1
+            curr_detector += 1
+        return new_block
+
+    new_circuit = convert(circuit)
 
     return new_circuit, obs_to_dets
 
 
+def _get_coord_shift(circuit: stim.Circuit) -> float:
+    """Returns the total shift of the first detector coordinate in the circuit."""
+    coord_shift = 0.0
+    for instr in circuit:
+        if isinstance(instr, stim.CircuitRepeatBlock):
+            coord_shift += instr.repeat_count * _get_coord_shift(instr.body_copy())
+        elif instr.name == "SHIFT_COORDS":
+            coord_shift += (instr.gate_args_copy() or [0])[0]
+    return coord_shift
+
+
 def redefine_observables(
     circuit: stim.Circuit, new_observables: dict[int, Sequence[int]]
 ):
@@ -422,14 +582,20 @@ def merge_observable_definitions(
     if observables is None:
         observables = list(range(circuit.num_observables))
 
+    index = CircuitRecordIndex(circuit)
+
+    # 'block_starts' stores the index of the first instruction of each block
+    # in 'index.circuit' to get the number of measurements between blocks.
     blocks: list[stim.Circuit] = [stim.Circuit()]
+    block_starts = [0]
     pauli_obs: dict[int, list[int]] = {i: [] for i in observables}
     prev_obs = False
-    for instr in circuit.flattened():
+    for i, instr in enumerate(index.circuit):
         if instr.name != "OBSERVABLE_INCLUDE":
             if prev_obs:
                 prev_obs = False
                 blocks.append(stim.Circuit())
+                block_starts.append(i)
             blocks[-1].append(instr)
             continue
 
@@ -437,12 +603,14 @@ def merge_observable_definitions(
             if prev_obs:
                 prev_obs = False
                 blocks.append(stim.Circuit())
+                block_starts.append(i)
             blocks[-1].append(instr)
             continue
 
         if not prev_obs:
             prev_obs = True
             blocks.append(stim.Circuit())
+            block_starts.append(i)
         blocks[-1].append(instr)
 
         if any(not t.is_measurement_record_target for t in instr.targets_copy()):
@@ -451,6 +619,8 @@ def merge_observable_definitions(
 
     if not prev_obs:  # end with obs block
         blocks.append(stim.Circuit())
+        block_starts.append(len(index))
+    block_starts.append(len(index))
 
     if any(len(i) >= 2 for i in pauli_obs.values()):
         raise ValueError(
@@ -466,7 +636,7 @@ def merge_observable_definitions(
         if a > b:
             sign = -1
             a, b = b, a
-        shift = sum([c.num_measurements for c in blocks[a : b + 1]])
+        shift = index.num_measurements_between(block_starts[a], block_starts[b + 1])
         shift *= sign
 
         recs = [t.value - shift for t in instr.targets_copy()]
@@ -520,7 +690,11 @@ def merge_observable_definitions(
             new_block.append(new_instr)
         blocks[k] = new_block
 
-    return sum(blocks, start=stim.Circuit())
+    # 'sum' would copy the accumulated circuit for each block.
+    new_circuit = stim.Circuit()
+    for block in blocks:
+        new_circuit += block
+    return new_circuit
 
 
 def move_observables_to_end(circuit: stim.Circuit) -> stim.Circuit:
@@ -532,7 +706,8 @@ def move_observables_to_end(circuit: stim.Circuit) -> stim.Circuit:
         raise TypeError(
             f"'circuit' must be a stim.Circuit, but {type(circuit)} was given."
         )
-    circuit = circuit.flattened()
+    index = CircuitRecordIndex(circuit)
+    circuit = index.circuit
 
     new_circuit = stim.Circuit()
     obs = []
@@ -540,33 +715,33 @@ def move_observables_to_end(circuit: stim.Circuit) -> stim.Circuit:
     # therefore I need to take care of how many measurements are between the definition
     # and the end of the circuit (where I am going to define the deterministic observables)
     measurements = []
+    # observables can be defined with Paulis.
+    # if so, their definition must not be moved as it would change the observable,
+    # thus they must already be at the end of the circuit.
+    pauli_obs: list[tuple[int, stim.CircuitInstruction]] = []
+    last_non_obs = -1
     for i, instr in enumerate(circuit):
         if instr.name != "OBSERVABLE_INCLUDE":
             new_circuit.append(instr)
+            last_non_obs = i
             continue
 
-        # observables can be defined with Paulis.
-        # if so, their definition must not be moved as it would change the observable.
         if any(
             t.is_x_target or t.is_y_target or t.is_z_target
             for t in instr.targets_copy()
         ):
-            # check if observable is already at the end of the circuit
-            end = True
-            for next_instr in circuit[i:]:
-                if next_instr.name != "OBSERVABLE_INCLUDE":
-                    end = False
-                    break
-            if end:
-                new_circuit.append(instr)
-                continue
-            else:
-                raise ValueError(
-                    f"Observable definition in terms of Paulis found: {instr}."
-                )
+            new_circuit.append(instr)
+            pauli_obs.append((i, instr))
+            continue
 
         obs.append(instr)
-        measurements.append(circuit[i:].num_measurements)
+        measurements.append(index.num_measurements_after(i))
+
+    for i, instr in pauli_obs:
+        if i < last_non_obs:
+            raise ValueError(
+                f"Observable definition in terms of Paulis found: {instr}."
+            )
 
     for k, ob in enumerate(obs):
         new_targets = [t.value - measurements[k] for t in ob.targets_copy()]
@@ -622,35 +797,29 @@ def format_rec_targets(
         raise TypeError("The keys of 'qubit_inds' must be strings.")
     ind_to_label = {v: k for k, v in qubit_inds.items()}
 
-    circuit_str = ""
-    measurements: list[tuple[str, int]] = []
-    num_qubit_meas = {q: 0 for q in qubit_inds}
-    for instr in circuit.flattened():
-        if instr.name in SQ_MEASUREMENTS:
-            qubit_labels = [ind_to_label[i.value] for i in instr.targets_copy()]
-            for qubit_label in qubit_labels:
-                measurements.append((qubit_label, num_qubit_meas[qubit_label]))
-                num_qubit_meas[qubit_label] += 1
+    index = CircuitRecordIndex(circuit)
+
+    lines: list[str] = []
+    for i, instr in enumerate(index.circuit):
         if instr.name not in ["DETECTOR", "OBSERVABLE_INCLUDE"]:
-            circuit_str += str(instr) + "\n"
+            lines.append(str(instr))
             continue
 
-        targets = [i.value for i in instr.targets_copy()]
+        targets = [index.measurement_index(i, t.value) for t in instr.targets_copy()]
 
         targets_str: list[str] = []
         for target in targets:
-            meas = measurements[target]
-            qubit_label, abs_ind = meas
-            rel_ind = abs_ind - num_qubit_meas[qubit_label]
-            targets_str.append(f"{qubit_label}[{rel_ind}]")
+            qubit, abs_ind = index.qubit_measurement(target)
+            rel_ind = abs_ind - index.num_qubit_measurements_before(qubit, i)
+            targets_str.append(f"{ind_to_label[qubit]}[{rel_ind}]")
 
         # get prefix
         instr_str = str(instr)
         prefix = instr_str.split("rec[")[0]
 
-        circuit_str += prefix + " ".join(targets_str) + "\n"
+        lines.append(prefix + " ".join(targets_str))
 
-    return circuit_str
+    return "".join(line + "\n" for line in lines)
 
 
 def format_to_rec_targets(circuit_str: str, qubit_inds: dict[str, int]) -> stim.Circuit:
@@ -11,7 +11,8 @@ from .dem_instrs import (
     remove_detectors,
     sorted_dem_instr,
 )
-from .hyperedge_decomposition import decompose_hyperedge_to_edges
+from .error_mechanism import ErrorMechanism
+from .hyperedge_decomposition import HyperedgeDecomposer, decompose_hyperedge_to_edges
 from .util import prob_indep_depol1, prob_indep_depol2, xor_lists, xor_probs
 
 __all__ = [
@@ -28,6 +29,8 @@ __all__ = [
     "xor_probs",
     "xor_lists",
     "decompose_hyperedge_to_edges",
+    "HyperedgeDecomposer",
+    "ErrorMechanism",
     "prob_indep_depol1",
     "prob_indep_depol2",
     "detectors_to_observables",
@@ -2,11 +2,14 @@ from collections.abc import Iterable
 
 import stim
 
-from .util import xor_lists, xor_probs
+from .error_mechanism import ErrorMechanism
+from .util import xor_probs
 
 
-def get_detectors(dem_instr: stim.DemInstruction) -> tuple[int, ...]:
+def get_detectors(dem_instr: stim.DemInstruction | ErrorMechanism) -> tuple[int, ...]:
     """Returns the detector indices that are flipped in the given DEM instruction."""
+    if isinstance(dem_instr, ErrorMechanism):
+        return dem_instr.detectors
     if not isinstance(dem_instr, stim.DemInstruction):
         raise TypeError(
             f"'dem_instr' must be a stim.DemInstruction, but {type(dem_instr)} was given."
@@ -14,18 +17,15 @@ def get_detectors(dem_instr: stim.DemInstruction) -> tuple[int, ...]:
     if dem_instr.type != "error":
         raise ValueError(f"DemInstruction is not an error, it is {dem_instr.type}.")
 
-    if has_separator(dem_instr):
-        return xor_lists(*decomposed_detectors(dem_instr))
-    else:
-        return tuple(
-            sorted(
-                i.val for i in dem_instr.targets_copy() if i.is_relative_detector_id()
-            )
-        )
+    return ErrorMechanism(dem_instr).detectors
 
 
-def get_observables(dem_instr: stim.DemInstruction) -> tuple[int, ...]:
+def get_observables(
+    dem_instr: stim.DemInstruction | ErrorMechanism,
+) -> tuple[int, ...]:
     """Returns the logical observable indices that are flipped in the given DEM instruction."""
+    if isinstance(dem_instr, ErrorMechanism):
+        return dem_instr.observables
     if not isinstance(dem_instr, stim.DemInstruction):
         raise TypeError(
             f"'dem_instr' must be a stim.DemInstruction, but {type(dem_instr)} was given."
@@ -33,18 +33,13 @@ def get_observables(dem_instr: stim.DemInstruction) -> tuple[int, ...]:
     if dem_instr.type != "error":
         raise ValueError(f"DemInstruction is not an error, it is {dem_instr.type}.")
 
-    if has_separator(dem_instr):
-        return xor_lists(*decomposed_observables(dem_instr))
-    else:
-        return tuple(
-            sorted(
-                i.val for i in dem_instr.targets_copy() if i.is_logical_observable_id()
-            )
-        )
+    return ErrorMechanism(dem_instr).observables
 
 
-def has_separator(dem_instr: stim.DemInstruction) -> bool:
+def has_separator(dem_instr: stim.DemInstruction | ErrorMechanism) -> bool:
     """Returns if the given DEM instruction has a separator."""
+    if isinstance(dem_instr, ErrorMechanism):
+        return dem_instr.has_separator
     if not isinstance(dem_instr, stim.DemInstruction):
         raise TypeError(
             f"'dem_instr' must be a stim.DemInstruction, but {type(dem_instr)} was given."
@@ -55,10 +50,14 @@ def has_separator(dem_instr: stim.DemInstruction) -> bool:
     return bool([i for i in dem_instr.targets_copy() if i.is_separator()])
 
 
-def decomposed_detectors(dem_instr: stim.DemInstruction) -> list[tuple[int, ...]]:
+def decomposed_detectors(
+    dem_instr: stim.DemInstruction | ErrorMechanism,
+) -> list[tuple[int, ...]]:
     """Returns a list of the detector indices triggered for each fault that the DEM
     instruction is decomposed into.
     """
+    if isinstance(dem_instr, ErrorMechanism):
+        return list(dem_instr.decomposed_detectors)
     if not isinstance(dem_instr, stim.DemInstruction):
         raise TypeError(
             f"'dem_instr' must be a stim.DemInstruction, but {type(dem_instr)} was given."
@@ -66,26 +65,17 @@ def decomposed_detectors(dem_instr: stim.DemInstruction) -> list[tuple[int, ...]
     if dem_instr.type != "error":
         raise ValueError(f"DemInstruction is not an error, it is {dem_instr.type}.")
 
-    list_dets = []
-    current = []
-    for e in dem_instr.targets_copy():
-        if e.is_separator():
-            list_dets.append(current)
-            current = []
-        if e.is_relative_detector_id():
-            current.append(e.val)
-    list_dets.append(current)
-
-    # process dets
-    list_dets = [tuple(sorted(d)) for d in list_dets]
+    return ErrorMechanism(dem_instr).decomposed_detectors
 
-    return list_dets
 
-
-def decomposed_observables(dem_instr: stim.DemInstruction) -> list[tuple[int, ...]]:
+def decomposed_observables(
+    dem_instr: stim.DemInstruction | ErrorMechanism,
+) -> list[tuple[int, ...]]:
     """Returns a list of the logical observable indices triggered for each fault that the DEM
     instruction is decomposed into.
     """
+    if isinstance(dem_instr, ErrorMechanism):
+        return list(dem_instr.decomposed_observables)
     if not isinstance(dem_instr, stim.DemInstruction):
         raise TypeError(
             f"'dem_instr' must be a stim.DemInstruction, but {type(dem_instr)} was given."
@@ -93,24 +83,11 @@ def decomposed_observables(dem_instr: stim.DemInstruction) -> list[tuple[int, ..
     if dem_instr.type != "error":
         raise ValueError(f"'dem_instr' is not an error, it is {dem_instr.type}.")
 
-    list_obs = []
-    current = []
-    for e in dem_instr.targets_copy():
-        if e.is_separator():
-            list_obs.append(current)
-            current = []
-        if e.is_logical_observable_id():
-            current.append(e.val)
-    list_obs.append(current)
-
-    # process dets
-    list_obs = [tuple(sorted(l)) for l in list_obs]
-
-    return list_obs
+    return ErrorMechanism(dem_instr).decomposed_observables
 
 
 def decomposed_instrs(
-    dem_instr: stim.DemInstruction, prob_method: str = "same"
+    dem_instr: stim.DemInstruction | ErrorMechanism, prob_method: str = "same"
 ) -> stim.DetectorErrorModel:
     """Returns a DEM corresponding to the decomposed error mechanisms of the given instruction.
 
@@ -124,6 +101,8 @@ def decomposed_instrs(
         the decomposed error mechansisms as the one in ``dem_instr``.
         The other option is ``'zero'`` which sets the probability to ``0``.
     """
+    if isinstance(dem_instr, ErrorMechanism):
+        dem_instr = dem_instr.to_instr()
     if not isinstance(dem_instr, stim.DemInstruction):
         raise TypeError(
             f"'dem_instr' must be a stim.DemInstruction, but {type(dem_instr)} was given."
@@ -192,7 +171,7 @@ def remove_detectors(
 
 
 def sorted_dem_instr(
-    dem_instr: stim.DemInstruction, prob: None | float | int = None
+    dem_instr: stim.DemInstruction | ErrorMechanism, prob: None | float | int = None
 ) -> stim.DemInstruction:
     """Returns the DEM instruction in an specific order. Note that it removes the separators.
 
@@ -203,22 +182,22 @@ def sorted_dem_instr(
     prob
         If specified, it replaces the error probability in ``dem_instr``.
     """
-    if not isinstance(dem_instr, stim.DemInstruction):
+    if not isinstance(dem_instr, (stim.DemInstruction, ErrorMechanism)):
         raise TypeError(
             f"'dem_instr' must be a stim.DemInstruction, but {type(dem_instr)} was given."
         )
-    if dem_instr.type != "error":
-        return dem_instr
+    if isinstance(dem_instr, stim.DemInstruction):
+        if dem_instr.type != "error":
+            return dem_instr
+        dem_instr = ErrorMechanism(dem_instr)
     if not (prob is None or isinstance(prob, (int, float))):
         raise TypeError(
             "'prob' must be either None, an int or float, but {type(prob)} was given."
         )
 
-    dets = sorted(get_detectors(dem_instr))
-    obs = sorted(get_observables(dem_instr))
-    dets_target = list(map(stim.target_relative_detector_id, dets))
-    obs_target = list(map(stim.target_logical_observable_id, obs))
-    prob = dem_instr.args_copy() if prob is None else [prob]
+    dets_target = list(map(stim.target_relative_detector_id, dem_instr.detectors))
+    obs_target = list(map(stim.target_logical_observable_id, dem_instr.observables))
+    prob = [dem_instr.prob] if prob is None else [prob]
 
     return stim.DemInstruction(
         type="error", targets=dets_target + obs_target, args=prob
@@ -265,25 +244,23 @@ def get_labels_from_detectors(
     return labels
 
 
-def merge_instrs(*instrs: stim.DemInstruction) -> stim.DemInstruction:
+def merge_instrs(*instrs: stim.DemInstruction | ErrorMechanism) -> stim.DemInstruction:
     """Merges DEM error instructions or raises an error if they do not flip
     the same detectors and observables. Note that the decomposition information is removed."""
-    if any(not isinstance(i, stim.DemInstruction) for i in instrs):
+    if any(not isinstance(i, (stim.DemInstruction, ErrorMechanism)) for i in instrs):
         raise TypeError("At least one given instruction is not a stim.DemInstruction.")
-    if any(i.type != "error" for i in instrs):
+    if any(isinstance(i, stim.DemInstruction) and i.type != "error" for i in instrs):
         raise TypeError("The given instructions must corresponds to errors.")
 
-    unique_instrs = set([sorted_dem_instr(i, prob=0) for i in instrs])
-    if len(unique_instrs) != 1:
+    errors = [i if isinstance(i, ErrorMechanism) else ErrorMechanism(i) for i in instrs]
+    unique_keys = set((e.detectors, e.observables) for e in errors)
+    if len(unique_keys) != 1:
         raise ValueError(
             "The given instructions do not flip the same detectors and observables."
         )
 
-    probs = [i.args_copy()[0] for i in instrs]
-    prob = xor_probs(*probs)
-    new_instr = stim.DemInstruction(
-        "error", args=[prob], targets=unique_instrs.pop().targets_copy()
-    )
+    prob = xor_probs(*[e.prob for e in errors])
+    new_instr = sorted_dem_instr(errors[0], prob=prob)
     return new_instr
 
 
@@ -0,0 +1,86 @@
+import stim
+
+from .util import xor_lists
+
+
+class ErrorMechanism:
+    """Error instruction of a DEM whose targets have been parsed only once.
+
+    The functions in ``qec_util.dem_instrs`` accept it instead of a
+    ``stim.DemInstruction``, so that the targets are not copied and parsed
+    every time that the detectors or observables of the error are needed.
+
+    Parameters
+    ----------
+    dem_instr
+        Detector error model instruction of type ``error``.
+
+    Attributes
+    ----------
+    prob
+        Probability of the error.
+    targets
+        Targets of the error, including the separators.
+    detectors
+        Detector indices flipped by the error, see ``get_detectors``.
+    observables
+        Logical observable indices flipped by the error, see ``get_observables``.
+    decomposed_detectors
+        Detector indices of each component of the error,
+        see ``decomposed_detectors``.
+    decomposed_observables
+        Logical observable indices of each component of the error,
+        see ``decomposed_observables``.
+    """
+
+    __slots__ = (
+        "prob",
+        "targets",
+        "detectors",
+        "observables",
+        "decomposed_detectors",
+        "decomposed_observables",
+    )
+
+    def __init__(self, dem_instr: stim.DemInstruction):
+        if not isinstance(dem_instr, stim.DemInstruction):
+            raise TypeError(
+                f"'dem_instr' must be a stim.DemInstruction, but {type(dem_instr)} was given."
+            )
+        if dem_instr.type != "error":
+            raise ValueError(f"'dem_instr' is not an error, it is {dem_instr.type}.")
+
+        self.prob: float = dem_instr.args_copy()[0]
+        self.targets: list[stim.DemTarget] = dem_instr.targets_copy()
+
+        list_dets, list_obs = [[]], [[]]
+        for t in self.targets:
+            if t.is_separator():
+                list_dets.append([])
+                list_obs.append([])
+            elif t.is_relative_detector_id():
+                list_dets[-1].append(t.val)
+            elif t.is_logical_observable_id():
+                list_obs[-1].append(t.val)
+        self.decomposed_detectors = [tuple(sorted(d)) for d in list_dets]
+        self.decomposed_observables = [tuple(sorted(l)) for l in list_obs]
+
+        if len(list_dets) > 1:
+            self.detectors: tuple[int, ...] = xor_lists(*self.decomposed_detectors)
+            self.observables: tuple[int, ...] = xor_lists(*self.decomposed_observables)
+        else:
+            self.detectors = self.decomposed_detectors[0]
+            self.observables = self.decomposed_observables[0]
+        return
+
+    @property
+    def has_separator(self) -> bool:
+        """Returns if the error has a separator."""
+        return len(self.decomposed_detectors) > 1
+
+    def to_instr(self) -> stim.DemInstruction:
+        """Returns the error as a ``stim.DemInstruction``."""
+        return stim.DemInstruction("error", args=[self.prob], targets=self.targets)
+
+    def __repr__(self) -> str:
+        return f"ErrorMechanism({self.to_instr()})"
@@ -4,6 +4,106 @@ import stim
 from .dem_instrs import get_detectors, get_observables
 
 
+class HyperedgeDecomposer:
+    """Decomposes hyperedges into the given edges using
+    Algorithm 3 from https://doi.org/10.48550/arXiv.2309.15354.
+
+    The matching graph and the mapping from the matched edges to the
+    error instructions are built only once, so that it can decompose
+    many hyperedges efficiently.
+
+    Parameters
+    ----------
+    dem_edges
+        Edge errors to use for the decomposition of the hyperedges.
+
+    Notes
+    -----
+    This class requires ``pymatching``. To install the requirements to be able
+    to execute any function in ``qec_util``, run ``pip install qec_util[all]``.
+    """
+
+    def __init__(self, dem_edges: stim.DetectorErrorModel):
+        if not isinstance(dem_edges, stim.DetectorErrorModel):
+            raise TypeError(
+                f"'dem_edges' must be a stim.DetectorErrorModel, but {type(dem_edges)} was given."
+            )
+        dem_edges = dem_edges.flattened()
+        for instr in dem_edges:
+            if instr.type != "error" or len(get_detectors(instr)) > 2:
+                raise TypeError(
+                    f"'dem_edges' must only contain edge errors, but {instr} was found. "
+                    "Use 'remove_hyperedges(only_edges(dem))' to only have edge errors."
+                )
+
+        from pymatching import Matching
+
+        self.num_detectors = dem_edges.num_detectors
+        self._mwpm = Matching(dem_edges)
+
+        # the matched edges are given as pairs of detectors, with '-1'
+        # corresponding to the boundary.
+        self._edge_to_instr = {}
+        for instr in dem_edges:
+            dets = tuple(sorted(get_detectors(instr)))
+            dets = dets if len(dets) == 2 else (-1, dets[0])
+            self._edge_to_instr[dets] = (
+                instr.targets_copy(),
+                set(get_observables(instr)),
+            )
+
+        # hyperedges with the same detectors have the same decomposition.
+        self._cache: dict[tuple[int, ...], list[tuple[int, int]]] = {}
+        return
+
+    def decompose(
+        self, hyperedge: stim.DemInstruction, ignore_decomposition_failure: bool = False
+    ) -> stim.DemInstruction:
+        """Decomposes a single hyperedge, see ``decompose_hyperedge_to_edges``."""
+        if not isinstance(hyperedge, stim.DemInstruction):
+            raise TypeError(
+                f"'hyperedge' must be a stim.DemInstruction, but {type(hyperedge)} was given."
+            )
+        if hyperedge.type != "error":
+            raise TypeError(
+                f"'hyperedge' must be an error, but {hyperedge.type} was given."
+            )
+        detectors = tuple(sorted(get_detectors(hyperedge)))
+        if max(detectors) >= self.num_detectors:
+            raise ValueError(
+                "'dem_edges' do not span the whole detectors required for 'hyperedge'."
+            )
+
+        if detectors not in self._cache:
+            syndrome = np.zeros(self.num_detectors, dtype=bool)
+            syndrome[np.array(detectors)] = True
+            edges = self._mwpm.decode_to_edges_array(syndrome)
+            self._cache[detectors] = [tuple(sorted(edge)) for edge in edges.tolist()]
+        decomposition = [self._edge_to_instr[edge] for edge in self._cache[detectors]]
+
+        # build decomposed hyperedge
+        targets = []
+        for error_targets, _ in decomposition:
+            targets += error_targets
+            targets.append(stim.target_separator())
+        targets = targets[:-1]  # remove last separator
+        decom_hyperedge = stim.DemInstruction(
+            "error", targets=targets, args=hyperedge.args_copy()
+        )
+
+        if not ignore_decomposition_failure:
+            obs = set()
+            for _, error_obs in decomposition:
+                obs.symmetric_difference_update(error_obs)
+            if obs != set(get_observables(hyperedge)):
+                raise ValueError(
+                    f"Decomposition with different logical observable effect found for {hyperedge}:"
+                    f"\n{decom_hyperedge}"
+                )
+
+        return decom_hyperedge
+
+
 def decompose_hyperedge_to_edges(
     hyperedge: stim.DemInstruction,
     dem_edges: stim.DetectorErrorModel,
@@ -30,6 +130,9 @@ def decompose_hyperedge_to_edges(
 
     If the hyperedge contains a decomposition with ``stim.target_separator``s,
     it is going to be overwritten.
+
+    To decompose many hyperedges with the same ``dem_edges``, use
+    ``HyperedgeDecomposer``, which builds the matching graph only once.
     """
     if not isinstance(hyperedge, stim.DemInstruction):
         raise TypeError(
@@ -39,60 +142,8 @@ def decompose_hyperedge_to_edges(
         raise TypeError(
             f"'hyperedge' must be an error, but {hyperedge.type} was given."
         )
-    if not isinstance(dem_edges, stim.DetectorErrorModel):
-        raise TypeError(
-            f"'dem_edges' must be a stim.DetectorErrorModel, but {type(dem_edges)} was given."
-        )
-    dem_edges = dem_edges.flattened()
-    for instr in dem_edges:
-        if instr.type != "error" or len(get_detectors(instr)) > 2:
-            raise TypeError(
-                f"'dem_edges' must only contain edge errors, but {instr} was found. "
-                "Use 'remove_hyperedges(only_edges(dem))' to only have edge errors."
-            )
-    detectors = get_detectors(hyperedge)
-    if max(detectors) > dem_edges.num_errors:
-        raise ValueError(
-            "'dem_edges' do not span the whole detectors required for 'hyperedge'."
-        )
 
-    from pymatching import Matching
-
-    mwpm = Matching(dem_edges)
-    syndrome = np.zeros(dem_edges.num_detectors, dtype=bool)
-    syndrome[np.array(detectors)] = True
-    edges = mwpm.decode_to_edges_array(syndrome)
-
-    # convert edges array to a list of stim.DemInstructions
-    edge_to_instr = {}
-    for instr in dem_edges:
-        dets = tuple(sorted(get_detectors(instr)))
-        dets = dets if len(dets) == 2 else (-1, dets[0])
-        edge_to_instr[dets] = instr
-
-    decomposition = stim.DetectorErrorModel()
-    for edge in edges:
-        edge = tuple(sorted(edge))
-        decomposition.append(edge_to_instr[edge])
-
-    if not ignore_decomposition_failure:
-        obs = set()
-        for error in decomposition:
-            obs.symmetric_difference_update(get_observables(error))
-        if obs != set(get_observables(hyperedge)):
-            raise ValueError(
-                f"Decomposition with different logical observable effect found for {hyperedge}:"
-                f"\n{decomposition}"
-            )
-
-    # build decomposed hyperedge
-    targets = []
-    for error in decomposition:
-        targets += error.targets_copy()
-        targets.append(stim.target_separator())
-    targets = targets[:-1]  # remove last separator
-    decom_hyperedge = stim.DemInstruction(
-        "error", targets=targets, args=hyperedge.args_copy()
+    decomposer = HyperedgeDecomposer(dem_edges)
+    return decomposer.decompose(
+        hyperedge, ignore_decomposition_failure=ignore_decomposition_failure
     )
-
-    return decom_hyperedge
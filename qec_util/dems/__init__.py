@@ -1,8 +1,14 @@
 from ..dem_instrs import get_labels_from_detectors
+from .dem_arrays import DemArrays
+from .dem_index import DemIndex
+from .dem_pipeline import DemPipeline
+from .dem_reader import DemFileReader
 from .dems import (
     contains_only_edges,
     dem_difference,
+    dem_to_check_matrices,
     detectors_to_observables,
+    disjoint_graph_labels,
     disjoint_graphs,
     get_dem_subgraph,
     get_errors_triggering_detectors,
@@ -10,6 +16,7 @@ from .dems import (
     get_flippable_observables,
     get_max_weight_hyperedge,
     is_instr_in_dem,
+    merge_errors,
     observables_to_detectors,
     only_errors,
     prepare_distance2_dem_for_pymatching,
@@ -29,6 +36,7 @@ __all__ = [
     "is_instr_in_dem",
     "get_max_weight_hyperedge",
     "disjoint_graphs",
+    "disjoint_graph_labels",
     "get_flippable_detectors",
     "get_flippable_observables",
     "contains_only_edges",
@@ -44,4 +52,10 @@ __all__ = [
     "remove_fake_errors",
     "detectors_to_observables",
     "get_dem_subgraph",
+    "DemArrays",
+    "dem_to_check_matrices",
+    "DemIndex",
+    "DemPipeline",
+    "DemFileReader",
+    "merge_errors",
 ]
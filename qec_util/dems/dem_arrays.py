@@ -0,0 +1,421 @@
+import re
+from collections.abc import Sequence
+
+import numpy as np
+import numpy.typing as npt
+import stim
+
+IntArray = npt.NDArray[np.int64]
+
+
+class DemArrays:
+    """Compact array-based representation of a ``stim.DetectorErrorModel``.
+
+    The error instructions of the (flattened) DEM are stored in CSR format:
+    the detectors of error ``i`` are ``dets[det_ptr[i] : det_ptr[i + 1]]``
+    and its observables are ``obs[obs_ptr[i] : obs_ptr[i + 1]]``. The separators
+    (``^``) of error ``i`` are ``sep_ptr[i] : sep_ptr[i + 1]`` and each of them is
+    given by the number of detectors (``sep_dets``) and observables (``sep_obs``)
+    of the error placed before it. The rest of instructions (e.g. ``detector``
+    and ``logical_observable``) are stored as a ``stim.DetectorErrorModel``
+    in ``attributes``.
+
+    Parameters
+    ----------
+    probs
+        Probabilities of the errors.
+    dets, det_ptr
+        Detector indices and offsets of each error.
+    obs, obs_ptr
+        Observable indices and offsets of each error.
+    sep_dets, sep_obs, sep_ptr
+        Positions and offsets of the separators of each error.
+        By default ``None``, which corresponds to no separators.
+    attributes
+        Instructions that are not errors. By default ``None``,
+        which corresponds to no instructions.
+
+    Notes
+    -----
+    The targets of each decomposed error component are stored with the detectors
+    before the observables, and the tags of the error instructions are not stored.
+    ``DemArrays.to_dem`` places the ``attributes`` after the error instructions,
+    thus the order of the instructions can be different from the original DEM.
+    """
+
+    def __init__(
+        self,
+        probs: Sequence[float] | npt.NDArray[np.floating],
+        dets: Sequence[int] | IntArray,
+        det_ptr: Sequence[int] | IntArray,
+        obs: Sequence[int] | IntArray,
+        obs_ptr: Sequence[int] | IntArray,
+        sep_dets: Sequence[int] | IntArray | None = None,
+        sep_obs: Sequence[int] | IntArray | None = None,
+        sep_ptr: Sequence[int] | IntArray | None = None,
+        attributes: stim.DetectorErrorModel | None = None,
+    ):
+        self.probs = np.asarray(probs, dtype=np.float64)
+        self.dets = np.asarray(dets, dtype=np.int64)
+        self.det_ptr = np.asarray(det_ptr, dtype=np.int64)
+        self.obs = np.asarray(obs, dtype=np.int64)
+        self.obs_ptr = np.asarray(obs_ptr, dtype=np.int64)
+        if sep_ptr is None:
+            sep_dets, sep_obs, sep_ptr = [], [], np.zeros(len(self.probs) + 1)
+        self.sep_dets = np.asarray(sep_dets, dtype=np.int64)
+        self.sep_obs = np.asarray(sep_obs, dtype=np.int64)
+        self.sep_ptr = np.asarray(sep_ptr, dtype=np.int64)
+        if attributes is None:
+            attributes = stim.DetectorErrorModel()
+        if not isinstance(attributes, stim.DetectorErrorModel):
+            raise TypeError(
+                "'attributes' must be a stim.DetectorErrorModel, "
+                f"but {type(attributes)} was given."
+            )
+        self.attributes = attributes
+
+        num_errors = len(self.probs)
+        for name in ["det_ptr", "obs_ptr", "sep_ptr"]:
+            if getattr(self, name).shape != (num_errors + 1,):
+                raise ValueError(
+                    f"'{name}' must have shape {(num_errors + 1,)}, "
+                    f"but {getattr(self, name).shape} was given."
+                )
+        if (len(self.dets) != self.det_ptr[-1]) or (len(self.obs) != self.obs_ptr[-1]):
+            raise ValueError("The offsets do not match the number of targets.")
+        if not (len(self.sep_dets) == len(self.sep_obs) == self.sep_ptr[-1]):
+            raise ValueError("The offsets do not match the number of separators.")
+        return
+
+    @classmethod
+    def from_dem(cls, dem: stim.DetectorErrorModel) -> "DemArrays":
+        """Returns the ``DemArrays`` of the given DEM.
+
+        The DEM is flattened and parsed from its text representation,
+        which avoids creating a ``stim.DemInstruction`` for each error.
+        """
+        if not isinstance(dem, stim.DetectorErrorModel):
+            raise TypeError(
+                f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
+            )
+
+        err_lines, attr_lines = [], []
+        for line in str(dem.flattened()).splitlines():
+            (err_lines if line.startswith("error") else attr_lines).append(line)
+        attributes = stim.DetectorErrorModel("\n".join(attr_lines))
+
+        # the tokens are classified by their first character, and their values
+        # are parsed in one go after removing the non-numeric characters.
+        text = re.sub(r"\[[^\]]*\]", "", " ".join(err_lines))
+        chars = np.frombuffer(text.encode("utf-8"), dtype=np.uint8)
+        is_start = chars != ord(" ")
+        is_start[1:] &= chars[:-1] == ord(" ")
+        kind = chars[is_start]
+        for old, new in [("error(", ""), (")", ""), ("D", ""), ("L", ""), ("^", "0")]:
+            text = text.replace(old, new)
+        values = np.array(text.split(), dtype=np.float64)
+
+        is_err, is_det, is_obs, is_sep = [kind == ord(k) for k in "eDL^"]
+        num_errors = int(is_err.sum())
+        err_ids = np.cumsum(is_err) - 1
+        probs = values[is_err]
+        dets = values[is_det].astype(np.int64)
+        obs = values[is_obs].astype(np.int64)
+        det_ptr = _ptr_from_ids(err_ids[is_det], num_errors)
+        obs_ptr = _ptr_from_ids(err_ids[is_obs], num_errors)
+
+        # number of detectors and observables before each separator in its error
+        sep_err_ids = err_ids[is_sep]
+        sep_dets = np.cumsum(is_det)[is_sep] - det_ptr[sep_err_ids]
+        sep_obs = np.cumsum(is_obs)[is_sep] - obs_ptr[sep_err_ids]
+        sep_ptr = _ptr_from_ids(sep_err_ids, num_errors)
+
+        return cls(
+            probs, dets, det_ptr, obs, obs_ptr, sep_dets, sep_obs, sep_ptr, attributes
+        )
+
+    def to_dem(self) -> stim.DetectorErrorModel:
+        """Returns the corresponding ``stim.DetectorErrorModel``."""
+        probs = self.probs.tolist()
+        dets = [f"D{d}" for d in self.dets.tolist()]
+        obs = [f"L{o}" for o in self.obs.tolist()]
+        det_ptr, obs_ptr = self.det_ptr.tolist(), self.obs_ptr.tolist()
+        sep_ptr = self.sep_ptr.tolist()
+        sep_dets, sep_obs = self.sep_dets.tolist(), self.sep_obs.tolist()
+
+        lines = []
+        for k, prob in enumerate(probs):
+            d0, d1, o0, o1 = det_ptr[k], det_ptr[k + 1], obs_ptr[k], obs_ptr[k + 1]
+            if sep_ptr[k] == sep_ptr[k + 1]:
+                targets = dets[d0:d1] + obs[o0:o1]
+            else:
+                bounds = [(d0, o0)]
+                for s in range(sep_ptr[k], sep_ptr[k + 1]):
+                    bounds.append((d0 + sep_dets[s], o0 + sep_obs[s]))
+                bounds.append((d1, o1))
+                targets = []
+                for (a, c), (b, d) in zip(bounds[:-1], bounds[1:]):
+                    targets += ["^"] + dets[a:b] + obs[c:d]
+                targets = targets[1:]
+            lines.append(f"error({prob!r}) " + " ".join(targets))
+
+        return stim.DetectorErrorModel("\n".join(lines)) + self.attributes
+
+    def __len__(self) -> int:
+        return len(self.probs)
+
+    def __repr__(self) -> str:
+        return (
+            f"DemArrays(num_errors={self.num_errors}, "
+            f"num_detectors={self.num_detectors}, "
+            f"num_observables={self.num_observables})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, DemArrays):
+            return NotImplemented
+        names = ["probs", "dets", "det_ptr", "obs", "obs_ptr"]
+        names += ["sep_dets", "sep_obs", "sep_ptr"]
+        return all(
+            np.array_equal(getattr(self, n), getattr(other, n)) for n in names
+        ) and (self.attributes == other.attributes)
+
+    @property
+    def num_errors(self) -> int:
+        """Number of error instructions."""
+        return len(self.probs)
+
+    @property
+    def num_detectors(self) -> int:
+        """Number of detectors, following ``stim.DetectorErrorModel.num_detectors``."""
+        num_dets = int(self.dets.max()) + 1 if len(self.dets) else 0
+        return max(num_dets, self.attributes.num_detectors)
+
+    @property
+    def num_observables(self) -> int:
+        """Number of observables, following ``stim.DetectorErrorModel.num_observables``."""
+        num_obs = int(self.obs.max()) + 1 if len(self.obs) else 0
+        return max(num_obs, self.attributes.num_observables)
+
+    def copy(self) -> "DemArrays":
+        """Returns a copy of the ``DemArrays``."""
+        return DemArrays(
+            self.probs.copy(),
+            self.dets.copy(),
+            self.det_ptr.copy(),
+            self.obs.copy(),
+            self.obs_ptr.copy(),
+            self.sep_dets.copy(),
+            self.sep_obs.copy(),
+            self.sep_ptr.copy(),
+            self.attributes.copy(),
+        )
+
+    def error_ids(self, ptr: IntArray | None = None) -> IntArray:
+        """Returns the index of the error of each element in the CSR array
+        with the given offsets. By default, it uses ``det_ptr``."""
+        ptr = self.det_ptr if ptr is None else ptr
+        return np.repeat(np.arange(len(ptr) - 1), np.diff(ptr))
+
+    def select(
+        self,
+        errors: Sequence[int] | npt.NDArray[np.integer] | npt.NDArray[np.bool_],
+        attributes: bool = True,
+    ) -> "DemArrays":
+        """Returns a ``DemArrays`` with only the specified errors.
+
+        Parameters
+        ----------
+        errors
+            Indices or boolean mask of the errors to keep.
+        attributes
+            If ``True``, the ``attributes`` are kept. By default ``True``.
+        """
+        errors = np.asarray(errors)
+        if errors.dtype == bool:
+            errors = np.flatnonzero(errors)
+        dets, det_ptr = _select_csr(self.dets, self.det_ptr, errors)
+        obs, obs_ptr = _select_csr(self.obs, self.obs_ptr, errors)
+        sep_dets, sep_ptr = _select_csr(self.sep_dets, self.sep_ptr, errors)
+        sep_obs, _ = _select_csr(self.sep_obs, self.sep_ptr, errors)
+        return DemArrays(
+            self.probs[errors],
+            dets,
+            det_ptr,
+            obs,
+            obs_ptr,
+            sep_dets,
+            sep_obs,
+            sep_ptr,
+            self.attributes.copy() if attributes else None,
+        )
+
+    def flipped_detectors(self) -> tuple[IntArray, IntArray]:
+        """Returns the (sorted) detectors flipped by each error in CSR format,
+        i.e. the symmetric difference of the detectors of its components,
+        as in ``qec_util.dem_instrs.get_detectors``."""
+        return _xor_csr(self.dets, self.det_ptr, self.sep_ptr)
+
+    def flipped_observables(self) -> tuple[IntArray, IntArray]:
+        """Returns the (sorted) observables flipped by each error in CSR format,
+        i.e. the symmetric difference of the observables of its components,
+        as in ``qec_util.dem_instrs.get_observables``."""
+        return _xor_csr(self.obs, self.obs_ptr, self.sep_ptr)
+
+    def undecomposed(self) -> "DemArrays":
+        """Returns the ``DemArrays`` without separators, in which each error
+        flips the (sorted) detectors and observables of ``flipped_detectors``
+        and ``flipped_observables``."""
+        dets, det_ptr = self.flipped_detectors()
+        obs, obs_ptr = self.flipped_observables()
+        return DemArrays(
+            self.probs.copy(), dets, det_ptr, obs, obs_ptr, attributes=self.attributes
+        )
+
+    def to_targets(self) -> tuple[IntArray, IntArray, IntArray, IntArray]:
+        """Returns the targets as a table with one row per target.
+
+        Returns
+        -------
+        err_ids
+            Index of the error of each target.
+        comp_ids
+            Index of the decomposition component of each target within its error.
+        is_obs
+            ``1`` if the target is an observable, ``0`` if it is a detector.
+        values
+            Index of the detector or observable.
+        """
+        det_err = self.error_ids(self.det_ptr)
+        obs_err = self.error_ids(self.obs_ptr)
+        det_comp = self._component_ids(det_err, self.dets, self.det_ptr, self.sep_dets)
+        obs_comp = self._component_ids(obs_err, self.obs, self.obs_ptr, self.sep_obs)
+        return (
+            np.concatenate([det_err, obs_err]),
+            np.concatenate([det_comp, obs_comp]),
+            np.repeat(np.array([0, 1], dtype=np.int64), [len(det_err), len(obs_err)]),
+            np.concatenate([self.dets, self.obs]),
+        )
+
+    def _component_ids(
+        self, err_ids: IntArray, values: IntArray, ptr: IntArray, sep_pos: IntArray
+    ) -> IntArray:
+        if len(sep_pos) == 0:
+            return np.zeros(len(values), dtype=np.int64)
+        # the separator with position 'r' is placed before the target 'r'
+        width = int(max(np.diff(ptr).max(initial=0), sep_pos.max(initial=0))) + 1
+        sep_keys = self.error_ids(self.sep_ptr) * width + sep_pos
+        keys = err_ids * width + (np.arange(len(values)) - ptr[err_ids])
+        return np.searchsorted(sep_keys, keys, side="right") - self.sep_ptr[err_ids]
+
+    @classmethod
+    def concatenate(cls, dems: Sequence["DemArrays"]) -> "DemArrays":
+        """Returns the ``DemArrays`` with the errors and attributes of the
+        given ``DemArrays``, in the given order."""
+        for dem in dems:
+            if not isinstance(dem, DemArrays):
+                raise TypeError(
+                    f"Elements in 'dems' must be DemArrays, but {type(dem)} was given."
+                )
+
+        def _concatenate_ptr(ptrs: list[IntArray]) -> IntArray:
+            offsets = np.cumsum([0] + [p[-1] for p in ptrs[:-1]])
+            return np.concatenate([[0]] + [p[1:] + o for p, o in zip(ptrs, offsets)])
+
+        attributes = stim.DetectorErrorModel()
+        for dem in dems:
+            attributes += dem.attributes
+        return DemArrays(
+            np.concatenate([[]] + [d.probs for d in dems]),
+            np.concatenate([[]] + [d.dets for d in dems]),
+            _concatenate_ptr([d.det_ptr for d in dems]),
+            np.concatenate([[]] + [d.obs for d in dems]),
+            _concatenate_ptr([d.obs_ptr for d in dems]),
+            np.concatenate([[]] + [d.sep_dets for d in dems]),
+            np.concatenate([[]] + [d.sep_obs for d in dems]),
+            _concatenate_ptr([d.sep_ptr for d in dems]),
+            attributes,
+        )
+
+    @classmethod
+    def from_targets(
+        cls,
+        probs: npt.NDArray[np.floating],
+        err_ids: IntArray,
+        comp_ids: IntArray,
+        is_obs: IntArray,
+        values: IntArray,
+        attributes: stim.DetectorErrorModel | None = None,
+    ) -> "DemArrays":
+        """Returns the ``DemArrays`` from a table of targets, see
+        ``DemArrays.to_targets``. The empty components are removed.
+        """
+        num_errors = len(probs)
+        order = np.lexsort((is_obs, comp_ids, err_ids))
+        err_ids, comp_ids = err_ids[order], comp_ids[order]
+        is_obs, values = is_obs[order].astype(bool), values[order]
+
+        det_ptr = _ptr_from_ids(err_ids[~is_obs], num_errors)
+        obs_ptr = _ptr_from_ids(err_ids[is_obs], num_errors)
+
+        # a separator is placed before the first target of each component,
+        # except for the first component of each error
+        new_comp = np.ones(len(err_ids), dtype=bool)
+        new_comp[1:] = (err_ids[1:] != err_ids[:-1]) | (comp_ids[1:] != comp_ids[:-1])
+        new_err = np.ones(len(err_ids), dtype=bool)
+        new_err[1:] = err_ids[1:] != err_ids[:-1]
+        is_sep = new_comp & ~new_err
+        num_dets_before = np.cumsum(~is_obs) - (~is_obs)
+        num_obs_before = np.cumsum(is_obs) - is_obs
+        sep_err_ids = err_ids[is_sep]
+        sep_dets = num_dets_before[is_sep] - det_ptr[sep_err_ids]
+        sep_obs = num_obs_before[is_sep] - obs_ptr[sep_err_ids]
+        sep_ptr = _ptr_from_ids(sep_err_ids, num_errors)
+
+        return cls(
+            probs,
+            values[~is_obs],
+            det_ptr,
+            values[is_obs],
+            obs_ptr,
+            sep_dets,
+            sep_obs,
+            sep_ptr,
+            attributes,
+        )
+
+
+def _ptr_from_ids(ids: IntArray, num_rows: int) -> IntArray:
+    """Returns the CSR offsets given the (sorted) row index of each element."""
+    ptr = np.zeros(num_rows + 1, dtype=np.int64)
+    np.cumsum(np.bincount(ids, minlength=num_rows), out=ptr[1:])
+    return ptr
+
+
+def _select_csr(
+    values: IntArray, ptr: IntArray, rows: IntArray
+) -> tuple[IntArray, IntArray]:
+    """Returns the CSR arrays with only the given rows."""
+    counts = ptr[rows + 1] - ptr[rows]
+    new_ptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(counts, out=new_ptr[1:])
+    positions = np.repeat(ptr[rows] - new_ptr[:-1], counts) + np.arange(new_ptr[-1])
+    return values[positions], new_ptr
+
+
+def _xor_csr(
+    values: IntArray, ptr: IntArray, sep_ptr: IntArray
+) -> tuple[IntArray, IntArray]:
+    """Returns the CSR arrays with the elements that appear an odd number
+    of times in each row, sorted."""
+    num_rows = len(ptr) - 1
+    row_ids = np.repeat(np.arange(num_rows), np.diff(ptr))
+    if not (sep_ptr[-1] or len(values) == 0):
+        # without separators, the elements are not repeated
+        order = np.lexsort((values, row_ids))
+        return values[order], ptr.copy()
+
+    width = int(values.max(initial=0)) + 1
+    keys, counts = np.unique(row_ids * width + values, return_counts=True)
+    keys = keys[counts % 2 == 1]
+    return keys % width, _ptr_from_ids(keys // width, num_rows)
@@ -0,0 +1,90 @@
+import stim
+
+from ..dem_instrs import get_detectors, get_observables
+from .dem_arrays import DemArrays
+
+Key = tuple[tuple[int, ...], tuple[int, ...]]
+
+
+class DemIndex:
+    """Hash index of the error mechanisms of a DEM by their canonical key,
+    i.e. the sorted tuples of detectors and observables that they flip.
+
+    It answers membership queries in constant time, which is useful when
+    querying many instructions against the same DEM (e.g. ``is_instr_in_dem``).
+
+    Parameters
+    ----------
+    dem
+        Detector error model.
+
+    Notes
+    -----
+    The decomposition of the errors is not taken into account, as in
+    ``qec_util.dem_instrs.sorted_dem_instr``. The error indices correspond
+    to the order of the errors in ``dem.flattened()`` (without the instructions
+    that are not errors).
+    """
+
+    def __init__(self, dem: stim.DetectorErrorModel | DemArrays):
+        if isinstance(dem, stim.DetectorErrorModel):
+            dem = DemArrays.from_dem(dem)
+        if not isinstance(dem, DemArrays):
+            raise TypeError(
+                "'dem' must be a stim.DetectorErrorModel or DemArrays, "
+                f"but {type(dem)} was given."
+            )
+
+        self.keys = error_keys(dem)
+        self.probs = dem.probs.tolist()
+        self._index: dict[Key, list[int]] = {}
+        for k, key in enumerate(self.keys):
+            self._index.setdefault(key, []).append(k)
+        self._probs_index = set(zip(self.probs, self.keys))
+        return
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __contains__(self, dem_instr: stim.DemInstruction) -> bool:
+        """Returns if the DEM contains an error with the same probability
+        and flipping the same detectors and observables as ``dem_instr``."""
+        key = instr_key(dem_instr)
+        return (dem_instr.args_copy()[0], key) in self._probs_index
+
+    def get_errors(self, dem_instr: stim.DemInstruction | Key) -> list[int]:
+        """Returns the indices of the errors that flip the same detectors and
+        observables as the given instruction (or key), independently of
+        their probability."""
+        if isinstance(dem_instr, stim.DemInstruction):
+            dem_instr = instr_key(dem_instr)
+        return list(self._index.get(dem_instr, []))
+
+
+def instr_key(dem_instr: stim.DemInstruction) -> Key:
+    """Returns the canonical key of the given DEM error instruction, i.e.
+    the sorted tuples of detectors and observables that it flips."""
+    if not isinstance(dem_instr, stim.DemInstruction):
+        raise TypeError(
+            f"'dem_instr' must be a stim.DemInstruction, but {type(dem_instr)} was given."
+        )
+    if dem_instr.type != "error":
+        raise TypeError(f"'dem_instr' is not an error, but a {dem_instr.type}.")
+    return get_detectors(dem_instr), get_observables(dem_instr)
+
+
+def error_keys(dem: DemArrays) -> list[Key]:
+    """Returns the canonical key of each error in the given ``DemArrays``,
+    see ``instr_key``."""
+    if not isinstance(dem, DemArrays):
+        raise TypeError(f"'dem' must be a DemArrays, but {type(dem)} was given.")
+
+    dets, det_ptr = (a.tolist() for a in dem.flipped_detectors())
+    obs, obs_ptr = (a.tolist() for a in dem.flipped_observables())
+    return [
+        (
+            tuple(dets[det_ptr[k] : det_ptr[k + 1]]),
+            tuple(obs[obs_ptr[k] : obs_ptr[k + 1]]),
+        )
+        for k in range(dem.num_errors)
+    ]
@@ -0,0 +1,69 @@
+from collections.abc import Callable
+
+import stim
+
+from .dem_arrays import DemArrays
+
+
+class DemPipeline:
+    """Sequence of DEM transformations that are applied with a single
+    conversion of the DEM.
+
+    The DEM is flattened and parsed into a ``DemArrays`` only once, each stage
+    is applied to the ``DemArrays``, and the output is converted back to a
+    ``stim.DetectorErrorModel`` only once. This avoids flattening and building
+    a ``stim.DetectorErrorModel`` for every intermediate step.
+
+    Parameters
+    ----------
+    *stages
+        Functions that take a ``DemArrays`` and return a ``DemArrays``, applied
+        in the given order. Most of the transformations in ``qec_util.dems``
+        support ``DemArrays``, e.g. ``only_errors``,
+        ``remove_gauge_detectors``, ``observables_to_detectors``,
+        ``get_dem_subgraph`` and ``remove_hyperedges``. Use ``functools.partial``
+        or a ``lambda`` to fix the extra arguments of a stage, e.g.
+        ``partial(get_dem_subgraph, dets=[0, 1, 2])``.
+    """
+
+    def __init__(self, *stages: Callable[[DemArrays], DemArrays]):
+        for stage in stages:
+            if not callable(stage):
+                raise TypeError(
+                    f"Each stage must be callable, but {type(stage)} was given."
+                )
+        self.stages = list(stages)
+        return
+
+    def __call__(
+        self, dem: stim.DetectorErrorModel | DemArrays
+    ) -> stim.DetectorErrorModel | DemArrays:
+        """Applies the stages to the given DEM. The output has the same type
+        as ``dem``."""
+        if isinstance(dem, stim.DetectorErrorModel):
+            return self(DemArrays.from_dem(dem)).to_dem()
+        if not isinstance(dem, DemArrays):
+            raise TypeError(
+                "'dem' must be a stim.DetectorErrorModel or DemArrays, "
+                f"but {type(dem)} was given."
+            )
+
+        for stage in self.stages:
+            dem = stage(dem)
+            if not isinstance(dem, DemArrays):
+                raise TypeError(
+                    f"Stage {stage} must return a DemArrays, but {type(dem)} was returned."
+                )
+        return dem
+
+    def __add__(self, other: "DemPipeline") -> "DemPipeline":
+        if not isinstance(other, DemPipeline):
+            return NotImplemented
+        return DemPipeline(*self.stages, *other.stages)
+
+    def __len__(self) -> int:
+        return len(self.stages)
+
+    def __repr__(self) -> str:
+        names = [getattr(s, "__name__", repr(s)) for s in self.stages]
+        return f"DemPipeline({', '.join(names)})"
@@ -0,0 +1,146 @@
+import pathlib
+import re
+from collections.abc import Iterator
+
+import stim
+
+from .dem_arrays import DemArrays
+
+REPEAT_HEADER = re.compile(r"^repeat(\[[^\]]*\])?\s+(\d+)\s*\{$")
+
+
+class DemFileReader:
+    """Reader of a DEM file that streams its error instructions in chunks,
+    without parsing the whole DEM into memory.
+
+    Iterating over the reader returns ``DemArrays`` with consecutive
+    error instructions of the flattened DEM, i.e. the ``repeat`` blocks are
+    unrolled and the ``shift_detectors`` are applied on the fly. The reader
+    can be iterated several times, as each iteration reads the file again.
+
+    Parameters
+    ----------
+    file_name
+        Name of the file with the detector error model, e.g.
+        from ``stim.DetectorErrorModel.to_file``.
+    chunk_size
+        Approximate number of error instructions in each chunk.
+        By default ``10_000``.
+
+    Notes
+    -----
+    The functions ``get_flippable_detectors``, ``get_flippable_observables``,
+    ``get_max_weight_hyperedge``, ``contains_only_edges`` and ``get_dem_subgraph``
+    accept a ``DemFileReader`` instead of a DEM, and they only load one chunk
+    at a time (plus their output).
+
+    The body of each ``repeat`` block is stored in memory, thus a chunk can
+    have more error instructions than ``chunk_size`` if the body has more
+    error instructions or if it contains nested ``repeat`` blocks.
+    """
+
+    def __init__(self, file_name: str | pathlib.Path, chunk_size: int = 10_000):
+        if not isinstance(file_name, (str, pathlib.Path)):
+            raise TypeError(
+                "'file_name' must be a str or pathlib.Path, "
+                f"but {type(file_name)} was given."
+            )
+        if not pathlib.Path(file_name).exists():
+            raise FileExistsError(f"The given file ({file_name}) does not exist.")
+        if not isinstance(chunk_size, int):
+            raise TypeError(
+                f"'chunk_size' must be an int, but {type(chunk_size)} was given."
+            )
+        if chunk_size < 1:
+            raise ValueError(
+                f"'chunk_size' must be positive, but {chunk_size} was given."
+            )
+
+        self.file_name = file_name
+        self.chunk_size = chunk_size
+        return
+
+    def __iter__(self) -> Iterator[DemArrays]:
+        # the detector and coordinate shifts of the previous chunks are
+        # added at the beginning of each chunk.
+        det_shift, coord_shift = 0, []
+        lines, num_errors = [], 0
+
+        def flush() -> DemArrays:
+            nonlocal det_shift, coord_shift, lines, num_errors
+            coords = f"({', '.join(map(repr, coord_shift))})" if coord_shift else ""
+            header = f"shift_detectors{coords} {det_shift}\n"
+            dem = stim.DetectorErrorModel(header + "\n".join(lines))
+            det_shift, coord_shift = _total_shift(dem)
+            lines, num_errors = [], 0
+            return DemArrays.from_dem(dem)
+
+        with open(self.file_name, "r") as file:
+            for instr, repeat_count in _top_level_instrs(file):
+                instr_errors = sum(
+                    line.startswith("error") for line in instr.splitlines()
+                )
+                for _ in range(repeat_count):
+                    lines.append(instr)
+                    num_errors += instr_errors
+                    if num_errors >= self.chunk_size:
+                        yield flush()
+
+        if lines:
+            yield flush()
+        return
+
+
+def _top_level_instrs(file) -> Iterator[tuple[str, int]]:
+    """Yields the top-level instructions in the given DEM file. The ``repeat``
+    blocks are given as their body and their number of repetitions."""
+    block, depth, repeat_count = [], 0, 1
+    for line in file:
+        line = line.split("#")[0].strip()
+        if not line:
+            continue
+
+        if depth == 0:
+            match = REPEAT_HEADER.match(line)
+            if match is None:
+                yield line, 1
+                continue
+            block, depth, repeat_count = [], 1, int(match.group(2))
+            continue
+
+        if line.endswith("{"):
+            depth += 1
+        elif line == "}":
+            depth -= 1
+        if depth == 0:
+            yield "\n".join(block), repeat_count
+        else:
+            block.append(line)
+
+    if depth != 0:
+        raise ValueError("The DEM file has an unclosed 'repeat' block.")
+    return
+
+
+def _total_shift(dem: stim.DetectorErrorModel) -> tuple[int, list[float]]:
+    """Returns the total detector and coordinate shift of the given DEM."""
+    det_shift, coord_shift = 0, []
+    for instr in dem:
+        if isinstance(instr, stim.DemRepeatBlock):
+            body_det_shift, body_coord_shift = _total_shift(instr.body_copy())
+            count = instr.repeat_count
+            det_shift += count * body_det_shift
+            coord_shift = _add_coords(
+                coord_shift, [count * c for c in body_coord_shift]
+            )
+        elif instr.type == "shift_detectors":
+            det_shift += instr.targets_copy()[0]
+            coord_shift = _add_coords(coord_shift, instr.args_copy())
+    return det_shift, coord_shift
+
+
+def _add_coords(coords_1: list[float], coords_2: list[float]) -> list[float]:
+    num_coords = max(len(coords_1), len(coords_2))
+    coords_1 = coords_1 + [0] * (num_coords - len(coords_1))
+    coords_2 = coords_2 + [0] * (num_coords - len(coords_2))
+    return [c1 + c2 for c1, c2 in zip(coords_1, coords_2)]
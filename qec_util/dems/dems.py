@@ -1,22 +1,47 @@
+import multiprocessing
 from collections.abc import Collection, Sequence
 
 import numpy as np
+import numpy.typing as npt
 import stim
 
 from ..dem_instrs import detectors_to_observables as detectors_to_observables_instr
 from ..dem_instrs import (
     get_detectors,
     get_observables,
-    merge_instrs,
     prob_indep_depol1,
     prob_indep_depol2,
-    sorted_dem_instr,
     xor_probs,
 )
+from .dem_arrays import DemArrays
+from .dem_index import DemIndex, Key, error_keys, instr_key
+from .dem_reader import DemFileReader
 
+DEM = stim.DetectorErrorModel | DemArrays
 
-def remove_gauge_detectors(dem: stim.DetectorErrorModel) -> stim.DetectorErrorModel:
+
+def remove_gauge_detectors(dem: DEM) -> DEM:
     """Remove the gauge detectors from a DEM."""
+    if isinstance(dem, DemArrays):
+        # same criterion as for stim.DetectorErrorModel, i.e. a single target
+        # of any kind (including separators).
+        is_gauge = dem.probs == 0.5
+        num_dets, num_obs = np.diff(dem.det_ptr), np.diff(dem.obs_ptr)
+        num_targets = num_dets + num_obs + np.diff(dem.sep_ptr)
+        if (num_targets[is_gauge] != 1).any():
+            raise ValueError("There exist 'composed' gauge detectors.")
+        gauge_dets = dem.dets[dem.det_ptr[:-1][is_gauge & (num_dets == 1)]]
+        gauge_obs = dem.obs[dem.obs_ptr[:-1][is_gauge & (num_obs == 1)]]
+        new_dem = dem.select(~is_gauge)
+        if (
+            np.isin(new_dem.dets, gauge_dets).any()
+            or np.isin(new_dem.obs, gauge_obs).any()
+        ):
+            raise ValueError(
+                "A gauge detector is present in other errors. Gauge detectors = "
+                f"{set(gauge_dets.tolist())}, gauge observables = {set(gauge_obs.tolist())}"
+            )
+        return new_dem
     if not isinstance(dem, stim.DetectorErrorModel):
         raise TypeError(f"'dem' is not a stim.DetectorErrorModel, but a {type(dem)}.")
 
@@ -46,7 +71,7 @@ def remove_gauge_detectors(dem: stim.DetectorErrorModel) -> stim.DetectorErrorMo
 
 
 def dem_difference(
-    dem_1: stim.DetectorErrorModel, dem_2: stim.DetectorErrorModel
+    dem_1: DEM, dem_2: DEM
 ) -> tuple[stim.DetectorErrorModel, stim.DetectorErrorModel]:
     """Returns the the DEM error instructions in the first DEM that are not present
     in the second DEM and vice versa. Note that this does not take into account
@@ -65,48 +90,52 @@ def dem_difference(
         DEM instructions present in ``dem_1`` that are not present in ``dem_2``.
     diff_2
         DEM instructions present in ``dem_2`` that are not present in ``dem_1``.
+
+    Notes
+    -----
+    The errors are compared using a hash set of their probabilities and canonical
+    keys (see ``DemIndex``), thus the running time is linear in the number of errors.
     """
-    if not isinstance(dem_1, stim.DetectorErrorModel):
+    if not isinstance(dem_1, (stim.DetectorErrorModel, DemArrays)):
         raise TypeError(
             f"'dem_1' is not a stim.DetectorErrorModel, but a {type(dem_1)}."
         )
-    if not isinstance(dem_2, stim.DetectorErrorModel):
+    if not isinstance(dem_2, (stim.DetectorErrorModel, DemArrays)):
         raise TypeError(
             f"'dem_2' is not a stim.DetectorErrorModel, but a {type(dem_2)}."
         )
 
-    dem_1_ordered = stim.DetectorErrorModel()
-    for dem_instr in dem_1.flattened():
-        if dem_instr.type != "error":
-            continue
-
-        dem_1_ordered.append(sorted_dem_instr(dem_instr))
-
-    dem_2_ordered = stim.DetectorErrorModel()
-    for dem_instr in dem_2.flattened():
-        if dem_instr.type != "error":
-            continue
+    errors = []
+    for dem in [dem_1, dem_2]:
+        if isinstance(dem, stim.DetectorErrorModel):
+            dem = DemArrays.from_dem(dem)
+        errors.append(list(zip(dem.probs.tolist(), error_keys(dem))))
+    errors_1, errors_2 = errors
+    set_1, set_2 = set(errors_1), set(errors_2)
 
-        dem_2_ordered.append(sorted_dem_instr(dem_instr))
-
-    diff_1 = stim.DetectorErrorModel()
-    for dem_instr in dem_1_ordered:
-        if dem_instr not in dem_2_ordered:
-            diff_1.append(dem_instr)
+    diff_1 = _errors_to_dem([e for e in errors_1 if e not in set_2])
+    diff_2 = _errors_to_dem([e for e in errors_2 if e not in set_1])
+    return diff_1, diff_2
 
-    diff_2 = stim.DetectorErrorModel()
-    for dem_instr in dem_2_ordered:
-        if dem_instr not in dem_1_ordered:
-            diff_2.append(dem_instr)
 
-    return diff_1, diff_2
+def _errors_to_dem(
+    errors: list[tuple[float, tuple[tuple[int, ...], tuple[int, ...]]]],
+) -> stim.DetectorErrorModel:
+    """Returns the DEM with the given (probability, (detectors, observables))
+    errors, following the format of ``sorted_dem_instr``."""
+    lines = []
+    for prob, (dets, obs) in errors:
+        targets = [f"D{d}" for d in dets] + [f"L{o}" for o in obs]
+        lines.append(f"error({prob!r}) " + " ".join(targets))
+    return stim.DetectorErrorModel("\n".join(lines))
 
 
-def is_instr_in_dem(
-    dem_instr: stim.DemInstruction, dem: stim.DetectorErrorModel
-) -> bool:
+def is_instr_in_dem(dem_instr: stim.DemInstruction, dem: DEM | DemIndex) -> bool:
     """Checks if the DEM error instruction and its undecomposed form are present
     in the given DEM.
+
+    For many queries on the same DEM, build a ``DemIndex`` of the DEM once
+    and give it as ``dem``, so that each query runs in constant time.
     """
     if not isinstance(dem_instr, stim.DemInstruction):
         raise TypeError(
@@ -114,32 +143,26 @@ def is_instr_in_dem(
         )
     if dem_instr.type != "error":
         raise TypeError(f"'dem_instr' is not an error, but a {dem_instr.type}.")
-    if not isinstance(dem, stim.DetectorErrorModel):
+    if not isinstance(dem, (stim.DetectorErrorModel, DemArrays, DemIndex)):
         raise TypeError(
-            f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
+            "'dem' must be a stim.DetectorErrorModel, DemArrays or DemIndex, "
+            f"but {type(dem)} was given."
         )
 
-    dem_instr = sorted_dem_instr(dem_instr)
-
-    for other_instr in dem.flattened():
-        if other_instr.type != "error":
-            continue
-
-        if dem_instr == sorted_dem_instr(other_instr):
-            return True
-
-    return False
+    if not isinstance(dem, DemIndex):
+        dem = DemIndex(dem)
+    return dem_instr in dem
 
 
 def get_max_weight_hyperedge(
-    dem: stim.DetectorErrorModel,
+    dem: DEM | DemFileReader,
 ) -> tuple[int, stim.DemInstruction]:
     """Return the weight and hyperedges corresponding to the max-weight hyperedge.
 
     Parameters
     ----------
     dem
-        Stim detector error model.
+        Stim detector error model. It can also be a ``DemFileReader``.
 
     Returns
     -------
@@ -148,13 +171,28 @@ def get_max_weight_hyperedge(
     hyperedge
         Hyperedge with the max-weight in ``dem``.
     """
-    if not isinstance(dem, stim.DetectorErrorModel):
+    if not isinstance(dem, (stim.DetectorErrorModel, DemArrays, DemFileReader)):
         raise TypeError(
-            f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
+            "'dem' must be a stim.DetectorErrorModel or DemArrays, "
+            f"but {type(dem)} was given."
         )
 
     max_weight = 0
     hyperedge = stim.DemInstruction(type="error", args=[0], targets=[])
+    if isinstance(dem, DemFileReader):
+        for chunk in dem:
+            weight, instr = get_max_weight_hyperedge(chunk)
+            if weight > max_weight:
+                max_weight, hyperedge = weight, instr
+        return max_weight, hyperedge
+    if isinstance(dem, DemArrays):
+        weights = np.diff(dem.det_ptr)
+        if weights.max(initial=0) > 0:
+            ind = int(np.argmax(weights))
+            max_weight = int(weights[ind])
+            hyperedge = dem.select([ind], attributes=False).to_dem()[0]
+        return max_weight, hyperedge
+
     for dem_instr in dem.flattened():
         if dem_instr.type != "error":
             continue
@@ -168,53 +206,91 @@ def get_max_weight_hyperedge(
     return max_weight, hyperedge
 
 
-def disjoint_graphs(dem: stim.DetectorErrorModel) -> list[list[int]]:
+def disjoint_graphs(dem: DEM) -> list[list[int]]:
     """
     Return the nodes in the disjoint subgraphs that the DEM (or decoding
     graph) can be split into.
 
     Notes
     -----
-    This function requires ``networkx``. To install the requirements to be able
+    This function requires ``scipy``. To install the requirements to be able
     to execute any function in ``qec_util``, run ``pip install qec_util[all]``.
+
+    The subgraphs are sorted by their smallest detector, so that the
+    ``k``-th subgraph corresponds to the label ``k`` in ``disjoint_graph_labels``.
     """
-    if not isinstance(dem, stim.DetectorErrorModel):
-        raise TypeError(
-            f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
-        )
+    labels = disjoint_graph_labels(dem)
+    nodes = np.flatnonzero(labels >= 0)
+    order = np.argsort(labels[nodes], kind="stable")
+    nodes, labels = nodes[order], labels[nodes][order]
+    splits = np.flatnonzero(np.diff(labels)) + 1
+    subgraphs = [n.tolist() for n in np.split(nodes, splits)] if len(nodes) else []
 
-    import networkx as nx
+    return subgraphs
 
-    # convert stim.DetectorErrorModel to nx.Graph
-    # to use the functionality 'nx.connected_components(G)'
-    g = nx.Graph()
-    for dem_instr in dem.flattened():
-        if dem_instr.type != "error":
-            continue
 
-        targets = dem_instr.targets_copy()
-        targets = [t.val for t in targets if t.is_relative_detector_id()]
+def disjoint_graph_labels(dem: DEM) -> npt.NDArray[np.int64]:
+    """Returns the label of the disjoint subgraph (see ``disjoint_graphs``)
+    of each detector in the DEM.
+
+    Parameters
+    ----------
+    dem
+        Detector error model.
 
-        if len(targets) == 1:
-            g.add_node(targets[0])
+    Returns
+    -------
+    labels
+        Array of length ``dem.num_detectors`` with the index of the subgraph
+        containing each detector, or ``-1`` if the detector is not triggered
+        by any error. The subgraphs are labelled in increasing order of their
+        smallest detector.
 
-        # hyperedges cannot be added to nx.Graph, but if we are just checking
-        # the number of disjoint graphs, we can transform the hyperedge to a
-        # sequence of edges which keeps the same connectiviy between nodes.
-        # For example, hyperedge (0,2,5,6) can be expressed as edges (0,2),
-        # (2,5) and (5,6).
-        for start, end in zip(targets[:-1], targets[1:]):
-            g.add_edge(start, end)
+    Notes
+    -----
+    This function requires ``scipy``. To install the requirements to be able
+    to execute any function in ``qec_util``, run ``pip install qec_util[all]``.
+    """
+    if isinstance(dem, stim.DetectorErrorModel):
+        dem = DemArrays.from_dem(dem)
+    if not isinstance(dem, DemArrays):
+        raise TypeError(
+            f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
+        )
 
-    subgraphs = [list(c) for c in nx.connected_components(g)]
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import connected_components
 
-    return subgraphs
+    # a hyperedge (0,2,5,6) has the same connectivity as the edges (0,2), (2,5)
+    # and (5,6), thus consecutive detectors of the same error are connected.
+    # Detectors of different components in decomposed errors are also connected,
+    # as in the undecomposed error.
+    num_dets = dem.num_detectors
+    same_error = np.diff(dem.error_ids()) == 0
+    rows, cols = dem.dets[:-1][same_error], dem.dets[1:][same_error]
+    graph = coo_matrix(
+        (np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(num_dets, num_dets)
+    )
+    _, labels = connected_components(graph, directed=False)
+
+    # the components are labelled in order of their smallest node by scipy,
+    # thus relabelling the components with errors keeps the order.
+    has_errors = np.zeros(num_dets, dtype=bool)
+    has_errors[dem.dets] = True
+    _, labels[has_errors] = np.unique(labels[has_errors], return_inverse=True)
+    labels[~has_errors] = -1
 
+    return labels.astype(np.int64)
 
-def get_flippable_detectors(dem: stim.DetectorErrorModel) -> set[int]:
+
+def get_flippable_detectors(dem: DEM | DemFileReader) -> set[int]:
     """Returns a the detector indices present in the given DEM
-    that are triggered by some errors.
+    that are triggered by some errors. The DEM can also be a ``DemFileReader``.
     """
+    if isinstance(dem, DemFileReader):
+        return set().union(*(get_flippable_detectors(chunk) for chunk in dem))
+    if isinstance(dem, DemArrays):
+        return set(dem.flipped_detectors()[0].tolist())
     if not isinstance(dem, stim.DetectorErrorModel):
         raise TypeError(
             f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
@@ -228,10 +304,14 @@ def get_flippable_detectors(dem: stim.DetectorErrorModel) -> set[int]:
     return dets
 
 
-def get_flippable_observables(dem: stim.DetectorErrorModel) -> set[int]:
+def get_flippable_observables(dem: DEM | DemFileReader) -> set[int]:
     """Returns a the logical observable indices present in the given DEM
-    that are triggered by some errors.
+    that are triggered by some errors. The DEM can also be a ``DemFileReader``.
     """
+    if isinstance(dem, DemFileReader):
+        return set().union(*(get_flippable_observables(chunk) for chunk in dem))
+    if isinstance(dem, DemArrays):
+        return set(dem.flipped_observables()[0].tolist())
     if not isinstance(dem, stim.DetectorErrorModel):
         raise TypeError(
             f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
@@ -245,8 +325,13 @@ def get_flippable_observables(dem: stim.DetectorErrorModel) -> set[int]:
     return obs
 
 
-def contains_only_edges(dem: stim.DetectorErrorModel) -> bool:
-    """Returns if the given DEM contains conly edges or boundary edges."""
+def contains_only_edges(dem: DEM | DemFileReader) -> bool:
+    """Returns if the given DEM contains conly edges or boundary edges.
+    The DEM can also be a ``DemFileReader``."""
+    if isinstance(dem, DemFileReader):
+        return all(contains_only_edges(chunk) for chunk in dem)
+    if isinstance(dem, DemArrays):
+        return bool((np.diff(dem.flipped_detectors()[1]) <= 2).all())
     for dem_instr in dem.flattened():
         if (dem_instr.type == "error") and len(get_detectors(dem_instr)) > 2:
             return False
@@ -254,10 +339,10 @@ def contains_only_edges(dem: stim.DetectorErrorModel) -> bool:
 
 
 def observables_to_detectors(
-    dem: stim.DetectorErrorModel,
+    dem: DEM,
     obs_inds: Sequence[int] | None = None,
     det_inds: Sequence[int] | None = None,
-) -> stim.DetectorErrorModel:
+) -> DEM:
     """Converts the specified observables into a detector in the specified DEM.
 
     Parameters
@@ -276,10 +361,12 @@ def observables_to_detectors(
     -------
     new_dem
         Detector error model with ``obs_inds`` converted to ``det_inds``.
+        Its type is the same as ``dem``.
     """
-    if not isinstance(dem, stim.DetectorErrorModel):
+    if not isinstance(dem, (stim.DetectorErrorModel, DemArrays)):
         raise TypeError(
-            f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
+            "'dem' must be a stim.DetectorErrorModel or DemArrays, "
+            f"but {type(dem)} was given."
         )
     if obs_inds is None:
         obs_inds = list(range(dem.num_observables))
@@ -294,6 +381,9 @@ def observables_to_detectors(
     if any(not isinstance(d, int) for d in det_inds):
         raise TypeError("Each element in 'det_inds' must be an integer.")
 
+    if isinstance(dem, DemArrays):
+        return _observables_to_detectors_arrays(dem, obs_inds, det_inds)
+
     new_dem = stim.DetectorErrorModel()
     for instr in dem.flattened():
         if instr.type == "error":
@@ -337,8 +427,42 @@ def observables_to_detectors(
     return new_dem
 
 
+def _observables_to_detectors_arrays(
+    dem: DemArrays, obs_inds: list[int], det_inds: list[int]
+) -> DemArrays:
+    dets, det_ptr = dem.flipped_detectors()
+    obs, obs_ptr = dem.flipped_observables()
+    det_err_ids, obs_err_ids = dem.error_ids(det_ptr), dem.error_ids(obs_ptr)
+
+    # the observables are converted to detectors placed after the other detectors
+    to_det = np.isin(obs, obs_inds)
+    obs_to_det = dict(zip(obs_inds, det_inds))
+    new_dets = np.array([obs_to_det[o] for o in obs[to_det].tolist()], dtype=np.int64)
+    err_ids = np.concatenate([det_err_ids, obs_err_ids[to_det], obs_err_ids[~to_det]])
+    is_obs = np.zeros(len(err_ids), dtype=np.int64)
+    is_obs[len(dets) + len(new_dets) :] = 1
+    values = np.concatenate([dets, new_dets, obs[~to_det]])
+
+    attributes = stim.DetectorErrorModel()
+    for instr in dem.attributes:
+        if (instr.type == "logical_observable") and (
+            instr.targets_copy()[0].val in obs_to_det
+        ):
+            det_ind = obs_to_det[instr.targets_copy()[0].val]
+            attributes.append(
+                "detector", [], [stim.target_relative_detector_id(det_ind)]
+            )
+        else:
+            attributes.append(instr)
+
+    comp_ids = np.zeros(len(err_ids), dtype=np.int64)
+    return DemArrays.from_targets(
+        dem.probs.copy(), err_ids, comp_ids, is_obs, values, attributes
+    )
+
+
 def get_errors_triggering_detectors(
-    dem: stim.DetectorErrorModel, detectors: None | Sequence[int] = None
+    dem: DEM, detectors: None | Sequence[int] = None
 ) -> dict[int, list[int]]:
     """Returns a dictionary that lists all errors that flip each
     specified detector.
@@ -356,11 +480,13 @@ def get_errors_triggering_detectors(
     support
         Dictionary with keys corresponding to ``detectors`` and values corresponding
         the errors that flip the given detector. The errors are repesented as
-        indices, corresponding to ``dem.flattened()[i]``.
+        indices, corresponding to ``dem.flattened()[i]``. If ``dem`` is
+        a ``DemArrays``, the indices correspond to the error indices in ``dem``.
     """
-    if not isinstance(dem, stim.DetectorErrorModel):
+    if not isinstance(dem, (stim.DetectorErrorModel, DemArrays)):
         raise TypeError(
-            f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
+            "'dem' must be a stim.DetectorErrorModel or DemArrays, "
+            f"but {type(dem)} was given."
         )
     if detectors is None:
         detectors = list(range(dem.num_detectors))
@@ -370,6 +496,16 @@ def get_errors_triggering_detectors(
         )
 
     support = {d: [] for d in detectors}
+    # faster checking if the detector is in 'detectors'
+    detectors = set(detectors)
+    if isinstance(dem, DemArrays):
+        dets, det_ptr = dem.flipped_detectors()
+        mask = np.isin(dets, list(detectors))
+        err_ids = dem.error_ids(det_ptr)[mask]
+        for det, error_id in zip(dets[mask].tolist(), err_ids.tolist()):
+            support[det].append(error_id)
+        return support
+
     for error_id, instr in enumerate(dem.flattened()):
         if instr.type != "error":
             continue
@@ -382,8 +518,64 @@ def get_errors_triggering_detectors(
     return support
 
 
-def only_errors(dem: stim.DetectorErrorModel) -> stim.DetectorErrorModel:
+def dem_to_check_matrices(dem: DEM) -> tuple[object, object, npt.NDArray[np.floating]]:
+    """Returns the detector check matrix, the observable matrix and the
+    probabilities of the error instructions in the given DEM.
+
+    Parameters
+    ----------
+    dem
+        Detector error model.
+
+    Returns
+    -------
+    det_matrix
+        ``scipy.sparse.csc_matrix`` of shape ``(num_detectors, num_errors)``
+        in which column ``i`` has ones for the detectors flipped by error ``i``.
+    obs_matrix
+        ``scipy.sparse.csc_matrix`` of shape ``(num_observables, num_errors)``
+        in which column ``i`` has ones for the observables flipped by error ``i``.
+    priors
+        Probabilities of the errors.
+
+    Notes
+    -----
+    The errors are indexed following their order in ``dem.flattened()``
+    (without the instructions that are not errors), and the decomposition of
+    the errors is not taken into account, see ``DemArrays.flipped_detectors``.
+    The matrices are in CSC format, which is the natural format for the columns
+    of the errors. Use ``tocsr()`` for fast access to the rows of the detectors.
+
+    This function requires ``scipy``. To install the requirements to be able
+    to execute any function in ``qec_util``, run ``pip install qec_util[all]``.
+    """
+    if not isinstance(dem, (stim.DetectorErrorModel, DemArrays)):
+        raise TypeError(
+            "'dem' must be a stim.DetectorErrorModel or DemArrays, "
+            f"but {type(dem)} was given."
+        )
+
+    from scipy.sparse import csc_matrix
+
+    if isinstance(dem, stim.DetectorErrorModel):
+        dem = DemArrays.from_dem(dem)
+
+    # the CSC arrays of the matrices are the CSR arrays of the errors
+    matrices = []
+    for (inds, ptr), num_rows in zip(
+        [dem.flipped_detectors(), dem.flipped_observables()],
+        [dem.num_detectors, dem.num_observables],
+    ):
+        data = np.ones(len(inds), dtype=np.uint8)
+        matrices.append(csc_matrix((data, inds, ptr), shape=(num_rows, dem.num_errors)))
+
+    return matrices[0], matrices[1], dem.probs.copy()
+
+
+def only_errors(dem: DEM) -> DEM:
     """Returns the corresponding dem with only error instructions."""
+    if isinstance(dem, DemArrays):
+        return dem.select(np.arange(dem.num_errors), attributes=False)
     if not isinstance(dem, stim.DetectorErrorModel):
         raise TypeError(
             f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
@@ -397,7 +589,7 @@ def only_errors(dem: stim.DetectorErrorModel) -> stim.DetectorErrorModel:
 
 
 def remove_fake_errors(
-    circuit: stim.Circuit, dem: stim.DetectorErrorModel
+    circuit: stim.Circuit, dem: stim.DetectorErrorModel, num_workers: int = 1
 ) -> stim.DetectorErrorModel:
     """
     Removes errors in DEM that are due to non-deterministic detectors (fake errors).
@@ -425,6 +617,9 @@ def remove_fake_errors(
     .. code:
         error(0.1) D0
 
+    All the ``error(0.5)`` instructions are explained with a single call to
+    ``stim.Circuit.explain_detector_error_model_errors``. For large circuits,
+    the instructions can be split among ``num_workers`` processes.
 
     Notes
     -----
@@ -441,23 +636,87 @@ def remove_fake_errors(
             f"'circuit' must be a stim.Circuit, but {type(circuit)} was given."
         )
 
+    if not isinstance(num_workers, int):
+        raise TypeError(
+            f"'num_workers' must be an int, but {type(num_workers)} was given."
+        )
+    if num_workers < 1:
+        raise ValueError(
+            f"'num_workers' must be positive, but {num_workers} was given."
+        )
+
+    dem = dem.flattened()
+    fake_errors = {}
+    for instr in dem:
+        if instr.type == "error" and instr.args_copy()[0] == 0.5:
+            fake_errors.setdefault(instr_key(instr), instr)
+
+    if num_workers == 1 or len(fake_errors) <= 1:
+        dem_filter = stim.DetectorErrorModel()
+        for instr in fake_errors.values():
+            dem_filter.append(instr)
+        new_probs = _explained_probs(circuit, dem_filter)
+    else:
+        # the circuit and the DEMs are sent as strings because they are not picklable.
+        instrs = list(fake_errors.values())
+        num_chunks = min(num_workers, len(instrs))
+        dem_filters = []
+        for k in range(num_chunks):
+            dem_filter = stim.DetectorErrorModel()
+            for instr in instrs[k::num_chunks]:
+                dem_filter.append(instr)
+            dem_filters.append(str(dem_filter))
+        with multiprocessing.get_context().Pool(num_workers) as pool:
+            outputs = pool.starmap(
+                _explained_probs_str, [(str(circuit), f) for f in dem_filters]
+            )
+        new_probs = {k: v for output in outputs for k, v in output.items()}
+
     new_dem = stim.DetectorErrorModel()
-    for instr in dem.flattened():
-        if instr.type != "error":
+    for instr in dem:
+        if instr.type != "error" or instr.args_copy()[0] != 0.5:
             new_dem.append(instr)
             continue
-        if instr.args_copy()[0] != 0.5:
-            new_dem.append(instr)
+
+        new_prob = new_probs.get(instr_key(instr))
+        if new_prob is None:
+            # 50/50 statistics in detectors only comming from anticommuting resets
             continue
 
-        dem_filter = stim.DetectorErrorModel()
-        dem_filter.append(instr)
-        explained_errors = circuit.explain_detector_error_model_errors(
-            dem_filter=dem_filter
+        new_instr = stim.DemInstruction(
+            type="error", args=[new_prob], targets=instr.targets_copy()
         )
-        errors = explained_errors[0].circuit_error_locations
+        new_dem.append(new_instr)
+
+    return new_dem
+
+
+def _explained_probs(
+    circuit: stim.Circuit, dem_filter: stim.DetectorErrorModel
+) -> dict[Key, float | None]:
+    """Returns the probability of each error in ``dem_filter`` (identified by
+    its key, see ``DemIndex``) from the circuit errors that explain it, or ``None``
+    if no circuit error explains it."""
+    if dem_filter.num_errors == 0:
+        return {}
+
+    new_probs = {}
+    explained_errors = circuit.explain_detector_error_model_errors(
+        dem_filter=dem_filter
+    )
+    for explained_error in explained_errors:
+        dets, obs = set(), set()
+        for term in explained_error.dem_error_terms:
+            target = term.dem_target
+            if target.is_relative_detector_id():
+                dets.symmetric_difference_update([target.val])
+            elif target.is_logical_observable_id():
+                obs.symmetric_difference_update([target.val])
+        key = (tuple(sorted(dets)), tuple(sorted(obs)))
+
+        errors = explained_error.circuit_error_locations
         if len(errors) == 0:
-            # 50/50 statistics in detectors only comming from anticommuting resets
+            new_probs[key] = None
             continue
 
         probs = []
@@ -475,17 +734,19 @@ def remove_fake_errors(
                 raise ValueError(
                     f"Error from {error.instruction_targets.gate} not implemented."
                 )
-        new_prob = xor_probs(*probs)
-        new_instr = stim.DemInstruction(
-            type="error", args=[new_prob], targets=instr.targets_copy()
-        )
-        new_dem.append(new_instr)
+        new_probs[key] = xor_probs(*probs)
+
+    return new_probs
 
-    return new_dem
 
+def _explained_probs_str(circuit: str, dem_filter: str) -> dict[Key, float | None]:
+    return _explained_probs(stim.Circuit(circuit), stim.DetectorErrorModel(dem_filter))
 
-def remove_hyperedges(dem: stim.DetectorErrorModel) -> stim.DetectorErrorModel:
+
+def remove_hyperedges(dem: DEM) -> DEM:
     """Removes the hyperedges from the given DEM."""
+    if isinstance(dem, DemArrays):
+        return dem.select(np.diff(dem.flipped_detectors()[1]) <= 2)
     if not isinstance(dem, stim.DetectorErrorModel):
         raise TypeError(
             f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
@@ -503,10 +764,11 @@ def remove_hyperedges(dem: stim.DetectorErrorModel) -> stim.DetectorErrorModel:
     return new_dem
 
 
-def separate_edges_and_hyperedges(
-    dem: stim.DetectorErrorModel,
-) -> tuple[stim.DetectorErrorModel, stim.DetectorErrorModel]:
+def separate_edges_and_hyperedges(dem: DEM) -> tuple[DEM, DEM]:
     """Separates the edges and hyperedges in the given DEM."""
+    if isinstance(dem, DemArrays):
+        is_edge = np.diff(dem.flipped_detectors()[1]) <= 2
+        return dem.select(is_edge), dem.select(~is_edge)
     if not isinstance(dem, stim.DetectorErrorModel):
         raise TypeError(
             f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
@@ -528,6 +790,135 @@ def separate_edges_and_hyperedges(
     return graph_dem, hyper_dem
 
 
+def merge_errors(dem: DEM) -> DEM:
+    """Merges the errors in the DEM that flip the same detectors and observables.
+    Note that the decomposition of the errors is removed.
+
+    Parameters
+    ----------
+    dem
+        Detector error model.
+
+    Returns
+    -------
+    new_dem
+        Detector error model with one error for each set of detectors and
+        observables, in order of first appearance in ``dem``, followed by the
+        instructions that are not errors. The detectors and observables of
+        each error are sorted, as in ``qec_util.dem_instrs.sorted_dem_instr``.
+
+    Notes
+    -----
+    The errors are grouped and their probabilities combined with vectorized
+    operations, see ``qec_util.dem_instrs.merge_instrs`` for merging instructions.
+    The probability of an odd number of errors happening in a group is computed
+    as ``0.5 * (1 - prod(1 - 2 * p))`` in log space, which agrees with ``xor_probs``
+    up to floating-point rounding.
+    """
+    if isinstance(dem, stim.DetectorErrorModel):
+        return merge_errors(DemArrays.from_dem(dem)).to_dem()
+    if not isinstance(dem, DemArrays):
+        raise TypeError(
+            "'dem' must be a stim.DetectorErrorModel or DemArrays, "
+            f"but {type(dem)} was given."
+        )
+
+    dem = dem.undecomposed()
+    groups, first_inds = _group_errors(dem)
+    probs = _xor_probs_grouped(dem.probs, groups, len(first_inds))
+
+    # keep the order of first appearance
+    new_dem = dem.select(first_inds)
+    new_dem.probs = probs
+    return new_dem
+
+
+def _group_errors(
+    dem: DemArrays,
+) -> tuple[npt.NDArray[np.int64], npt.NDArray[np.int64]]:
+    """Returns the group of each error in ``dem`` and the index of the first error
+    of each group, so that errors flipping the same (sorted) detectors and
+    observables are in the same group. The groups are numbered in order of
+    first appearance and ``dem`` must not have separators."""
+    num_errors = len(dem)
+    if num_errors == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # each error is a row of its (padded) detectors and observables
+    num_dets, num_obs = np.diff(dem.det_ptr), np.diff(dem.obs_ptr)
+    max_dets, max_obs = int(num_dets.max()), int(num_obs.max())
+    rows = np.full((num_errors, 2 + max_dets + max_obs), -1, dtype=np.int64)
+    rows[:, 0], rows[:, 1] = num_dets, num_obs
+    err_ids = dem.error_ids()
+    positions = np.arange(len(dem.dets)) - dem.det_ptr[err_ids]
+    rows[err_ids, 2 + positions] = dem.dets
+    err_ids = dem.error_ids(dem.obs_ptr)
+    positions = np.arange(len(dem.obs)) - dem.obs_ptr[err_ids]
+    rows[err_ids, 2 + max_dets + positions] = dem.obs
+
+    _, first_inds, groups = np.unique(
+        rows, axis=0, return_index=True, return_inverse=True
+    )
+    order = np.argsort(first_inds, kind="stable")
+    relabel = np.empty_like(order)
+    relabel[order] = np.arange(len(order))
+    return relabel[groups.ravel()], first_inds[order]
+
+
+def _xor_probs_grouped(
+    probs: npt.NDArray[np.floating],
+    groups: npt.NDArray[np.int64],
+    num_groups: int,
+) -> npt.NDArray[np.floating]:
+    """Returns the probability of an odd number of events happening in each
+    group, i.e. ``0.5 * (1 - prod(1 - 2 * p))``. The probabilities of the
+    groups with a single event are not modified."""
+    factors = 1 - 2 * probs
+    is_zero = np.bincount(groups, weights=factors == 0, minlength=num_groups) > 0
+    is_neg = np.bincount(groups, weights=factors < 0, minlength=num_groups) % 2 == 1
+    # 'log1p' and 'expm1' avoid cancellations for small probabilities,
+    # as '1 - 2 * p' rounds 'p' away when 'p' is close to zero.
+    small = probs < 0.5
+    log_abs = np.zeros_like(factors)
+    log_abs[small] = np.log1p(-2 * probs[small])
+    large = ~small & (factors != 0)
+    log_abs[large] = np.log(np.abs(factors[large]))
+    log_prod = np.bincount(groups, weights=log_abs, minlength=num_groups)
+
+    # '+ 0.0' avoids returning '-0.0' when all probabilities are zero
+    new_probs = np.where(
+        is_neg, 0.5 * (1 + np.exp(log_prod)), -0.5 * np.expm1(log_prod) + 0.0
+    )
+    new_probs[is_zero] = 0.5
+
+    sizes = np.bincount(groups, minlength=num_groups)
+    single = sizes[groups] == 1
+    new_probs[groups[single]] = probs[single]
+    return new_probs
+
+
+def _xor_probs_in_order(
+    probs: npt.NDArray[np.floating],
+    groups: npt.NDArray[np.int64],
+    num_groups: int,
+) -> npt.NDArray[np.floating]:
+    """Returns the probability of an odd number of events happening in each
+    group, combining the probabilities of each group in the given order with
+    the same operations as ``xor_probs``, so that the results are identical."""
+    order = np.argsort(groups, kind="stable")
+    sorted_groups = groups[order]
+    starts = np.searchsorted(sorted_groups, sorted_groups, side="left")
+    ranks = np.arange(len(groups)) - starts
+
+    # the loop runs over the position within the group, not over the events
+    new_probs = np.zeros(num_groups)
+    for rank in range(int(ranks.max(initial=-1)) + 1):
+        inds = order[ranks == rank]
+        g, p = groups[inds], probs[inds]
+        new_probs[g] = new_probs[g] * (1 - p) + (1 - new_probs[g]) * p
+    return new_probs
+
+
 def prepare_distance2_dem_for_pymatching(
     dem: stim.DetectorErrorModel,
 ) -> stim.DetectorErrorModel:
@@ -545,47 +936,54 @@ def prepare_distance2_dem_for_pymatching(
             f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
         )
 
-    edges = {}
-    attributes_dem = stim.DetectorErrorModel()
-    for instr in dem.flattened():
-        if instr.type != "error":
-            attributes_dem.append(instr)
-            continue
-
-        detectors = get_detectors(instr)
-        if len(detectors) > 2:
-            raise ValueError(f"'dem' contains hyperedges: {instr}.")
-
-        if detectors not in edges:
-            edges[detectors] = []
-        edges[detectors].append(instr)
-
+    dem = dem.flattened()
+    dem_arrays = DemArrays.from_dem(dem)
+    merged = dem_arrays.undecomposed()
+    num_dets = np.diff(merged.det_ptr)
+    if (num_dets > 2).any():
+        ind = int(np.argmax(num_dets > 2))
+        instr = dem_arrays.select([ind], attributes=False).to_dem()[0]
+        raise ValueError(f"'dem' contains hyperedges: {instr}.")
+
+    # the edges are identified by an integer key of their (padded) detectors
+    # and the errors with the same observables are merged in each edge.
+    pad = np.full((len(merged), 2), -1, dtype=np.int64)
+    err_ids = merged.error_ids()
+    pad[err_ids, np.arange(len(merged.dets)) - merged.det_ptr[err_ids]] = merged.dets
+    keys = (pad[:, 0] + 1) * (merged.num_detectors + 1) + (pad[:, 1] + 1)
+    _, edge_first_inds, edges = np.unique(keys, return_index=True, return_inverse=True)
+    sizes = np.bincount(edges)
+
+    groups, first_inds = _group_errors(merged)
+    probs = _xor_probs_in_order(merged.probs, groups, len(first_inds))
+
+    # the most likely group of each edge, with ties broken by order of appearance
+    group_edges = edges[first_inds]
+    order = np.lexsort((first_inds, -probs, group_edges))
+    is_first = np.ones(len(order), dtype=bool)
+    is_first[1:] = group_edges[order[1:]] != group_edges[order[:-1]]
+    best_groups = np.empty(len(sizes), dtype=np.int64)
+    best_groups[group_edges[order[is_first]]] = order[is_first]
+
+    # the errors of the edges with only one error are not modified
+    errors = [instr for instr in dem if instr.type == "error"]
+    merged = merged.select(first_inds[best_groups], attributes=False)
+    merged.probs = probs[best_groups]
+    merged_errors = list(merged.to_dem())
     new_dem = stim.DetectorErrorModel()
-    for instrs in edges.values():
-        if len(instrs) == 1:
-            new_dem.append(instrs[0])
-            continue
-
-        unique_obs = set([get_observables(i) for i in instrs])
-        if len(unique_obs) == 1:
-            new_dem.append(merge_instrs(*instrs))
-            continue
-
-        sets = {obs: [] for obs in unique_obs}
-        for instr in instrs:
-            sets[get_observables(instr)].append(instr)
-        options = [merge_instrs(*i) for i in sets.values()]
-        probs = [i.args_copy()[0] for i in options]
-        index = np.argmax(probs)
-        new_dem.append(options[index])
+    for edge in np.argsort(edge_first_inds, kind="stable"):
+        if sizes[edge] == 1:
+            new_dem.append(errors[edge_first_inds[edge]])
+        else:
+            new_dem.append(merged_errors[edge])
 
-    new_dem += attributes_dem
+    new_dem += dem_arrays.attributes
     return new_dem
 
 
 def detectors_to_observables(
-    dem: stim.DetectorErrorModel, det_to_obs: int | dict[stim.DemTarget, stim.DemTarget]
-) -> stim.DetectorErrorModel:
+    dem: DEM, det_to_obs: int | dict[stim.DemTarget, stim.DemTarget]
+) -> DEM:
     """Converts the specified detectors to observables in the given DEM.
 
     Parameters
@@ -599,9 +997,10 @@ def detectors_to_observables(
         i.e., ``detector[num_dets - n]`` will correspond to observable ``0``
         and ``detector[num_dets - 1]`` will correspond to observable ``n-1``.
     """
-    if not isinstance(dem, stim.DetectorErrorModel):
+    if not isinstance(dem, (stim.DetectorErrorModel, DemArrays)):
         raise TypeError(
-            f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
+            "'dem' must be a stim.DetectorErrorModel or DemArrays, "
+            f"but {type(dem)} was given."
         )
     if isinstance(det_to_obs, int):
         det_to_obs = {
@@ -611,6 +1010,22 @@ def detectors_to_observables(
             for n in range(det_to_obs)
         }
 
+    if isinstance(dem, DemArrays):
+        err_ids, comp_ids, is_obs, values = dem.to_targets()
+        mapping = {d.val: o.val for d, o in det_to_obs.items()}
+        to_obs = (is_obs == 0) & np.isin(values, list(mapping))
+        values[to_obs] = [mapping[d] for d in values[to_obs].tolist()]
+        is_obs[to_obs] = 1
+        attributes = stim.DetectorErrorModel()
+        for instr in dem.attributes:
+            if (instr.type != "detector") or (
+                instr.targets_copy()[0] not in det_to_obs
+            ):
+                attributes.append(instr)
+        return DemArrays.from_targets(
+            dem.probs.copy(), err_ids, comp_ids, is_obs, values, attributes
+        )
+
     new_dem = stim.DetectorErrorModel()
     for instr in dem.flattened():
         if instr.type == "error":
@@ -626,20 +1041,36 @@ def detectors_to_observables(
     return new_dem
 
 
-def get_dem_subgraph(
-    dem: stim.DetectorErrorModel, dets: Collection[int]
-) -> stim.DetectorErrorModel:
+def get_dem_subgraph(dem: DEM | DemFileReader, dets: Collection[int]) -> DEM:
     """Returns the DEM subgraph corresponding to only taking the specified
-    detectors from the given DEM. Does not shift the detector indices."""
-    if not isinstance(dem, stim.DetectorErrorModel):
+    detectors from the given DEM. Does not shift the detector indices.
+    If ``dem`` is a ``DemFileReader``, it returns a ``DemArrays``."""
+    if not isinstance(dem, (stim.DetectorErrorModel, DemArrays, DemFileReader)):
         raise TypeError(
-            f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
+            "'dem' must be a stim.DetectorErrorModel or DemArrays, "
+            f"but {type(dem)} was given."
         )
     if not isinstance(dets, Collection):
         raise TypeError(f"'dets' must be a set, but {type(dets)} was given.")
     if any(not isinstance(d, int) for d in dets):
         raise TypeError("Elements in 'dets' must be integers.")
 
+    if isinstance(dem, DemFileReader):
+        return DemArrays.concatenate([get_dem_subgraph(chunk, dets) for chunk in dem])
+    if isinstance(dem, DemArrays):
+        err_ids, comp_ids, is_obs, values = dem.to_targets()
+        keep = (is_obs == 1) | np.isin(values, list(dets))
+        new_dem = DemArrays.from_targets(
+            dem.probs.copy(),
+            err_ids[keep],
+            comp_ids[keep],
+            is_obs[keep],
+            values[keep],
+            dem.attributes.copy(),
+        )
+        # remove empty instructions
+        return new_dem.select(np.diff(new_dem.det_ptr) + np.diff(new_dem.obs_ptr) > 0)
+
     # faster checking in target is in 'dets'
     dets = set(dets)
 
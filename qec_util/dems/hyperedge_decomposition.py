@@ -1,20 +1,18 @@
+import multiprocessing
+
+import numpy as np
 import stim
 
-from ..dem_instrs import (
-    decompose_hyperedge_to_edges,
-    decomposed_instrs,
-    get_detectors,
-    has_separator,
-    sorted_dem_instr,
-    xor_probs,
-)
-from .dems import only_errors, remove_hyperedges
+from ..dem_instrs import HyperedgeDecomposer, get_detectors
+from .dem_arrays import DemArrays
+from .dems import _group_errors, _xor_probs_in_order, only_errors, remove_hyperedges
 
 
 def decompose_hyperedges_to_edges(
     dem: stim.DetectorErrorModel,
     dem_edges: stim.DetectorErrorModel | None = None,
     ignore_decomposition_failures: bool = False,
+    num_workers: int = 1,
 ) -> stim.DetectorErrorModel:
     """Decomposes the hyperedges from the given detector model into edges using
     Algorithm 3 from https://doi.org/10.48550/arXiv.2309.15354.
@@ -32,6 +30,10 @@ def decompose_hyperedges_to_edges(
         If ``True``, does not raises an error if any hyperedge decomposition does not
         match the logical observable effect of the hyperedge.
         By default ``False``.
+    num_workers
+        Number of processes in which to decompose the hyperedges. Each process
+        builds its own matching graph from ``dem_edges``. The output does
+        not depend on the number of workers. By default ``1``.
 
     Returns
     -------
@@ -56,22 +58,77 @@ def decompose_hyperedges_to_edges(
             f"'dem_edges' must be a stim.DetectorErrorModel, but {type(dem_edges)} was given."
         )
 
-    decomposed_dem = stim.DetectorErrorModel()
-    for instr in dem:
-        if instr.type != "error" or len(get_detectors(instr)) <= 2:
-            decomposed_dem.append(instr)
-        else:
-            decomposed_dem.append(
-                decompose_hyperedge_to_edges(
-                    instr,
-                    dem_edges,
-                    ignore_decomposition_failure=ignore_decomposition_failures,
-                )
+    if not isinstance(num_workers, int):
+        raise TypeError(
+            f"'num_workers' must be an int, but {type(num_workers)} was given."
+        )
+    if num_workers < 1:
+        raise ValueError(
+            f"'num_workers' must be positive, but {num_workers} was given."
+        )
+
+    instrs = list(dem)
+    hyperedge_inds = [
+        k
+        for k, instr in enumerate(instrs)
+        if instr.type == "error" and len(get_detectors(instr)) > 2
+    ]
+
+    if num_workers == 1 or len(hyperedge_inds) <= 1:
+        decomposer = HyperedgeDecomposer(dem_edges)
+        for k in hyperedge_inds:
+            instrs[k] = decomposer.decompose(
+                instrs[k], ignore_decomposition_failure=ignore_decomposition_failures
             )
+    else:
+        # the instructions are sent as DEM strings because they are not picklable.
+        # the chunks are small enough to balance the load between the workers.
+        num_chunks = min(4 * num_workers, len(hyperedge_inds))
+        chunks = []
+        for i in range(num_chunks):
+            chunk = stim.DetectorErrorModel()
+            for k in hyperedge_inds[i::num_chunks]:
+                chunk.append(instrs[k])
+            chunks.append(str(chunk))
+        with multiprocessing.get_context().Pool(
+            num_workers,
+            initializer=_init_decomposer,
+            initargs=(str(dem_edges), ignore_decomposition_failures),
+        ) as pool:
+            outputs = pool.map(_decompose_chunk, chunks)
+        for i, output in enumerate(outputs):
+            for j, instr in enumerate(stim.DetectorErrorModel(output)):
+                instrs[hyperedge_inds[i + j * num_chunks]] = instr
+
+    decomposed_dem = stim.DetectorErrorModel()
+    for instr in instrs:
+        decomposed_dem.append(instr)
 
     return decomposed_dem
 
 
+_DECOMPOSER: tuple[HyperedgeDecomposer, bool] | None = None
+
+
+def _init_decomposer(dem_edges: str, ignore_decomposition_failures: bool):
+    global _DECOMPOSER
+    decomposer = HyperedgeDecomposer(stim.DetectorErrorModel(dem_edges))
+    _DECOMPOSER = (decomposer, ignore_decomposition_failures)
+    return
+
+
+def _decompose_chunk(hyperedges: str) -> str:
+    decomposer, ignore_decomposition_failures = _DECOMPOSER
+    decomposed_dem = stim.DetectorErrorModel()
+    for hyperedge in stim.DetectorErrorModel(hyperedges):
+        decomposed_dem.append(
+            decomposer.decompose(
+                hyperedge, ignore_decomposition_failure=ignore_decomposition_failures
+            )
+        )
+    return str(decomposed_dem)
+
+
 def decomposed_graphlike_dem(
     dem: stim.DetectorErrorModel, prob_method: str = "same"
 ) -> stim.DetectorErrorModel:
@@ -91,48 +148,56 @@ def decomposed_graphlike_dem(
         raise TypeError(
             f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
         )
+    if prob_method not in ("same", "zero"):
+        raise ValueError(
+            f"The available options for 'prob_method' are 'same' and 'zero', but {prob_method} was given."
+        )
 
-    edges = {}
-    hyperedges = []
-    attributes_dem = stim.DetectorErrorModel()
-    for instr in dem.flattened():
-        if instr.type != "error":
-            attributes_dem.append(instr)
-            continue
-
-        # it could be possible that an edge has been decomposed...
-        if has_separator(instr):
-            hyperedges.append(instr)
-            continue
-
-        if len(get_detectors(instr)) <= 2:
-            sorted_instr = sorted_dem_instr(instr, prob=0)
-            prob = instr.args_copy()[0]
-            if sorted_instr not in edges:
-                edges[sorted_instr] = 0
-            edges[sorted_instr] = xor_probs(prob, edges[sorted_instr])
-        else:
-            hyperedges.append(instr)
-
-    for hyperedge in hyperedges:
-        for edge in decomposed_instrs(hyperedge, prob_method=prob_method):
-            if len(get_detectors(edge)) > 2:
-                raise ValueError(f"Non-decomposed hyperedge found in dem: {edge}.")
-
-            sorted_instr = sorted_dem_instr(edge, prob=0)
-            if sorted_instr not in edges:
-                raise ValueError(
-                    f"Edge '{edge}' found in a decomposition is not an existing edge in the DEM."
-                )
-
-            prob = edge.args_copy()[0]
-            edges[sorted_instr] = xor_probs(prob, edges[sorted_instr])
-
-    decomposed_dem = stim.DetectorErrorModel()
-    for edge, prob in edges.items():
-        instr = stim.DemInstruction("error", args=[prob], targets=edge.targets_copy())
-        decomposed_dem.append(instr)
+    dem = DemArrays.from_dem(dem)
+
+    # each decomposition component is treated as an error, with the components
+    # of the edges placed before the ones of the hyperedges (and decomposed edges)
+    # so that the merged edges follow the order of first appearance in 'dem'.
+    num_comps = np.diff(dem.sep_ptr) + 1
+    comp_ptr = np.concatenate([[0], np.cumsum(num_comps)])
+    is_hyperedge = (num_comps > 1) | (np.diff(dem.det_ptr) > 2)
+    is_hyper_comp = np.repeat(is_hyperedge, num_comps)
+    order = np.argsort(is_hyper_comp, kind="stable")
+    new_ids = np.empty_like(order)
+    new_ids[order] = np.arange(len(order))
+
+    err_ids, comp_ids, is_obs, values = dem.to_targets()
+    comp_ids = new_ids[comp_ptr[err_ids] + comp_ids]
+    sort = np.lexsort((values, is_obs, comp_ids))
+    comps = DemArrays.from_targets(
+        np.repeat(dem.probs, num_comps)[order],
+        comp_ids[sort],
+        np.zeros(len(sort), dtype=np.int64),
+        is_obs[sort],
+        values[sort],
+        attributes=dem.attributes,
+    )
+    is_hyper_comp = is_hyper_comp[order]
+    if prob_method == "zero":
+        comps.probs[is_hyper_comp] = 0
+
+    groups, first_inds = _group_errors(comps)
+    is_edge_group = ~is_hyper_comp[first_inds]
+    is_large = np.diff(comps.det_ptr) > 2
+    is_invalid = is_hyper_comp & (is_large | ~is_edge_group[groups])
+    if is_invalid.any():
+        ind = int(np.argmax(is_invalid))
+        err_ind = int(np.searchsorted(comp_ptr, order[ind], side="right")) - 1
+        hyperedge = dem.select([err_ind], attributes=False).to_dem()[0]
+        if is_large[ind]:
+            raise ValueError(f"Non-decomposed hyperedge found in dem: {hyperedge}.")
+        raise ValueError(
+            f"Edge '{comps.select([ind], attributes=False).to_dem()[0]}' found in "
+            f"the decomposition of '{hyperedge}' is not an existing edge in the DEM."
+        )
 
-    decomposed_dem += attributes_dem
+    probs = _xor_probs_in_order(comps.probs, groups, len(first_inds))
+    decomposed_dem = comps.select(first_inds)
+    decomposed_dem.probs = probs
 
-    return decomposed_dem
+    return decomposed_dem.to_dem()
@@ -5,11 +5,7 @@ import numpy as np
 import numpy.typing as npt
 import stim
 
-from ..dems import (
-    get_errors_triggering_detectors,
-    observables_to_detectors,
-    only_errors,
-)
+from ..dems import dem_to_check_matrices, observables_to_detectors, only_errors
 
 
 class Decoder:
@@ -39,7 +35,7 @@ def get_circuit_distance(
 
     Notes
     -----
-    This function requires ``gurobipy``. To install the requirements to be able
+    This function requires ``gurobipy`` and ``scipy``. To install the requirements to be able
     to execute any function in ``qec_util``, run ``pip install qec_util[all]``.
     See ``README.md`` for how to set up the Gurobi license.
     """
@@ -82,7 +78,7 @@ def get_circuit_distance_observable(
 
     Notes
     -----
-    This function requires ``gurobipy``. To install the requirements to be able
+    This function requires ``gurobipy`` and ``scipy``. To install the requirements to be able
     to execute any function in ``qec_util``, run ``pip install qec_util[all]``.
     See ``README.md`` for how to set up the Gurobi license.
     """
@@ -99,12 +95,20 @@ def get_circuit_distance_observable(
 
     import gurobipy as gp
     from gurobipy import GRB
+    from scipy.sparse import vstack
 
     dem = dem.flattened()
     dem = only_errors(dem)
-    obs_det_inds = [dem.num_detectors + i for i, _ in enumerate(obs_inds)]
-    new_dem = observables_to_detectors(dem, obs_inds=obs_inds, det_inds=obs_det_inds)
-    det_support = get_errors_triggering_detectors(new_dem)
+    det_matrix, obs_matrix, _ = dem_to_check_matrices(dem)
+
+    # the errors must not trigger any detector but flip the observables,
+    # i.e. 'matrix @ errors = syndrome (mod 2)'. The rows without support
+    # are skipped because they do not constraint the errors.
+    matrix = vstack([det_matrix, obs_matrix[obs_inds]], format="csr")
+    syndrome = np.zeros(matrix.shape[0], dtype=int)
+    syndrome[det_matrix.shape[0] :] = 1
+    has_support = matrix.getnnz(axis=1) > 0
+    matrix, syndrome = matrix[has_support], syndrome[has_support]
 
     # define model
     model = gp.Model("milp")
@@ -112,25 +116,14 @@ def get_circuit_distance_observable(
     model.Params.LogToConsole = 0
 
     # define variables
-    errors = model.addMVar(shape=new_dem.num_errors, vtype=GRB.BINARY, name="errors")
-    dummy = model.addMVar(
-        shape=new_dem.num_detectors, vtype=GRB.INTEGER, name="dummy", lb=0
-    )
+    errors = model.addMVar(shape=dem.num_errors, vtype=GRB.BINARY, name="errors")
+    dummy = model.addMVar(shape=matrix.shape[0], vtype=GRB.INTEGER, name="dummy", lb=0)
 
     # add constraints
-    for det_id, support in det_support.items():
-        if len(support) == 0:
-            continue
-        defect = 1 if det_id in obs_det_inds else 0
-        support = np.array(support)
-
-        model.addConstr(
-            errors[support] @ np.ones_like(support) - 2 * dummy[det_id] == defect,
-            f"syndrome{det_id}",
-        )
+    model.addConstr(matrix @ errors - 2 * dummy == syndrome, "syndrome")
 
     # define cost function to maximize
-    obj_fn = np.ones(new_dem.num_errors).T @ errors
+    obj_fn = np.ones(dem.num_errors).T @ errors
     model.setObjective(obj_fn, GRB.MINIMIZE)
 
     # update model to build the contraints and cost function
@@ -141,7 +134,7 @@ def get_circuit_distance_observable(
 
     # convert errors to stim.DetectorErrorModel (attribute 'x' has the numpy values)
     error_vars = []
-    for k in range(new_dem.num_errors):
+    for k in range(dem.num_errors):
         error_vars.append(model.getVarByName(f"errors[{k}]"))
     error_ids = [k for k, v in enumerate(model.getAttr("X", error_vars)) if v]
 
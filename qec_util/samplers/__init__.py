@@ -1,13 +1,21 @@
+from .rare_events import sample_failures_importance
 from .samplers import (
     merge_batches_in_file,
     merge_files,
     read_failures_from_file,
     sample_failures,
 )
+from .storage import FailuresFileReader, checkpoint_file_name
+from .sweeps import read_sweep_from_file, sample_failures_sweep
 
 __all__ = [
     "sample_failures",
     "read_failures_from_file",
     "merge_batches_in_file",
     "merge_files",
+    "FailuresFileReader",
+    "checkpoint_file_name",
+    "sample_failures_sweep",
+    "read_sweep_from_file",
+    "sample_failures_importance",
 ]
@@ -0,0 +1,249 @@
+import time
+from collections.abc import Callable
+from datetime import datetime
+
+import numpy as np
+import numpy.typing as npt
+import stim
+
+from .samplers import BinVect, _get_decoder, _rel_ci_width
+
+
+def sample_failures_importance(
+    dem: stim.DetectorErrorModel,
+    decoder,
+    boost: int | float,
+    max_samples: int | float = np.inf,
+    max_time: int | float = np.inf,
+    target_rel_ci_width: int | float | None = None,
+    batch_size: int = 1_000,
+    decoding_failure: Callable[[BinVect], BinVect] = lambda x: x.any(axis=1),
+    post_selection: Callable[[BinVect], BinVect] = lambda x: np.ones(
+        len(x), dtype=bool
+    ),
+    seed: int | None = None,
+    verbose: int = 2,
+) -> tuple[float, float, int, dict[str, int | float]]:
+    """Estimates the logical error probability of ``dem`` using importance
+    sampling, i.e. sampling from a DEM with boosted error probabilities and
+    reweighting each sample by its likelihood ratio with respect to ``dem``.
+
+    It is useful for physical error probabilities well below threshold, in which
+    ``sample_failures`` requires a very large number of samples to observe
+    a few decoding failures.
+
+    Parameters
+    ----------
+    dem
+        Detector error model for which to estimate the logical error probability.
+    decoder
+        Decoder object with a ``decode_batch`` method, or a callable that
+        returns the decoder object when called with ``dem``. The decoder
+        must correspond to ``dem``, not to the boosted DEM.
+    boost
+        Factor by which the error probabilities are multiplied in the boosted DEM.
+        The boosted probabilities are capped at ``0.5`` (unless they were
+        already larger than ``0.5``).
+    max_time
+        Maximum duration for this function, in seconds.
+        By default``np.inf`` to not place any restriction on runtime.
+    max_samples
+        Maximum number of samples to reach before stopping the calculation.
+        By default ``np.inf`` to not have any restriction on the
+        maximum number of samples.
+    target_rel_ci_width
+        Target width of the confidence interval of the logical error probability
+        relative to the logical error probability, see Notes.
+        By default ``None``, which does not place any restriction on the precision.
+    batch_size
+        Number of samples to decode per batch. By default ``1_000``.
+    decoding_failure
+        Function that returns ``True`` if there has been a decoding failure.
+        See ``sample_failures`` for more information.
+    post_selection
+        Function that returns ``True`` if the sample needs to be kept.
+        See ``sample_failures`` for more information.
+    seed
+        Seed for the sampler of the boosted DEM. By default ``None``,
+        which uses a random seed.
+    verbose
+        Level of verbose during sampling. By default, the maximum level is
+        selected (``2``). To not print information, select ``0`` or ``False``.
+
+    Returns
+    -------
+    num_failures
+        Effective number of decoding failures after post-selection, see Notes.
+    num_samples_ps
+        Effective number of samples kept after post-selection, see Notes.
+    num_samples
+        Number of samples taken from the boosted DEM.
+    extra
+        Dictionary with the estimated logical error probability (``"prob"``),
+        its standard deviation (``"std"``), the number of failures and post-selected
+        samples observed in the boosted DEM (``"num_failures_sampled"`` and
+        ``"num_samples_ps_sampled"``), and the decoding runtime (``"seconds"``).
+
+    Notes
+    -----
+    Without post-selection, the estimator ``mean(w * failure)`` (with ``w`` the
+    likelihood ratio of each sample) is unbiased. With post-selection, the
+    ratio ``mean(w * failure * kept) / mean(w * kept)`` is used, which is
+    consistent, and its variance is estimated with the delta method.
+
+    The effective number of samples is ``prob * (1 - prob) / std**2`` and the
+    effective number of failures is ``prob`` times the effective number of samples.
+    Therefore, ``num_failures / num_samples_ps`` is the estimated logical error
+    probability, and ``qec_util.performance.confidence_interval_binomial``
+    gives (approximately) its confidence interval. This interval is the one
+    used for ``target_rel_ci_width``.
+
+    The boost should be chosen so that the boosted DEM has a few failures
+    per batch, but remains well below threshold. Too large boosts make the
+    variance of the likelihood ratios (and thus of the estimate) explode.
+    """
+    if not isinstance(dem, stim.DetectorErrorModel):
+        raise TypeError(
+            f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
+        )
+    if "decode_batch" not in dir(decoder) and not callable(decoder):
+        raise TypeError("'decoder' does not have a 'decode_batch' method.")
+    if not isinstance(boost, (int, float)):
+        raise TypeError(
+            f"'boost' must be an int or float, but {type(boost)} was given."
+        )
+    if boost <= 0:
+        raise ValueError(f"'boost' must be positive, but {boost} was given.")
+    if not isinstance(batch_size, int):
+        raise TypeError(
+            f"'batch_size' must be an int, but {type(batch_size)} was given."
+        )
+    if (max_samples == np.inf) and (max_time == np.inf) and not target_rel_ci_width:
+        raise ValueError(
+            "One of 'max_samples', 'max_time' or 'target_rel_ci_width' must be given."
+        )
+
+    def print_v(string: str):
+        if verbose:
+            print(datetime.now(), string)
+        return
+
+    print_v("Building boosted DEM...")
+    boosted_dem, log_ratios, log_offset = _boost_dem(dem, boost)
+    sampler = boosted_dem.compile_sampler(seed=seed)
+    decoder = _get_decoder(decoder, dem)
+
+    # sums over the samples of 'w * f * ps', '(w * f * ps)**2', 'w * ps', '(w * ps)**2'
+    sums = np.zeros(4)
+    num_failures, num_samples_ps, num_samples, runtime = 0, 0, 0, 0.0
+    estimate = (0.0, 0.0, 0.0, 0.0)
+    t_init = time.time()
+    while True:
+        _, _, num_failures_eff, num_samples_eff = estimate
+        if num_samples >= max_samples or time.time() - t_init >= max_time:
+            break
+        if target_rel_ci_width and (
+            _rel_ci_width(num_failures_eff, num_samples_eff) <= target_rel_ci_width
+        ):
+            break
+
+        shots = int(min(batch_size, max_samples - num_samples))
+        print_v(f"Sampling {shots} shots from the boosted DEM...")
+        defects, log_flips, errors = sampler.sample(shots, return_errors=True)
+        weights = np.exp(_log_weights(errors, log_ratios, log_offset))
+
+        print_v(f"Decoding {shots} shots...")
+        t0 = time.time()
+        predictions = decoder.decode_batch(defects)
+        runtime += time.time() - t0
+        log_errors = predictions != log_flips
+        post_selected = post_selection(log_errors)
+        failures = np.zeros(shots, dtype=bool)
+        failures[post_selected] = decoding_failure(log_errors[post_selected])
+
+        x = weights * failures
+        y = weights * post_selected
+        sums += [x.sum(), (x**2).sum(), y.sum(), (y**2).sum()]
+        num_failures += int(failures.sum())
+        num_samples_ps += int(post_selected.sum())
+        num_samples += shots
+
+        estimate = _estimate(sums, num_samples, ps=num_samples_ps < num_samples)
+        print_v(
+            f"Estimated probability {estimate[0]:0.3e} +- {estimate[1]:0.3e} "
+            f"({num_failures} failures in {num_samples} boosted samples)."
+        )
+
+    prob, std, num_failures_eff, num_samples_eff = estimate
+    extra: dict[str, int | float] = {
+        "prob": prob,
+        "std": std,
+        "num_failures_sampled": num_failures,
+        "num_samples_ps_sampled": num_samples_ps,
+        "seconds": runtime,
+    }
+    return num_failures_eff, num_samples_eff, num_samples, extra
+
+
+def _boost_dem(
+    dem: stim.DetectorErrorModel, boost: int | float
+) -> tuple[stim.DetectorErrorModel, npt.NDArray[np.floating], float]:
+    """Returns the boosted DEM, and the log-likelihood ratio of each error
+    mechanism being triggered (relative to it not being triggered) and the
+    log-likelihood ratio of no error being triggered."""
+    boosted_dem = stim.DetectorErrorModel()
+    probs, boosted_probs = [], []
+    for instr in dem.flattened():
+        if instr.type != "error":
+            boosted_dem.append(instr)
+            continue
+
+        prob = instr.args_copy()[0]
+        boosted_prob = min(boost * prob, max(prob, 0.5))
+        boosted_dem.append("error", boosted_prob, instr.targets_copy())
+        probs.append(prob)
+        boosted_probs.append(boosted_prob)
+
+    p, q = np.array(probs), np.array(boosted_probs)
+    # errors with 'q = 0' are never sampled, thus their log-ratio is irrelevant
+    with np.errstate(divide="ignore", invalid="ignore"):
+        log_no_error = np.log1p(-p) - np.log1p(-q)
+        log_ratios = np.where(q > 0, np.log(p) - np.log(q) - log_no_error, 0)
+    return boosted_dem, log_ratios, float(log_no_error.sum())
+
+
+def _log_weights(
+    errors: npt.NDArray[np.bool_],
+    log_ratios: npt.NDArray[np.floating],
+    log_offset: float,
+) -> npt.NDArray[np.floating]:
+    """Returns the log-likelihood ratio of each sample, using that the
+    ``errors`` matrix is sparse."""
+    rows, cols = np.nonzero(errors)
+    log_weights = np.bincount(rows, weights=log_ratios[cols], minlength=len(errors))
+    return log_weights + log_offset
+
+
+def _estimate(
+    sums: npt.NDArray[np.floating], num_samples: int, ps: bool
+) -> tuple[float, float, float, float]:
+    """Returns the estimated probability, its standard deviation, and the
+    effective number of failures and samples."""
+    mean_x, mean_x2, mean_y, mean_y2 = sums / num_samples
+    if not ps:
+        prob = mean_x
+        var = (mean_x2 - mean_x**2) / num_samples
+    elif mean_y > 0:
+        # delta method for the ratio estimator, with 'mean(x * y) = mean(x**2)'
+        prob = mean_x / mean_y
+        var = mean_x2 - 2 * prob * mean_x2 + prob**2 * mean_y2
+        var /= num_samples * mean_y**2
+    else:
+        return 0.0, 0.0, 0.0, 0.0
+
+    var = max(var, 0)
+    if prob == 0 or var == 0:
+        return float(prob), float(np.sqrt(var)), 0.0, float(num_samples)
+
+    num_samples_eff = prob * (1 - prob) / var
+    return float(prob), float(np.sqrt(var)), prob * num_samples_eff, num_samples_eff
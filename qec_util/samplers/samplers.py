@@ -1,7 +1,13 @@
 import csv
+import hashlib
+import inspect
+import multiprocessing
 import os
 import pathlib
+import queue
+import threading
 import time
+import traceback
 from collections.abc import Callable, Sequence
 from datetime import datetime
 
@@ -9,6 +15,18 @@ import numpy as np
 import numpy.typing as npt
 import stim
 
+from ..performance import confidence_interval_binomial
+from .storage import (
+    HEADER,
+    FailuresFileReader,
+    _append_binary_data,
+    _load_checkpoint,
+    _read_binary_file,
+    _update_checkpoint,
+    _write_binary_header,
+    is_binary_file,
+)
+
 # the package "fcntl" is only available for Unix systems.
 FILE_LOCKING = False
 try:
@@ -21,8 +39,6 @@ except ImportError:
 BinVect = npt.NDArray[np.bool_]
 ExtraMetrics = dict[str, BinVect]
 
-HEADER = ["num_failures_ps", "num_samples_ps", "num_samples", "seconds"]
-
 
 def sample_failures(
     dem: stim.DetectorErrorModel,
@@ -44,11 +60,21 @@ def sample_failures(
     extra_metrics: Callable[[BinVect], ExtraMetrics] = lambda _: {},
     extra_metrics_ps: Callable[[BinVect], ExtraMetrics] = lambda _: {},
     verbose: int = 2,
+    num_workers: int = 1,
+    seed: int | None = None,
+    batch_time: int | float | None = None,
+    prefetch: int = 0,
+    bit_packed: bool = False,
+    checkpoint: bool = False,
+    decoder_config: object = None,
+    target_rel_ci_width: int | float | None = None,
+    target_rel_ci_width_metrics: dict[str, int | float] | None = None,
 ) -> tuple[int, int, int, dict[str, int | float]]:
     """Samples decoding failures until ALL the MINIMUM requirements have been
     fulfilled (i.e. ``min_failures``, ``min_time``, ``min_samples``, ``min_samples_ps``)
     and ONE of the MAXIMUM requirements has been fulfilled:
-    ``max_failures``, ``max_time``, ``max_samples``, ``max_samples_ps``.
+    ``max_failures``, ``max_time``, ``max_samples``, ``max_samples_ps``, and
+    the precision given by ``target_rel_ci_width`` and ``target_rel_ci_width_metrics``.
 
     By default, all the minimum requirements are always fulfilled,
     and the sampling runs until the end of time (unless the job is killed).
@@ -59,7 +85,9 @@ def sample_failures(
         Detector error model from which to sample the detectors and
         logical observable flips.
     decoder
-        Decoder object with a ``decode_batch`` method.
+        Decoder object with a ``decode_batch`` method. It can also be a callable
+        (e.g. the decoder class) that returns the decoder object when
+        called with ``dem``, so that each worker builds its own decoder.
     min_failures
         Minimum number of failures (after post-selection, if enabled)
         to reach before being able to stop the sampling.
@@ -96,6 +124,8 @@ def sample_failures(
         If the file does not exist, it will be created.
         Specifying a file is useful if the computation is stop midway, so
         that it can be continued in if the same file is given.
+        If the file has the suffix ``.bin``, the results are stored in a binary
+        file instead, see Notes.
     decoding_failure
         Function that returns ``True`` if there has been a decoding failure, else
         ``False``. Its input is an ``np.ndarray`` of shape
@@ -130,7 +160,54 @@ def sample_failures(
     verbose
         Level of verbose during sampling. By default, the maximum level is
         selected (``2``). To not print information, select ``0`` or ``False``.
-
+    num_workers
+        Number of processes that sample and decode in parallel. Each worker
+        compiles its own sampler (and decoder, if ``decoder`` is a callable)
+        and uses its own seed. The stopping requirements are evaluated on the
+        totals of all workers. By default ``1``, which samples in the current process.
+    seed
+        Seed for the samplers. Each worker uses an independent seed derived
+        from this one. By default ``None``, which uses a random seed.
+    batch_time
+        Target wall-time (in seconds) for sampling and decoding each batch.
+        If given, the batch size is adapted after each batch, starting from
+        ``batch_size``, and the last batches are shrunk using the measured rates
+        so that the sampling stops close to the requirements.
+        By default ``None``, which uses a fixed ``batch_size``.
+    prefetch
+        Number of batches that a background thread samples in advance
+        while the current batch is being decoded, so that the sampling time
+        overlaps with the decoding time. By default ``0``, which samples
+        and decodes one batch after the other.
+    bit_packed
+        If ``True``, the detectors and logical flips are sampled bit-packed,
+        which uses 8 times less memory, thus larger batches can be used.
+        The defects are given bit-packed to the decoder if its ``decode_batch``
+        method accepts the ``bit_packed_shots`` and ``bit_packed_predictions``
+        arguments (e.g. ``pymatching.Matching``), otherwise they are unpacked
+        batch by batch. The inputs of ``decoding_failure``, ``post_selection``,
+        ``extra_metrics`` and ``extra_metrics_ps`` are then bit-packed, see Notes.
+        By default ``False``.
+    checkpoint
+        If ``True``, the seed and the number of batches consumed by each worker
+        are stored in a checkpoint file next to ``file_name`` (with the extra
+        suffix ``.ckpt``), so that a resumed or re-run job does not reuse
+        the random stream of the stored batches, see Notes. It requires ``file_name``.
+        By default ``False``.
+    target_rel_ci_width
+        Target width of the Wilson confidence interval of the logical error
+        probability (i.e. ``num_failures / num_samples_ps``) relative to the
+        logical error probability. It is evaluated on the running totals after
+        each batch using ``qec_util.performance.confidence_interval_binomial``.
+        By default ``None``, which does not place any restriction on the precision.
+    target_rel_ci_width_metrics
+        Dictionary mapping the names of the extra metrics to their target
+        relative width of the Wilson confidence interval. The probability of
+        the metrics in ``extra_metrics`` is computed with respect to ``num_samples``
+        and the ones in ``extra_metrics_ps`` with respect to ``num_samples_ps``.
+        The precision requirement is fulfilled when all the targets
+        (including ``target_rel_ci_width``, if given) are reached.
+        By default ``None``.
 
     Returns
     -------
@@ -154,20 +231,105 @@ def sample_failures(
     The information in the CSV file can be read using the
     ``read_failures_from_file`` function present in this same module.
 
+    For long runs with many batches, the binary file (suffix ``.bin``) is faster
+    because it stores the running totals next to the fixed-width batch records,
+    so that updating and reading the totals after each batch does not require
+    parsing the whole file. The binary file can also be read with
+    ``read_failures_from_file``, ``merge_batches_in_file`` and ``merge_files``.
+
     The function will use file locking via ``fcntl`` (only available in Unix systems)
     to avoid having multiple python instances writing on the same file at the same
     time. For any other OS, it will run without file locking.
+
+    If ``num_workers > 1``, the workers are started with ``fork`` (if available),
+    so that the decoder and the given functions do not need to be picklable.
+    A worker does not start a new batch if the batches being processed by the other
+    workers can already fulfill the requirements, to avoid oversampling.
+    The runtime used for ``min_time`` and ``max_time`` corresponds to the decoding
+    time summed over all workers.
+
+    If ``bit_packed = True``, the inputs of ``decoding_failure``, ``post_selection``,
+    ``extra_metrics`` and ``extra_metrics_ps`` are ``np.uint8`` arrays of shape
+    ``(num_samples, ceil(num_observables / 8))`` in which the logical error of
+    observable ``i`` is stored in bit ``i % 8`` of byte ``i // 8`` (little endian,
+    as in ``stim``). The default ``decoding_failure`` and ``post_selection``
+    work for both formats. For example, the logical errors of observable ``i``
+    are given by ``(x[:, i // 8] >> (i % 8)) & 1 == 1``.
+
+    If ``checkpoint = True``, the sampler of worker ``w`` is compiled once with
+    a seed derived from ``(seed, w, b)``, with ``b`` the number of batches of
+    the worker already stored in the file. Thus, a resumed job does not reuse
+    the random stream of the stored batches, and resuming from the same
+    checkpoint gives the same samples. The checkpoint also stores a hash of the DEM,
+    the decoder type, ``decoder_config`` and, for decoders with an ``edges``
+    method (e.g. ``pymatching.Matching``), their edges with weights. An error is
+    raised if they do not match the given ones. If no seed
+    is given, a random seed is stored in the checkpoint when it is created and it
+    is reused when resuming. The checkpoint is updated before storing each batch,
+    thus a job killed in between loses (at most) that batch, but the shots are never
+    duplicated. Note that the shots are only reproduced exactly if ``batch_size``,
+    ``num_workers`` and ``batch_time = None`` do not change, and that they depend
+    on the points at which the job was resumed.
     """
     if not isinstance(dem, stim.DetectorErrorModel):
         raise TypeError(
             f"'dem' must be a stim.DetectorErrorModel, but {type(dem)} was given."
         )
-    if "decode_batch" not in dir(decoder):
+    if "decode_batch" not in dir(decoder) and not callable(decoder):
         raise TypeError("'decoder' does not have a 'decode_batch' method.")
     if not isinstance(batch_size, int):
         raise TypeError(
             f"'batch_size' must be an int, but {type(batch_size)} was given."
         )
+    if not isinstance(num_workers, int):
+        raise TypeError(
+            f"'num_workers' must be an int, but {type(num_workers)} was given."
+        )
+    if num_workers < 1:
+        raise ValueError(
+            f"'num_workers' must be positive, but {num_workers} was given."
+        )
+    if not (seed is None or isinstance(seed, int)):
+        raise TypeError(f"'seed' must be None or an int, but {type(seed)} was given.")
+    if not (batch_time is None or isinstance(batch_time, (int, float))):
+        raise TypeError(
+            f"'batch_time' must be None, an int or a float, but {type(batch_time)} was given."
+        )
+    if (batch_time is not None) and batch_time <= 0:
+        raise ValueError(f"'batch_time' must be positive, but {batch_time} was given.")
+    if not isinstance(prefetch, int):
+        raise TypeError(f"'prefetch' must be an int, but {type(prefetch)} was given.")
+    if prefetch < 0:
+        raise ValueError(f"'prefetch' must be non-negative, but {prefetch} was given.")
+    if not isinstance(bit_packed, bool):
+        raise TypeError(
+            f"'bit_packed' must be a bool, but {type(bit_packed)} was given."
+        )
+    if not isinstance(checkpoint, bool):
+        raise TypeError(
+            f"'checkpoint' must be a bool, but {type(checkpoint)} was given."
+        )
+    if checkpoint and (file_name is None):
+        raise ValueError("'checkpoint' requires 'file_name' to be given.")
+    if target_rel_ci_width_metrics is None:
+        target_rel_ci_width_metrics = {}
+    if not isinstance(target_rel_ci_width_metrics, dict):
+        raise TypeError(
+            "'target_rel_ci_width_metrics' must be a dict, "
+            f"but {type(target_rel_ci_width_metrics)} was given."
+        )
+    for target in [target_rel_ci_width, *target_rel_ci_width_metrics.values()]:
+        if target is None:
+            continue
+        if not isinstance(target, (int, float)):
+            raise TypeError(
+                "The target relative widths must be an int or float, "
+                f"but {type(target)} was given."
+            )
+        if target <= 0:
+            raise ValueError(
+                f"The target relative widths must be positive, but {target} was given."
+            )
     if max_failures < min_failures:
         raise ValueError(
             "'min_failures' must be smaller (or equal) than 'max_failures'."
@@ -189,36 +351,11 @@ def sample_failures(
                 f"but {type(var)} was given."
             )
 
-    num_failures, num_samples_ps, num_samples, runtime = 0, 0, 0, 0
-
-    def print_v(string: str):
-        if verbose == 1:
-            print(
-                f"\r\033[Kfailures={num_failures} ps-samples={num_samples_ps} "
-                f"samples={num_samples} seconds={runtime:0.3f} {string}",
-                end="",
-            )
-        elif verbose == 2:
-            print(datetime.now(), string)
-        return
-
-    def finished() -> bool:
-        min_req = (
-            (num_failures >= min_failures)
-            and (num_samples_ps >= min_samples_ps)
-            and (num_samples >= min_samples)
-            and (runtime >= min_time)
-        )
-        max_req = (
-            (num_failures >= max_failures)
-            or (num_samples_ps >= max_samples_ps)
-            or (num_samples >= max_samples)
-            or (runtime >= max_time)
-        )
-        return min_req and max_req
-
     # check output format of functions
-    test = np.zeros((batch_size, dem.num_observables), dtype=bool)
+    if bit_packed:
+        test = np.zeros((batch_size, (dem.num_observables + 7) // 8), dtype=np.uint8)
+    else:
+        test = np.zeros((batch_size, dem.num_observables), dtype=bool)
     test_failures = decoding_failure(test)
     test_ps = post_selection(test)
     test_metrics = extra_metrics(test)
@@ -252,8 +389,40 @@ def sample_failures(
         raise ValueError(
             "'extra_metrics' and 'extra_metrics_ps' must have different keys."
         )
-    extra: dict[str, int | float] = {k: 0 for k in metric_names}
-    extra["seconds"] = 0.0
+    if not set(target_rel_ci_width_metrics) <= set(metric_names):
+        raise ValueError(
+            "The keys of 'target_rel_ci_width_metrics' must be extra metrics, "
+            f"but {list(target_rel_ci_width_metrics)} were given."
+        )
+
+    # precision requirements as (name, name of the number of samples, target)
+    precision_reqs = []
+    if target_rel_ci_width is not None:
+        precision_reqs.append((HEADER[0], HEADER[1], target_rel_ci_width))
+    for name, target in target_rel_ci_width_metrics.items():
+        num_samples_name = HEADER[2] if name in test_metrics else HEADER[1]
+        precision_reqs.append((name, num_samples_name, target))
+
+    ctx = _get_mp_context()
+    state = _SamplingState(
+        ctx,
+        metric_names,
+        min_reqs=(min_failures, min_samples_ps, min_samples, min_time),
+        max_reqs=(max_failures, max_samples_ps, max_samples, max_time),
+        precision_reqs=precision_reqs,
+    )
+
+    def print_v(string: str):
+        if verbose == 1:
+            num_failures, num_samples_ps, num_samples, _ = state.totals()
+            print(
+                f"\r\033[Kfailures={num_failures} ps-samples={num_samples_ps} "
+                f"samples={num_samples} seconds={state.runtime():0.3f} {string}",
+                end="",
+            )
+        elif verbose == 2:
+            print(datetime.now(), string)
+        return
 
     if file_name is not None:
         if pathlib.Path(file_name).exists():
@@ -265,75 +434,477 @@ def sample_failures(
                 raise ValueError(
                     "The metrics in this function and the ones in the file do not match."
                 )
+            state.set_totals(num_failures, num_samples_ps, num_samples, extra)
 
             # check if desired samples/failures have been reached
-            if finished():
+            if state.finished():
                 print_v("File has enough samples and failures.")
                 if verbose == 1:
                     print("")
-                return num_failures, num_samples_ps, num_samples, extra
+                return state.totals()
         else:
             # add header
             print_v("Opening file to store header...")
             _write_header(file_name, metric_names)
 
+    seeds = [
+        int(s.generate_state(1)[0])
+        for s in np.random.SeedSequence(seed).spawn(num_workers)
+    ]
+    checkpoints = [None] * num_workers
+    if checkpoint:
+        # the checkpoint derives the seed of each worker from its own seed.
+        config = _get_config_hash(dem, decoder, decoder_config)
+        ckpt_seed, batches = _load_checkpoint(file_name, seed, num_workers, config)
+        checkpoints = [(ckpt_seed, k, b) for k, b in enumerate(batches)]
+        print_v(f"Checkpoint with seed={ckpt_seed} and batches={batches}.")
+
+    loop_kwargs = dict(
+        dem=dem,
+        decoder=decoder,
+        batch_size=batch_size,
+        file_name=file_name,
+        funcs=(decoding_failure, post_selection, extra_metrics, extra_metrics_ps),
+        batch_time=batch_time,
+        prefetch=prefetch,
+        bit_packed=bit_packed,
+    )
+
+    if num_workers == 1:
+        _sampling_loop(
+            seed=seeds[0],
+            checkpoint=checkpoints[0],
+            state=state,
+            print_v=print_v,
+            **loop_kwargs,
+        )
+    else:
+        print_v(f"Starting {num_workers} workers...")
+        errors = ctx.SimpleQueue()
+        workers = [
+            ctx.Process(
+                target=_sampling_worker,
+                args=(state, errors),
+                kwargs=dict(seed=s, checkpoint=c, **loop_kwargs),
+            )
+            for s, c in zip(seeds, checkpoints)
+        ]
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(timeout=0.5)
+            if verbose == 1:
+                print_v("Sampling with workers...")
+        if not errors.empty():
+            raise RuntimeError(f"A sampling worker failed:\n{errors.get()}")
+        if any(worker.exitcode != 0 for worker in workers):
+            raise RuntimeError("A sampling worker exited unexpectedly.")
+
+    print_v("Sampling conditions are reached, finished sampling.")
+    if verbose == 1:
+        print("")
+    return state.totals()
+
+
+class _SamplingState:
+    """Totals of the sampling that are shared between the workers,
+    together with the requirements to stop the sampling."""
+
+    def __init__(
+        self,
+        ctx,
+        metric_names: Sequence[str],
+        min_reqs: tuple[int | float, ...],
+        max_reqs: tuple[int | float, ...],
+        precision_reqs: Sequence[tuple[str, str, int | float]] = (),
+    ):
+        # the order of the metrics follows the order in the files
+        self.names = HEADER + sorted(metric_names)
+        self.min_reqs = min_reqs
+        self.max_reqs = max_reqs
+        self.precision_reqs = [
+            (self.names.index(n), self.names.index(d), t) for n, d, t in precision_reqs
+        ]
+        self._lock = ctx.Lock()
+        self._totals = ctx.Array("d", len(self.names), lock=False)
+        self._runtime = ctx.Value("d", 0, lock=False)
+        self._in_flight = ctx.Value("q", 0, lock=False)
+        self._stop = ctx.Value("b", 0, lock=False)
+        return
+
+    def totals(self) -> tuple[int, int, int, dict[str, int | float]]:
+        with self._lock:
+            totals = list(self._totals)
+        extra = {k: int(v) for k, v in zip(self.names[4:], totals[4:])}
+        extra["seconds"] = totals[3]
+        return int(totals[0]), int(totals[1]), int(totals[2]), extra
+
+    def set_totals(
+        self,
+        num_failures: int,
+        num_samples_ps: int,
+        num_samples: int,
+        extra: dict[str, int | float],
+    ):
+        with self._lock:
+            self._set_totals(num_failures, num_samples_ps, num_samples, extra)
+        return
+
+    def _set_totals(self, num_failures, num_samples_ps, num_samples, extra):
+        self._totals[:4] = [num_failures, num_samples_ps, num_samples, extra["seconds"]]
+        self._totals[4:] = [extra[k] for k in self.names[4:]]
+        return
+
+    def runtime(self) -> float:
+        return self._runtime.value
+
+    def stop(self):
+        self._stop.value = 1
+        return
+
+    def finished(self, in_flight: int = 0) -> bool:
+        """Returns if the requirements are fulfilled, assuming that the
+        ``in_flight`` samples will not contain any failure."""
+        values = (
+            self._totals[0],
+            self._totals[1] + in_flight,
+            self._totals[2] + in_flight,
+            self._runtime.value,
+        )
+        min_req = all(v >= r for v, r in zip(values, self.min_reqs))
+        max_req = any(v >= r for v, r in zip(values, self.max_reqs))
+        if self.precision_reqs and not max_req:
+            max_req = self.remaining_precision_shots(in_flight) == 0
+        return min_req and max_req
+
+    def remaining_precision_shots(self, in_flight: int = 0) -> int | float:
+        """Returns the estimated number of shots to reach the target relative
+        widths of the confidence intervals, assuming that the ``in_flight``
+        samples follow the measured rates."""
+        num_samples = self._totals[2]
+        if num_samples == 0:
+            return np.inf
+        # the 'in_flight' samples are added to the totals by scaling them
+        scale = (num_samples + in_flight) / num_samples
+        shots = 0
+        for num, den, target in self.precision_reqs:
+            width = _rel_ci_width(self._totals[num] * scale, self._totals[den] * scale)
+            if width > target:
+                # the relative width decreases as '1/sqrt(num_samples)'
+                shots = max(
+                    shots, (num_samples + in_flight) * ((width / target) ** 2 - 1)
+                )
+        return shots
+
+    def remaining_shots(self, in_flight: int = 0) -> int | float:
+        """Returns the estimated number of shots to fulfill the requirements
+        (except the ones for the runtime) using the measured rates of failures
+        and post-selected samples, and assuming that the ``in_flight`` samples
+        will be added to the totals."""
+        num_samples = self._totals[2]
+        if num_samples > 0:
+            rates = [self._totals[0] / num_samples, self._totals[1] / num_samples, 1]
+        else:
+            # the rates are unknown, thus only the samples can be estimated
+            rates = [0, 0, 1]
+        values = [self._totals[k] + rates[k] * in_flight for k in range(3)]
+
+        # the failures and post-selected samples are random, thus only half
+        # of their estimated shots are used to approach the requirement smoothly.
+        fractions = [0.5, 0.5, 1]
+
+        def shots(value: float, req: int | float, rate: float, frac: float) -> float:
+            if value >= req:
+                return 0
+            return frac * (req - value) / rate if rate > 0 else np.inf
+
+        to_min = max(shots(*v) for v in zip(values, self.min_reqs, rates, fractions))
+        to_max = min(shots(*v) for v in zip(values, self.max_reqs, rates, fractions))
+        if self.precision_reqs:
+            to_max = min(to_max, 0.5 * self.remaining_precision_shots(in_flight))
+        return np.ceil(max(to_min, to_max, 1))
+
+    def claim(self, batch_size: int, shrink: bool = False) -> int:
+        """Returns the number of shots that the worker can sample, ``0`` if the
+        sampling has finished, or ``-1`` if the worker needs to wait for the
+        batches of the other workers. If ``shrink = True``, the batch is shrunk
+        to the estimated number of shots to fulfill the requirements."""
+        with self._lock:
+            if self._stop.value or self.finished():
+                return 0
+            if self._in_flight.value and self.finished(self._in_flight.value):
+                return -1
+            if shrink:
+                remaining = self.remaining_shots(self._in_flight.value)
+                batch_size = int(min(batch_size, remaining))
+            self._in_flight.value += batch_size
+        return batch_size
+
+    def commit(
+        self,
+        batch: tuple[int, int, int, dict[str, int | float]],
+        totals: tuple[int, int, int, dict[str, int | float]] | None = None,
+    ):
+        """Adds the given batch to the totals. If ``totals`` is given, the
+        totals are overwritten, e.g. with the data read from the file."""
+        num_failures, num_samples_ps, num_samples, extra = batch
+        with self._lock:
+            self._in_flight.value -= num_samples
+            self._runtime.value += extra["seconds"]
+            if totals is not None:
+                # another worker could have committed more recent totals
+                if totals[2] >= self._totals[2]:
+                    self._set_totals(*totals)
+            else:
+                self._totals[0] += num_failures
+                self._totals[1] += num_samples_ps
+                self._totals[2] += num_samples
+                self._totals[3] += extra["seconds"]
+                for k, name in enumerate(self.names[4:]):
+                    self._totals[4 + k] += extra[name]
+        return
+
+
+def _rel_ci_width(num_failures: int | float, num_samples: int | float) -> float:
+    """Returns the width of the Wilson confidence interval relative to the
+    estimated probability, or ``np.inf`` if there are no failures."""
+    if num_failures == 0 or num_samples == 0:
+        return np.inf
+    lower, upper = confidence_interval_binomial(num_failures, num_samples)
+    return float((upper - lower) * num_samples / num_failures)
+
+
+def _get_mp_context():
+    # 'fork' avoids pickling the decoder and the (lambda) functions,
+    # but it is not available in all systems.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context()
+
+
+def _get_decoder(decoder, dem: stim.DetectorErrorModel):
+    if isinstance(decoder, type) or "decode_batch" not in dir(decoder):
+        decoder = decoder(dem)
+    if "decode_batch" not in dir(decoder):
+        raise TypeError("'decoder' does not have a 'decode_batch' method.")
+    return decoder
+
+
+def _get_config_hash(
+    dem: stim.DetectorErrorModel, decoder, decoder_config: object = None
+) -> str:
+    """Returns a hash of the DEM and the configuration of the decoder.
+    If ``decoder`` is a callable, the decoder is built from ``dem``, so that
+    it gives the same hash as the corresponding decoder object."""
+    decoder = _get_decoder(decoder, dem)
+    config = f"{type(decoder).__qualname__}\n{decoder_config!r}\n{dem}"
+    if callable(getattr(decoder, "edges", None)):
+        # e.g. the weights of the matching graph of 'pymatching.Matching'
+        config += f"\n{decoder.edges()!r}"
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+
+def _sampling_worker(state: _SamplingState, errors, **loop_kwargs):
+    try:
+        _sampling_loop(state=state, print_v=lambda _: None, **loop_kwargs)
+    except BaseException:
+        state.stop()
+        errors.put(traceback.format_exc())
+    return
+
+
+def _sampling_loop(
+    dem: stim.DetectorErrorModel,
+    decoder,
+    seed: int,
+    batch_size: int,
+    file_name: str | pathlib.Path | None,
+    funcs: tuple[Callable, ...],
+    state: _SamplingState,
+    print_v: Callable[[str], None],
+    batch_time: int | float | None = None,
+    prefetch: int = 0,
+    bit_packed: bool = False,
+    checkpoint: tuple[int, int, int] | None = None,
+):
+    decode = _get_decode_function(_get_decoder(decoder, dem), dem, bit_packed)
     print_v("Compile sampler from DEM...")
-    sampler = dem.compile_sampler()
+    if checkpoint is not None:
+        # the sampler is compiled only once (which can be as expensive as sampling
+        # a batch), with a seed that depends on the number of stored batches so
+        # that a resumed job does not reuse the random stream of the stored ones.
+        seed, worker_id, num_batches = checkpoint
+        seq = np.random.SeedSequence(seed, spawn_key=(worker_id, num_batches))
+        seed = int(seq.generate_state(1)[0])
+    sampler = dem.compile_sampler(seed=seed)
 
-    # start sampling...
-    while not finished():
-        print_v(f"Sampling {batch_size} shots...")
-        defects, log_flips, _ = sampler.sample(shots=batch_size)
-        num_samples += batch_size
-        print_v(f"Decoding {batch_size} shots...")
-        t0 = time.time()
-        predictions = decoder.decode_batch(defects)
-        t1 = time.time()
-        batch_runtime = t1 - t0
-        runtime += batch_runtime
-        log_errors = predictions != log_flips
-        print_v("Post-selecting samples...")
-        post_selected = post_selection(log_errors)
-        log_errors_ps = log_errors[post_selected]
-        batch_samples_ps = int(post_selected.sum())
-        num_samples_ps += batch_samples_ps
-        print_v(f"There were {batch_samples_ps} shots kept from {batch_size} shots.")
-        print_v("Computing decoding failures...")
-        batch_failures = int(decoding_failure(log_errors_ps).sum())
-        num_failures += batch_failures
-        print_v(
-            f"There were {batch_failures} failures in {batch_samples_ps} kept shots."
+    def sample(shots: int) -> tuple:
+        return sampler.sample(shots, bit_packed=bit_packed)[:2]
+
+    if file_name is not None:
+        reader = FailuresFileReader(file_name)
+
+    # the batches are sampled by a background thread if 'prefetch > 0'.
+    orders: queue.Queue[int | None] = queue.Queue()
+    samples: queue.Queue[tuple | BaseException] = queue.Queue(maxsize=prefetch + 1)
+    if prefetch > 0:
+        producer = threading.Thread(
+            target=_sampling_producer,
+            args=(sample, orders, samples),
+            daemon=True,
         )
-        print_v("Evaluating extra metrics...")
-        batch_extra: dict[str, int | float] = {
-            k: int(m.sum()) for k, m in extra_metrics(log_errors).items()
-        }
-        batch_extra |= {
-            k: int(m.sum()) for k, m in extra_metrics_ps(log_errors_ps).items()
-        }
-        batch_extra["seconds"] = batch_runtime
-        extra = {k: extra[k] + batch_extra[k] for k in ["seconds"] + metric_names}
-
-        if file_name is not None:
-            print_v("Opening file to store data...")
-            _append_data(
-                file_name, batch_failures, batch_samples_ps, batch_size, batch_extra
+        producer.start()
+
+    # start sampling...
+    finished, pending = False, 0
+    try:
+        while True:
+            # the claimed batches count as 'in flight' until they are committed
+            while (not finished) and pending <= prefetch:
+                shots = state.claim(batch_size, shrink=batch_time is not None)
+                if shots <= 0:
+                    finished = shots == 0
+                    break
+                print_v(f"Sampling {shots} shots...")
+                if prefetch > 0:
+                    orders.put(shots)
+                else:
+                    # 'batch_time' includes the sampling time
+                    t0 = time.time()
+                    samples.put(sample(shots))
+                pending += 1
+
+            if pending == 0:
+                if finished:
+                    break
+                time.sleep(0.01)
+                continue
+
+            if prefetch > 0:
+                # the sampling overlaps with the decoding of the previous batch
+                t0 = time.time()
+            outcomes = samples.get()
+            pending -= 1
+            if isinstance(outcomes, BaseException):
+                raise outcomes
+            batch = _decode_batch(
+                decode, *outcomes, *funcs, print_v=print_v, bit_packed=bit_packed
             )
+            if batch_time is not None:
+                # limit the change in the batch size to smooth the fluctuations
+                factor = batch_time / max(time.time() - t0, 1e-6)
+                batch_size = max(1, int(batch[2] * min(max(factor, 0.5), 2)))
+                print_v(f"Batch size adapted to {batch_size} shots.")
+
+            if file_name is None:
+                state.commit(batch)
+                continue
+
+            if checkpoint is not None:
+                num_batches += 1
+                _update_checkpoint(file_name, worker_id, num_batches)
+
+            print_v("Opening file to store data...")
+            _append_data(file_name, *batch)
 
             # read again data from file to avoid oversampling
             # when multiple processes are writing in the same file.
             print_v("Update data in case multiple processes are running...")
-            num_failures, num_samples_ps, num_samples, extra = read_failures_from_file(
-                file_name
-            )
+            state.commit(batch, totals=reader.read())
+    finally:
+        orders.put(None)
+
+    return
 
-    print_v("Sampling conditions are reached, finished sampling.")
-    if verbose == 1:
-        print("")
-    return num_failures, num_samples_ps, num_samples, extra
+
+def _sampling_producer(
+    sample: Callable[[int], tuple],
+    orders: queue.Queue,
+    samples: queue.Queue,
+):
+    """Samples the batches requested in ``orders`` and puts them in ``samples``,
+    until ``None`` is requested."""
+    try:
+        while (shots := orders.get()) is not None:
+            samples.put(sample(shots))
+    except BaseException as error:
+        samples.put(error)
+    return
+
+
+def _get_decode_function(
+    decoder, dem: stim.DetectorErrorModel, bit_packed: bool = False
+) -> Callable[[npt.NDArray], npt.NDArray]:
+    """Returns a function that decodes a batch of defects. If ``bit_packed``,
+    both the defects and the predictions are bit-packed."""
+    if not bit_packed:
+        return decoder.decode_batch
+
+    try:
+        params = inspect.signature(decoder.decode_batch).parameters
+    except (TypeError, ValueError):
+        params = {}
+    if ("bit_packed_shots" in params) and ("bit_packed_predictions" in params):
+        return lambda x: decoder.decode_batch(
+            x, bit_packed_shots=True, bit_packed_predictions=True
+        )
+
+    num_dets = dem.num_detectors
+
+    def decode(defects: npt.NDArray[np.uint8]) -> npt.NDArray[np.uint8]:
+        defects = np.unpackbits(defects, axis=1, count=num_dets, bitorder="little")
+        predictions = decoder.decode_batch(defects.astype(bool))
+        return np.packbits(
+            np.asarray(predictions, dtype=bool), axis=1, bitorder="little"
+        )
+
+    return decode
+
+
+def _decode_batch(
+    decode: Callable[[npt.NDArray], npt.NDArray],
+    defects: BinVect,
+    log_flips: BinVect,
+    decoding_failure: Callable[[BinVect], BinVect],
+    post_selection: Callable[[BinVect], BinVect],
+    extra_metrics: Callable[[BinVect], ExtraMetrics],
+    extra_metrics_ps: Callable[[BinVect], ExtraMetrics],
+    print_v: Callable[[str], None],
+    bit_packed: bool = False,
+) -> tuple[int, int, int, dict[str, int | float]]:
+    shots = len(defects)
+    print_v(f"Decoding {shots} shots...")
+    t0 = time.time()
+    predictions = decode(defects)
+    t1 = time.time()
+    if bit_packed:
+        # the XOR of the packed words gives the packed logical errors
+        log_errors = np.bitwise_xor(predictions, log_flips)
+    else:
+        log_errors = predictions != log_flips
+    print_v("Post-selecting samples...")
+    post_selected = post_selection(log_errors)
+    log_errors_ps = log_errors[post_selected]
+    num_samples_ps = int(post_selected.sum())
+    print_v(f"There were {num_samples_ps} shots kept from {shots} shots.")
+    print_v("Computing decoding failures...")
+    num_failures = int(decoding_failure(log_errors_ps).sum())
+    print_v(f"There were {num_failures} failures in {num_samples_ps} kept shots.")
+    print_v("Evaluating extra metrics...")
+    extra: dict[str, int | float] = {
+        k: int(m.sum()) for k, m in extra_metrics(log_errors).items()
+    }
+    extra |= {k: int(m.sum()) for k, m in extra_metrics_ps(log_errors_ps).items()}
+    extra["seconds"] = t1 - t0
+    return num_failures, num_samples_ps, shots, extra
 
 
 def _write_header(file_name: str | pathlib.Path, metric_names: Sequence[str]):
+    if is_binary_file(file_name):
+        _write_binary_header(file_name, metric_names)
+        return
+
     file = open(file_name, "w")
     if FILE_LOCKING:
         fcntl.lockf(file, fcntl.LOCK_EX)
@@ -352,6 +923,10 @@ def _append_data(
     num_samples: int,
     extra: dict[str, int | float],
 ):
+    if is_binary_file(file_name):
+        _append_binary_data(file_name, num_failures, num_samples_ps, num_samples, extra)
+        return
+
     file = open(file_name, "a")
     if FILE_LOCKING:
         fcntl.lockf(file, fcntl.LOCK_EX)
@@ -414,6 +989,10 @@ def read_failures_from_file(
     """
     if not pathlib.Path(file_name).exists():
         raise FileExistsError(f"The given file ({file_name}) does not exist.")
+    if is_binary_file(file_name):
+        return _read_binary_file(
+            file_name, max_num_failures, max_num_samples_ps, max_num_samples
+        )
 
     num_failures, num_samples_ps, num_samples = 0, 0, 0
     with open(file_name, "r") as file:
@@ -458,7 +1037,8 @@ def merge_batches_in_file(file_name: str | pathlib.Path) -> None:
     num_failures, num_samples_ps, num_samples, extra_metrics = read_failures_from_file(
         file_name=file_name
     )
-    _write_header(file_name, list(extra_metrics))
+    metric_names = [n for n in extra_metrics if n != "seconds"]
+    _write_header(file_name, metric_names)
     _append_data(file_name, num_failures, num_samples_ps, num_samples, extra_metrics)
     return
 
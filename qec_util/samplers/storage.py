@@ -0,0 +1,291 @@
+import json
+import os
+import pathlib
+import struct
+from collections.abc import Sequence
+
+import numpy as np
+
+# the package "fcntl" is only available for Unix systems.
+FILE_LOCKING = False
+try:
+    import fcntl
+
+    FILE_LOCKING = True
+except ImportError:
+    pass
+
+HEADER = ["num_failures_ps", "num_samples_ps", "num_samples", "seconds"]
+BINARY_SUFFIX = ".bin"
+CHECKPOINT_SUFFIX = ".ckpt"
+MAGIC = b"QECUBIN\x00"
+
+
+def is_binary_file(file_name: str | pathlib.Path) -> bool:
+    """Returns if the given file corresponds to a binary file from
+    ``sample_failures``. If the file does not exist, it returns if the
+    file will be created as a binary file, i.e. if it has the suffix ``.bin``.
+    """
+    if not pathlib.Path(file_name).exists():
+        return pathlib.Path(file_name).suffix == BINARY_SUFFIX
+    with open(file_name, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def _record_dtype(names: Sequence[str]) -> np.dtype:
+    return np.dtype([(n, "<f8" if n == "seconds" else "<i8") for n in names])
+
+
+def _read_layout(file) -> tuple[list[str], np.dtype, int]:
+    """Returns the field names, the record dtype, and the position of the
+    totals from the header of the given (open) binary file."""
+    file.seek(0)
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Incorrect header.")
+    (length,) = struct.unpack("<I", file.read(4))
+    names = json.loads(file.read(length).decode("utf-8"))["fields"]
+    if (len(names) < len(HEADER)) or (names[: len(HEADER)] != HEADER):
+        raise ValueError("Incorrect header.")
+    return names, _record_dtype(names), len(MAGIC) + 4 + length
+
+
+def _write_binary_header(file_name: str | pathlib.Path, metric_names: Sequence[str]):
+    file = open(file_name, "wb")
+    if FILE_LOCKING:
+        fcntl.lockf(file, fcntl.LOCK_EX)
+
+    # sort metrics names to always store them in the same order
+    names = HEADER + sorted(metric_names)
+    header = json.dumps({"fields": names}).encode("utf-8")
+    totals = np.zeros(1, dtype=_record_dtype(names))
+    _ = file.write(MAGIC + struct.pack("<I", len(header)) + header)
+    _ = file.write(totals.tobytes())
+    file.close()
+    return
+
+
+def _append_binary_data(
+    file_name: str | pathlib.Path,
+    num_failures: int,
+    num_samples_ps: int,
+    num_samples: int,
+    extra: dict[str, int | float],
+):
+    file = open(file_name, "r+b")
+    if FILE_LOCKING:
+        fcntl.lockf(file, fcntl.LOCK_EX)
+
+    names, dtype, totals_pos = _read_layout(file)
+    record = np.zeros(1, dtype=dtype)
+    record[HEADER[0]] = num_failures
+    record[HEADER[1]] = num_samples_ps
+    record[HEADER[2]] = num_samples
+    for name in names[len(HEADER) - 1 :]:
+        record[name] = extra[name]
+
+    # update the running totals, then append the batch record
+    file.seek(totals_pos)
+    totals = np.frombuffer(file.read(dtype.itemsize), dtype=dtype).copy()
+    for name in names:
+        totals[name] += record[name]
+    file.seek(totals_pos)
+    _ = file.write(totals.tobytes())
+    file.seek(0, os.SEEK_END)
+    _ = file.write(record.tobytes())
+    file.close()
+    return
+
+
+def _read_binary_file(
+    file_name: str | pathlib.Path,
+    max_num_failures: int | float = np.inf,
+    max_num_samples_ps: int | float = np.inf,
+    max_num_samples: int | float = np.inf,
+) -> tuple[int, int, int, dict[str, int | float]]:
+    with open(file_name, "rb") as file:
+        if FILE_LOCKING:
+            fcntl.lockf(file, fcntl.LOCK_SH)
+
+        names, dtype, totals_pos = _read_layout(file)
+        file.seek(totals_pos)
+        totals = np.frombuffer(file.read(dtype.itemsize), dtype=dtype)
+
+        limits = (max_num_failures, max_num_samples_ps, max_num_samples)
+        if any(l != np.inf for l in limits):
+            # only add up the first batches until reaching one of the limits.
+            records = np.frombuffer(file.read(), dtype=dtype)
+            reached = np.zeros(len(records), dtype=bool)
+            for name, limit in zip(HEADER, limits):
+                reached |= np.cumsum(records[name]) >= limit
+            last = np.argmax(reached) if reached.any() else len(records) - 1
+            totals = records[: last + 1]
+
+    extra: dict[str, int | float] = {
+        n: int(totals[n].sum()) for n in names[len(HEADER) :]
+    }
+    extra["seconds"] = float(totals["seconds"].sum())
+    return (
+        int(totals[HEADER[0]].sum()),
+        int(totals[HEADER[1]].sum()),
+        int(totals[HEADER[2]].sum()),
+        extra,
+    )
+
+
+def checkpoint_file_name(file_name: str | pathlib.Path) -> pathlib.Path:
+    """Returns the name of the checkpoint file associated to the given
+    results file from ``sample_failures``."""
+    return pathlib.Path(str(file_name) + CHECKPOINT_SUFFIX)
+
+
+def _load_checkpoint(
+    file_name: str | pathlib.Path,
+    seed: int | None,
+    num_workers: int,
+    config: str,
+) -> tuple[int, list[int]]:
+    """Returns the seed and the number of batches consumed by each worker
+    stored in the checkpoint of the given results file. If the checkpoint
+    does not exist, it creates it."""
+    ckpt_name = checkpoint_file_name(file_name)
+    if ckpt_name.exists():
+        with open(ckpt_name, "r") as file:
+            if FILE_LOCKING:
+                fcntl.lockf(file, fcntl.LOCK_SH)
+            data = json.load(file)
+
+        if data["config"] != config:
+            raise ValueError(
+                "The checkpoint does not correspond to the given DEM and decoder."
+            )
+        if (seed is not None) and data["seed"] != seed:
+            raise ValueError(
+                f"The checkpoint was created with seed={data['seed']}, "
+                f"but seed={seed} was given."
+            )
+        if len(data["batches"]) != num_workers:
+            raise ValueError(
+                f"The checkpoint was created with {len(data['batches'])} workers, "
+                f"but num_workers={num_workers} was given."
+            )
+        return data["seed"], data["batches"]
+
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy)
+    data = dict(seed=seed, config=config, batches=[0] * num_workers)
+    with open(ckpt_name, "w") as file:
+        if FILE_LOCKING:
+            fcntl.lockf(file, fcntl.LOCK_EX)
+        json.dump(data, file)
+    return seed, data["batches"]
+
+
+def _update_checkpoint(file_name: str | pathlib.Path, worker: int, num_batches: int):
+    """Stores the number of batches consumed by the given worker."""
+    with open(checkpoint_file_name(file_name), "r+") as file:
+        if FILE_LOCKING:
+            fcntl.lockf(file, fcntl.LOCK_EX)
+        data = json.load(file)
+        data["batches"][worker] = num_batches
+        file.seek(0)
+        json.dump(data, file)
+        file.truncate()
+    return
+
+
+class FailuresFileReader:
+    """Reader of the number of failures and samples stored in a file from
+    ``sample_failures`` that only parses the batches appended to the file
+    since the previous read.
+
+    It keeps the position in the file and the cumulative totals. If the file
+    has been truncated or rewritten (e.g. by ``merge_batches_in_file``),
+    it reads again the whole file. For binary files, the running totals are
+    read directly from the file.
+
+    Parameters
+    ----------
+    file_name
+        Name of the file with the data.
+        The structure of the file is specified in the Notes from
+        ``sample_failures`` function.
+    """
+
+    def __init__(self, file_name: str | pathlib.Path):
+        self.file_name = file_name
+        self._reset()
+        return
+
+    def _reset(self):
+        self._offset = 0
+        self._last_line = b""
+        self._header: list[str] = []
+        self._totals: list[int | float] = []
+        return
+
+    def read(self) -> tuple[int, int, int, dict[str, int | float]]:
+        """Returns the total number of failures and samples stored in the file.
+
+        Returns
+        -------
+        num_failures
+            Total number of post-selected failues.
+        num_samples_ps
+            Number of post-selected samples.
+        num_samples
+            Total number of samples.
+        extra_metrics
+            Dictionary of the extra metrics.
+        """
+        if not pathlib.Path(self.file_name).exists():
+            raise FileExistsError(f"The given file ({self.file_name}) does not exist.")
+        if is_binary_file(self.file_name):
+            return _read_binary_file(self.file_name)
+
+        with open(self.file_name, "rb") as file:
+            if not self._is_unchanged(file):
+                self._reset()
+
+            file.seek(self._offset)
+            data = file.read()
+
+        # only process complete lines, as a process could be writing in the file.
+        end = data.rfind(b"\n") + 1
+        lines = data[:end].decode("utf-8").splitlines()
+        if end > 0:
+            self._offset += end
+            self._last_line = data[: end - 1].rsplit(b"\n", 1)[-1] + b"\n"
+
+        if not self._header:
+            if not lines:
+                raise ValueError("Header is missing in CSV file")
+            header = lines.pop(0).split(",")
+            if (len(header) < len(HEADER)) or (header[: len(HEADER)] != HEADER):
+                self._reset()
+                raise ValueError("Incorrect header.")
+            self._header = header
+            self._totals = [0] * len(header)
+            self._totals[3] = 0.0
+
+        for line in lines:
+            if line == "":
+                continue
+            row = line.split(",")
+            for k, value in enumerate(row):
+                self._totals[k] += float(value) if k == 3 else int(value)
+
+        extra: dict[str, int | float] = dict(
+            zip(self._header[len(HEADER) :], self._totals[len(HEADER) :])
+        )
+        extra["seconds"] = self._totals[3]
+        return self._totals[0], self._totals[1], self._totals[2], extra
+
+    def _is_unchanged(self, file) -> bool:
+        """Returns if the contents previously read are still in the file."""
+        if self._offset == 0:
+            return True
+        size = file.seek(0, os.SEEK_END)
+        if size < self._offset:
+            return False
+        file.seek(self._offset - len(self._last_line))
+        return file.read(len(self._last_line)) == self._last_line
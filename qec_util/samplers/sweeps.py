@@ -0,0 +1,364 @@
+import csv
+import pathlib
+import traceback
+from collections.abc import Callable
+from datetime import datetime
+
+import numpy as np
+import stim
+
+from ..performance import confidence_interval_binomial
+from .samplers import (
+    BinVect,
+    _decode_batch,
+    _get_decoder,
+    _get_mp_context,
+    _rel_ci_width,
+)
+from .storage import FILE_LOCKING, HEADER
+
+if FILE_LOCKING:
+    import fcntl
+
+TASK_KEYS = ["dem", "decoder", "max_failures", "max_samples", "target_rel_ci_width"]
+
+
+def sample_failures_sweep(
+    tasks: dict[str, dict],
+    num_workers: int = 1,
+    batch_size: int = 1_000,
+    file_name: str | pathlib.Path | None = None,
+    decoding_failure: Callable[[BinVect], BinVect] = lambda x: x.any(axis=1),
+    post_selection: Callable[[BinVect], BinVect] = lambda x: np.ones(
+        len(x), dtype=bool
+    ),
+    seed: int | None = None,
+    verbose: int = 2,
+) -> dict[str, tuple[int, int, int, dict[str, int | float]]]:
+    """Samples the decoding failures of several tasks (e.g. the points of a
+    threshold plot) using a shared pool of workers.
+
+    The batches are assigned to the task that is the furthest from fulfilling
+    one of its stopping requirements, so that the tasks progress at a similar
+    pace, see Notes.
+
+    Parameters
+    ----------
+    tasks
+        Dictionary mapping the name of each task to a dictionary with the keys:
+        ``"dem"`` (the ``stim.DetectorErrorModel`` to sample from),
+        ``"decoder"`` (decoder object with a ``decode_batch`` method, or a callable
+        that returns it when called with the DEM), and the stopping requirements
+        ``"max_failures"``, ``"max_samples"`` and ``"target_rel_ci_width"``.
+        The last one corresponds to the target width of the Wilson confidence
+        interval relative to the logical error probability. The task stops when
+        one of its requirements is fulfilled. At least ``"max_failures"`` or
+        ``"max_samples"`` must be given, as the target width is not reached
+        if the task does not have any failure.
+        The names of the tasks cannot contain commas.
+    num_workers
+        Number of processes that sample and decode the batches. Each worker
+        compiles its own sampler and decoder for each task. By default ``1``.
+    batch_size
+        Number of samples to decode per batch. By default ``1_000``.
+    file_name
+        Name of the CSV file in which to store the batches of all tasks.
+        If the file exists, the sampling continues from the data in the file.
+        See ``read_sweep_from_file``.
+    decoding_failure
+        Function that returns ``True`` if there has been a decoding failure.
+        See ``sample_failures`` for more information.
+    post_selection
+        Function that returns ``True`` if the sample needs to be kept.
+        See ``sample_failures`` for more information.
+    seed
+        Seed for the samplers. Each worker and task use an independent seed
+        derived from this one and from the number of samples of the task stored
+        in ``file_name``, so that a resumed sweep does not sample again the
+        stored shots. By default ``None``, which uses a random seed.
+    verbose
+        Level of verbose during sampling. By default, the maximum level is
+        selected (``2``). To not print information, select ``0`` or ``False``.
+
+    Returns
+    -------
+    results
+        Dictionary mapping the name of each task to its number of failures,
+        number of post-selected samples, number of samples, and extra metrics,
+        as in the output of ``sample_failures``.
+
+    Notes
+    -----
+    The progress of a task is the largest fraction of its stopping requirements
+    that has been fulfilled, i.e. ``num_failures / max_failures``,
+    ``num_samples / max_samples``, and ``(target_rel_ci_width / rel_ci_width)**2``
+    (as the width decreases as ``1 / sqrt(num_samples)``). The samples being
+    processed by the workers are taken into account. For the tasks without
+    failures, the relative width is estimated from the upper bound of the
+    confidence interval, so that they do not take all the workers until their
+    first failure.
+
+    The workers are started with ``fork`` (if available), so that the decoders
+    and the given functions do not need to be picklable.
+    """
+    if not isinstance(tasks, dict):
+        raise TypeError(f"'tasks' must be a dict, but {type(tasks)} was given.")
+    for name, task in tasks.items():
+        if not isinstance(name, str) or "," in name:
+            raise ValueError(
+                f"The task names must be strings without commas, but {name} was given."
+            )
+        if not isinstance(task, dict):
+            raise TypeError(
+                f"Task '{name}' must be a dict, but {type(task)} was given."
+            )
+        if not (set(TASK_KEYS[:2]) <= set(task) <= set(TASK_KEYS)):
+            raise ValueError(
+                f"Task '{name}' must have the keys 'dem' and 'decoder', and "
+                f"optionally {TASK_KEYS[2:]}, but {list(task)} were given."
+            )
+        if not isinstance(task["dem"], stim.DetectorErrorModel):
+            raise TypeError(
+                f"'dem' in task '{name}' must be a stim.DetectorErrorModel, "
+                f"but {type(task['dem'])} was given."
+            )
+        if all(task.get(k) in (None, np.inf) for k in TASK_KEYS[2:4]):
+            # a task without failures never reaches 'target_rel_ci_width',
+            # and it would take all the workers forever.
+            raise ValueError(
+                f"Task '{name}' must have 'max_failures' or 'max_samples' as a "
+                "stopping requirement, as 'target_rel_ci_width' is not reached "
+                "if no failures are observed."
+            )
+    if not isinstance(num_workers, int):
+        raise TypeError(
+            f"'num_workers' must be an int, but {type(num_workers)} was given."
+        )
+    if num_workers < 1:
+        raise ValueError(
+            f"'num_workers' must be positive, but {num_workers} was given."
+        )
+    if not isinstance(batch_size, int):
+        raise TypeError(
+            f"'batch_size' must be an int, but {type(batch_size)} was given."
+        )
+
+    def print_v(string: str):
+        if verbose:
+            print(datetime.now(), string)
+        return
+
+    results = {name: (0, 0, 0, {"seconds": 0.0}) for name in tasks}
+    if file_name is not None:
+        if pathlib.Path(file_name).exists():
+            print_v("File already exists, reading file...")
+            stored = read_sweep_from_file(file_name)
+            results |= {name: stored[name] for name in tasks if name in stored}
+        else:
+            _write_sweep_header(file_name)
+
+    # the seeds depend on the stored samples to not repeat them when resuming.
+    stored_samples = {name: results[name][2] for name in tasks}
+    ctx = _get_mp_context()
+    orders, batches = ctx.Queue(), ctx.Queue()
+    funcs = (decoding_failure, post_selection, lambda _: {}, lambda _: {})
+    workers = [
+        ctx.Process(
+            target=_sweep_worker,
+            args=(tasks, funcs, (seed, k, stored_samples), orders, batches),
+        )
+        for k in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    in_flight = {name: 0 for name in tasks}
+    num_orders = 0
+    try:
+        while True:
+            # keep all the workers busy with the tasks with the largest priority.
+            while num_orders < num_workers:
+                priorities = {
+                    name: _priority(task, results[name], in_flight[name])
+                    for name, task in tasks.items()
+                }
+                priorities = {k: v for k, v in priorities.items() if v is not None}
+                if not priorities:
+                    break
+                name = max(priorities, key=lambda k: priorities[k])
+                orders.put((name, batch_size))
+                in_flight[name] += batch_size
+                num_orders += 1
+
+            if num_orders == 0:
+                break
+
+            name, batch = batches.get()
+            if isinstance(batch, str):
+                raise RuntimeError(f"A sampling worker failed:\n{batch}")
+            num_orders -= 1
+            in_flight[name] -= batch[2]
+            num_failures, num_samples_ps, num_samples, extra = results[name]
+            results[name] = (
+                num_failures + batch[0],
+                num_samples_ps + batch[1],
+                num_samples + batch[2],
+                {"seconds": extra["seconds"] + batch[3]["seconds"]},
+            )
+            if file_name is not None:
+                _append_sweep_data(file_name, name, *batch)
+            print_v(
+                f"Task '{name}': failures={results[name][0]} "
+                f"ps-samples={results[name][1]} samples={results[name][2]}"
+            )
+    finally:
+        for _ in workers:
+            orders.put(None)
+        for worker in workers:
+            worker.join()
+
+    print_v("Sampling conditions are reached for all tasks, finished sampling.")
+    return results
+
+
+def _priority(
+    task: dict,
+    totals: tuple[int, int, int, dict[str, int | float]],
+    in_flight: int,
+) -> tuple[float, int] | None:
+    """Returns the priority of the given task, or ``None`` if no more batches
+    should be sampled for it. The tasks with less progress go first,
+    see Notes in ``sample_failures_sweep``."""
+    num_failures, num_samples_ps, num_samples, _ = totals
+    max_failures = task.get("max_failures")
+    max_failures = np.inf if max_failures is None else max_failures
+    max_samples = task.get("max_samples")
+    max_samples = np.inf if max_samples is None else max_samples
+    target = task.get("target_rel_ci_width")
+    if num_failures >= max_failures:
+        return None
+    if num_samples + in_flight >= max_samples:
+        return None
+
+    progress = max(num_failures / max_failures, (num_samples + in_flight) / max_samples)
+    if (target is not None) and num_samples_ps > 0:
+        if num_failures > 0:
+            rel_width = _rel_ci_width(num_failures, num_samples_ps)
+            if rel_width <= target:
+                return None
+        else:
+            # the upper bound is an optimistic estimate of the probability,
+            # which gives a finite width that does not block the other tasks.
+            _, upper = confidence_interval_binomial(0, num_samples_ps)
+            rel_width = _rel_ci_width(upper * num_samples_ps, num_samples_ps)
+
+        # the width decreases as '1/sqrt(num_samples)', thus the samples being
+        # processed by the workers are taken into account to balance the tasks.
+        ratio = (num_samples + in_flight) / num_samples
+        progress = max(progress, (target / rel_width) ** 2 * ratio)
+
+    # tasks with less samples go first if they have the same progress.
+    return (-progress, -(num_samples + in_flight))
+
+
+def _sweep_worker(tasks: dict[str, dict], funcs, seed, orders, batches):
+    samplers, decoders = {}, {}
+    seed, worker_id, stored_samples = seed
+    while (order := orders.get()) is not None:
+        name, shots = order
+        try:
+            if name not in samplers:
+                task = tasks[name]
+                task_id = list(tasks).index(name)
+                seq = np.random.SeedSequence(
+                    seed, spawn_key=(worker_id, task_id, stored_samples[name])
+                )
+                samplers[name] = task["dem"].compile_sampler(
+                    seed=int(seq.generate_state(1)[0])
+                )
+                decoders[name] = _get_decoder(task["decoder"], task["dem"])
+
+            defects, log_flips, _ = samplers[name].sample(shots=shots)
+            batch = _decode_batch(
+                decoders[name].decode_batch,
+                defects,
+                log_flips,
+                *funcs,
+                print_v=lambda _: None,
+            )
+            batches.put((name, batch))
+        except BaseException:
+            batches.put((name, traceback.format_exc()))
+    return
+
+
+def _write_sweep_header(file_name: str | pathlib.Path):
+    file = open(file_name, "w")
+    if FILE_LOCKING:
+        fcntl.lockf(file, fcntl.LOCK_EX)
+
+    _ = file.write(",".join(["task"] + HEADER) + "\n")
+    file.close()
+    return
+
+
+def _append_sweep_data(
+    file_name: str | pathlib.Path,
+    name: str,
+    num_failures: int,
+    num_samples_ps: int,
+    num_samples: int,
+    extra: dict[str, int | float],
+):
+    file = open(file_name, "a")
+    if FILE_LOCKING:
+        fcntl.lockf(file, fcntl.LOCK_EX)
+
+    data = f"{name},{num_failures},{num_samples_ps},{num_samples},{extra['seconds']:0.6f}\n"
+    _ = file.write(data)
+    file.close()
+    return
+
+
+def read_sweep_from_file(
+    file_name: str | pathlib.Path,
+) -> dict[str, tuple[int, int, int, dict[str, int | float]]]:
+    """Returns the number of failures and samples for each task stored in a file
+    from ``sample_failures_sweep``.
+
+    Parameters
+    ----------
+    file_name
+        Name of the file with the data. The structure of the CSV file is:
+
+            ``task, num_failures_ps, num_samples_ps, num_samples, seconds``
+            `` str,             int,            int,         int,   float``
+
+    Returns
+    -------
+    results
+        Dictionary mapping the name of each task to its number of failures,
+        number of post-selected samples, number of samples, and extra metrics,
+        as in the output of ``sample_failures``.
+    """
+    if not pathlib.Path(file_name).exists():
+        raise FileExistsError(f"The given file ({file_name}) does not exist.")
+
+    totals: dict[str, list[int | float]] = {}
+    with open(file_name, "r") as file:
+        reader = csv.reader(file, delimiter=",")
+        header = next(reader, None)
+        if header is None:
+            raise ValueError("Header is missing in CSV file")
+        if header != ["task"] + HEADER:
+            raise ValueError("Incorrect header.")
+
+        for row in reader:
+            if row[0] not in totals:
+                totals[row[0]] = [0, 0, 0, 0.0]
+            totals[row[0]][0] += int(row[1])
+            totals[row[0]][1] += int(row[2])
+            totals[row[0]][2] += int(row[3])
+            totals[row[0]][3] += float(row[4])
+
+    return {k: (v[0], v[1], v[2], {"seconds": v[3]}) for k, v in totals.items()}
@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+import stim
+
+from qec_util.cache import DemCache
+from qec_util.dems import (
+    DemArrays,
+    decomposed_graphlike_dem,
+    get_flippable_detectors,
+    remove_hyperedges,
+)
+
+
+def test_DemCache(tmp_path):
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) D0 D4 ^ D0 D1 L0
+        error(0.2) D0 D4
+        error(0.2) D0 D1 L0
+        detector(0, 2, 1) D0
+        """
+    )
+    calls = []
+
+    def func(dem, prob_method="same"):
+        calls.append(prob_method)
+        return decomposed_graphlike_dem(dem, prob_method=prob_method)
+
+    cache = DemCache(maxsize=1, cache_dir=tmp_path)
+    cached_func = cache(func)
+
+    output = cached_func(dem)
+    assert output == decomposed_graphlike_dem(dem)
+    assert cached_func(dem, prob_method="same") == output
+    assert cached_func(dem.copy()) == output
+    assert len(calls) == 1
+
+    # outputs are copies
+    output.clear()
+    assert cached_func(dem) == decomposed_graphlike_dem(dem)
+
+    # the memory tier only has one entry, but the disk tier has both
+    _ = cached_func(dem, prob_method="zero")
+    assert len(calls) == 2
+    _ = DemCache(cache_dir=tmp_path)(func)(dem)
+    assert len(calls) == 2
+
+    cache.clear()
+    _ = cached_func(dem)
+    assert len(calls) == 3
+
+    # different functions have different keys
+    cached_get_flippable_detectors = cache(get_flippable_detectors)
+    assert cached_get_flippable_detectors(dem) == {0, 1, 4}
+
+    # DemArrays and DEMs do not share outputs
+    cached_remove_hyperedges = cache(remove_hyperedges)
+    dem_arrays = DemArrays.from_dem(dem)
+    assert cached_remove_hyperedges(dem) == remove_hyperedges(dem)
+    output = cached_remove_hyperedges(dem_arrays)
+    assert isinstance(output, DemArrays)
+    assert output.to_dem() == remove_hyperedges(dem_arrays).to_dem()
+
+    with pytest.raises(TypeError):
+        _ = cache("func")
+    with pytest.raises(ValueError):
+        _ = DemCache(maxsize=-1)
+
+    return
+
+
+def test_DemCache_eviction(tmp_path):
+    cache = DemCache(maxsize=0, cache_dir=tmp_path, max_disk_size=2_000)
+    calls = []
+
+    def func(k):
+        calls.append(k)
+        return b"0" * 600
+
+    cached_func = cache(func)
+    for k in range(5):
+        _ = cached_func(k)
+
+    assert len(list(tmp_path.glob("*.pkl"))) == 3
+    assert len(list(tmp_path.glob("*.tmp"))) == 0
+
+    _ = cached_func(4)
+    assert len(calls) == 5
+    _ = cached_func(0)
+    assert len(calls) == 6
+
+    return
+
+
+def test_DemCache_arrays():
+    cache = DemCache()
+    calls = []
+
+    def func(array):
+        calls.append(array)
+        return float(array.sum())
+
+    cached_func = cache(func)
+    array = np.zeros(5_000)
+    other_array = np.zeros(5_000)
+    other_array[2_500] = 7
+
+    assert cached_func(array) == 0
+    assert cached_func(other_array) == 7
+    assert cached_func(array.reshape(50, 100)) == 0
+    assert cached_func(array.copy()) == 0
+    assert len(calls) == 3
+
+    return
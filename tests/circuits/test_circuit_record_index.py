@@ -0,0 +1,46 @@
+import pytest
+import stim
+
+from qec_util.circuits import CircuitRecordIndex
+
+
+def test_CircuitRecordIndex():
+    circuit = stim.Circuit(
+        """
+        R 0 1 2
+        M 0 1
+        DETECTOR rec[-1]
+        REPEAT 2 {
+            MPP X0*X1
+            MR 2
+            DETECTOR rec[-1] rec[-3]
+        }
+        M 1
+        OBSERVABLE_INCLUDE(0) rec[-1]
+        """
+    )
+
+    index = CircuitRecordIndex(circuit)
+
+    assert len(index) == len(circuit.flattened())
+    assert index.num_measurements == circuit.num_measurements
+    assert index.num_detectors == circuit.num_detectors
+    assert index.num_measurements_before(2) == 2
+    assert index.num_measurements_after(2) == 5
+    assert index.num_measurements_between(1, 5) == 4
+    assert index.num_detectors_before(8) == 2
+
+    # 'DETECTOR rec[-1] rec[-3]' in the second iteration
+    assert index.measurement_index(8, -1) == 5
+    assert index.measurement_index(8, -3) == 3
+    assert index.qubit_measurement(5) == (2, 1)
+    assert index.qubit_measurement(4) == (-1, -1)
+    assert index.qubit_measurement(6) == (1, 1)
+    assert index.num_qubit_measurements_before(2, 8) == 2
+    assert index.num_qubit_measurements_before(1, 8) == 1
+    assert index.num_qubit_measurements_before(3, 8) == 0
+
+    with pytest.raises(TypeError):
+        _ = CircuitRecordIndex("M 0")
+
+    return
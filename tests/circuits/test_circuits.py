@@ -729,3 +729,155 @@ def test_merge_observable_definitions():
         _ = merge_observable_definitions(circuit)
 
     return
+
+
+def test_remove_detectors_repeat_blocks():
+    circuit = stim.Circuit(
+        """
+        R 0 1
+        REPEAT 100 {
+            M 0 1
+            DETECTOR rec[-1]
+            DETECTOR rec[-2]
+        }
+        """
+    )
+
+    new_circuit = remove_detectors(circuit, [1, 2])
+
+    expected_circuit = stim.Circuit(
+        """
+        R 0 1
+        M 0 1
+        DETECTOR rec[-2]
+        M 0 1
+        DETECTOR rec[-1]
+        REPEAT 98 {
+            M 0 1
+        }
+        """
+    )
+
+    assert new_circuit == expected_circuit
+    assert new_circuit.flattened() == remove_detectors(circuit.flattened(), [1, 2])
+
+    new_circuit = remove_gauge_detectors(circuit)
+
+    assert new_circuit == circuit
+
+    return
+
+
+def test_remove_observables_repeat_blocks():
+    circuit = stim.Circuit(
+        """
+        R 0 1
+        REPEAT 100 {
+            M 0 1
+            OBSERVABLE_INCLUDE(0) rec[-1]
+            OBSERVABLE_INCLUDE(1) rec[-2]
+        }
+        """
+    )
+
+    new_circuit = remove_observables(circuit, [1])
+
+    expected_circuit = stim.Circuit(
+        """
+        R 0 1
+        REPEAT 100 {
+            M 0 1
+            OBSERVABLE_INCLUDE(1) rec[-2]
+        }
+        """
+    )
+
+    assert new_circuit == expected_circuit
+
+    return
+
+
+def test_observables_to_detectors_repeat_blocks():
+    circuit = stim.Circuit(
+        """
+        R 0 1
+        REPEAT 100 {
+            M 0 1
+            DETECTOR rec[-1]
+            SHIFT_COORDS(1)
+        }
+        M 0
+        OBSERVABLE_INCLUDE(0) rec[-1]
+        """
+    )
+
+    new_circuit, obs_to_dets = observables_to_detectors(circuit)
+
+    expected_circuit = stim.Circuit(
+        """
+        R 0 1
+        REPEAT 100 {
+            M 0 1
+            DETECTOR rec[-1]
+            SHIFT_COORDS(1)
+        }
+        M 0
+        DETECTOR(-100) rec[-1]
+        """
+    )
+
+    assert new_circuit == expected_circuit
+    assert obs_to_dets == {
+        stim.target_logical_observable_id(0): stim.target_relative_detector_id(100)
+    }
+    assert new_circuit.flattened() == observables_to_detectors(circuit.flattened())[0]
+
+    circuit = stim.Circuit(
+        """
+        R 0
+        REPEAT 10 {
+            M 0
+            OBSERVABLE_INCLUDE(0) rec[-1]
+        }
+        """
+    )
+
+    with pytest.raises(ValueError):
+        _ = observables_to_detectors(circuit)
+
+    return
+
+
+def test_move_first_resets_to_beginning_repeat_blocks():
+    circuit = stim.Circuit(
+        """
+        X_ERROR(0.1) 0 1
+        R 0
+        REPEAT 100 {
+            X_ERROR(0.1) 1
+            R 1
+            M 0 1
+        }
+        """
+    )
+
+    new_circuit = move_first_resets_to_beginning(circuit)
+
+    expected_circuit = stim.Circuit(
+        """
+        R 0 1
+        M 0 1
+        REPEAT 99 {
+            X_ERROR(0.1) 1
+            R 1
+            M 0 1
+        }
+        """
+    )
+
+    assert new_circuit == expected_circuit
+    assert new_circuit.flattened() == move_first_resets_to_beginning(
+        circuit.flattened()
+    )
+
+    return
@@ -0,0 +1,59 @@
+import pytest
+import stim
+
+from qec_util.dem_instrs import (
+    ErrorMechanism,
+    decomposed_detectors,
+    decomposed_instrs,
+    decomposed_observables,
+    get_detectors,
+    get_observables,
+    has_separator,
+    merge_instrs,
+    sorted_dem_instr,
+)
+
+
+def test_ErrorMechanism():
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) D4 D0 L1 ^ D1 D0 L0 L1
+        error(0.2) D3 L0 D2
+        """
+    )
+
+    for instr in dem:
+        error = ErrorMechanism(instr)
+        assert error.prob == instr.args_copy()[0]
+        assert error.to_instr() == instr
+        assert error.detectors == get_detectors(instr)
+        assert error.observables == get_observables(instr)
+        assert error.has_separator == has_separator(instr)
+        assert error.decomposed_detectors == decomposed_detectors(instr)
+        assert error.decomposed_observables == decomposed_observables(instr)
+
+        assert get_detectors(error) == get_detectors(instr)
+        assert get_observables(error) == get_observables(instr)
+        assert has_separator(error) == has_separator(instr)
+        assert decomposed_detectors(error) == decomposed_detectors(instr)
+        assert decomposed_observables(error) == decomposed_observables(instr)
+        assert decomposed_instrs(error) == decomposed_instrs(instr)
+        assert sorted_dem_instr(error, prob=0) == sorted_dem_instr(instr, prob=0)
+
+    error = ErrorMechanism(dem[0])
+    assert error.detectors == (1, 4)
+    assert error.observables == (0,)
+    assert error.decomposed_detectors == [(0, 4), (0, 1)]
+    assert not hasattr(error, "__dict__")
+
+    instr = stim.DemInstruction("error", [0.3], dem[0].targets_copy())
+    assert merge_instrs(error, instr) == merge_instrs(dem[0], instr)
+
+    with pytest.raises(TypeError):
+        _ = ErrorMechanism(dem)
+    with pytest.raises(ValueError):
+        _ = ErrorMechanism(
+            stim.DemInstruction("detector", [], dem[1].targets_copy()[:1])
+        )
+
+    return
@@ -1,7 +1,7 @@
 import pytest
 import stim
 
-from qec_util.dem_instrs import decompose_hyperedge_to_edges
+from qec_util.dem_instrs import HyperedgeDecomposer, decompose_hyperedge_to_edges
 
 
 def test_decompose_hyperedge_to_edges():
@@ -63,3 +63,42 @@ def test_decompose_hyperedge_to_edges_decomposition_failure():
         )
 
     return
+
+
+def test_HyperedgeDecomposer():
+    dem_edges = stim.DetectorErrorModel(
+        """
+        error(0.2) D0 D7 L0
+        error(0.2) D7 D4 L0
+        error(0.2) D1 L0
+        error(0.2) D1 D2
+        """
+    )
+    hyperedges = stim.DetectorErrorModel(
+        """
+        error(0.1) D0 D1 D4 L0
+        error(0.3) D4 D1 D0 L0
+        error(0.1) D0 D1 D4
+        """
+    )
+
+    decomposer = HyperedgeDecomposer(dem_edges)
+
+    for hyperedge in hyperedges[:2]:
+        assert decomposer.decompose(hyperedge) == decompose_hyperedge_to_edges(
+            hyperedge, dem_edges
+        )
+    assert decomposer.decompose(
+        hyperedges[2], ignore_decomposition_failure=True
+    ) == decompose_hyperedge_to_edges(
+        hyperedges[2], dem_edges, ignore_decomposition_failure=True
+    )
+
+    with pytest.raises(ValueError):
+        _ = decomposer.decompose(hyperedges[2])
+    with pytest.raises(ValueError):
+        _ = decomposer.decompose(stim.DetectorErrorModel("error(0.1) D0 D8 D4")[0])
+    with pytest.raises(TypeError):
+        _ = HyperedgeDecomposer(hyperedges)
+
+    return
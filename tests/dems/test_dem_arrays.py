@@ -0,0 +1,165 @@
+import numpy as np
+import pytest
+import stim
+
+from qec_util.dems import (
+    DemArrays,
+    contains_only_edges,
+    detectors_to_observables,
+    disjoint_graphs,
+    get_dem_subgraph,
+    get_errors_triggering_detectors,
+    get_flippable_detectors,
+    get_flippable_observables,
+    get_max_weight_hyperedge,
+    observables_to_detectors,
+    only_errors,
+    remove_gauge_detectors,
+    remove_hyperedges,
+    separate_edges_and_hyperedges,
+)
+
+
+def test_DemArrays():
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) D0 D1 L0 ^ D2
+        error(0.2) D1
+        error(0.3) L1
+        error(0.4)
+        detector(1, 2) D3
+        repeat 2 {
+            error(0.05) D0 D4
+            shift_detectors 1
+        }
+        logical_observable L2
+        """
+    )
+
+    dem_arrays = DemArrays.from_dem(dem)
+
+    assert dem_arrays.num_errors == len(dem_arrays) == 6
+    assert dem_arrays.num_detectors == dem.num_detectors
+    assert dem_arrays.num_observables == dem.num_observables
+    assert dem_arrays.probs.tolist() == [0.1, 0.2, 0.3, 0.4, 0.05, 0.05]
+    assert dem_arrays.dets.tolist() == [0, 1, 2, 1, 0, 4, 1, 5]
+    assert dem_arrays.det_ptr.tolist() == [0, 3, 4, 4, 4, 6, 8]
+    assert dem_arrays.obs.tolist() == [0, 1]
+    assert dem_arrays.obs_ptr.tolist() == [0, 1, 1, 2, 2, 2, 2]
+    assert dem_arrays.sep_dets.tolist() == [2]
+    assert dem_arrays.sep_obs.tolist() == [1]
+    assert dem_arrays.sep_ptr.tolist() == [0, 1, 1, 1, 1, 1, 1]
+
+    expected_dem = stim.DetectorErrorModel(
+        """
+        error(0.1) D0 D1 L0 ^ D2
+        error(0.2) D1
+        error(0.3) L1
+        error(0.4)
+        error(0.05) D0 D4
+        error(0.05) D1 D5
+        detector(1, 2) D3
+        logical_observable L2
+        """
+    )
+    assert dem_arrays.to_dem() == expected_dem
+    assert DemArrays.from_dem(dem_arrays.to_dem()) == dem_arrays
+
+    assert DemArrays.from_targets(dem_arrays.probs, *dem_arrays.to_targets()) == (
+        dem_arrays.select(range(6), attributes=False)
+    )
+    assert dem_arrays.select([1, 4]).to_dem() == stim.DetectorErrorModel(
+        """
+        error(0.2) D1
+        error(0.05) D0 D4
+        detector(1, 2) D3
+        logical_observable L2
+        """
+    )
+
+    dets, det_ptr = DemArrays.from_dem(
+        stim.DetectorErrorModel("error(0.1) D3 D1 ^ D1 D0")
+    ).flipped_detectors()
+    assert dets.tolist() == [0, 3]
+    assert det_ptr.tolist() == [0, 2]
+
+    with pytest.raises(ValueError):
+        _ = DemArrays([0.1], [0], [0, 1], [], [0])
+
+    return
+
+
+def test_DemArrays_concatenate():
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) D0 D1 ^ D2 L0
+        detector(1, 2) D0
+        error(0.2) D1 L1
+        error(0.3) D3 ^ D4 ^ D0
+        logical_observable L3
+        """
+    )
+    dem_arrays = DemArrays.from_dem(dem)
+
+    dems = [dem_arrays.select([0], attributes=False), dem_arrays.select([1, 2])]
+    assert DemArrays.concatenate(dems) == dem_arrays
+    assert len(DemArrays.concatenate([])) == 0
+
+    return
+
+
+def test_DemArrays_in_dems_functions():
+    circuit = stim.Circuit.generated(
+        code_task="surface_code:rotated_memory_z",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.01,
+    )
+    dem = circuit.detector_error_model(decompose_errors=True)
+    dem_arrays = DemArrays.from_dem(dem)
+
+    for func in [
+        only_errors,
+        remove_hyperedges,
+        lambda x: separate_edges_and_hyperedges(x)[1],
+        lambda x: detectors_to_observables(x, 2),
+    ]:
+        assert func(dem_arrays) == DemArrays.from_dem(func(dem))
+
+    for func in [
+        get_flippable_detectors,
+        get_flippable_observables,
+        contains_only_edges,
+        get_max_weight_hyperedge,
+        disjoint_graphs,
+    ]:
+        assert func(dem_arrays) == func(dem)
+
+    # the error indices in 'dem.flattened()' include the detector instructions
+    support = get_errors_triggering_detectors(only_errors(dem), [1, 3])
+    assert get_errors_triggering_detectors(dem_arrays, [1, 3]) == support
+
+    # the decomposition is removed
+    new_dem = observables_to_detectors(dem_arrays)
+    assert new_dem.num_detectors == dem.num_detectors + 1
+    assert new_dem.num_observables == 0
+    assert new_dem.to_dem().num_errors == dem.num_errors
+
+    dem = circuit.detector_error_model()
+    dem_arrays = DemArrays.from_dem(dem)
+    assert get_dem_subgraph(dem_arrays, [0, 1, 2]) == DemArrays.from_dem(
+        get_dem_subgraph(dem, [0, 1, 2])
+    )
+
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) D0
+        error(0.5) D4
+        error(0.2) D1 D2
+        """
+    )
+    new_dem = remove_gauge_detectors(DemArrays.from_dem(dem))
+    assert new_dem == DemArrays.from_dem(remove_gauge_detectors(dem))
+    assert np.isclose(new_dem.probs, [0.1, 0.2]).all()
+
+    return
@@ -0,0 +1,55 @@
+import stim
+
+from qec_util.dems import DemArrays, DemIndex, dem_difference, is_instr_in_dem
+
+
+def test_DemIndex():
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) L0 D0
+        error(0.2) D1 ^ D2
+        error(0.3) D3 D4 D1
+        detector(1, 2) D0
+        error(0.4) D2 D1
+        """
+    )
+
+    index = DemIndex(dem)
+
+    assert len(index) == 4
+    assert index.keys == [((0,), (0,)), ((1, 2), ()), ((1, 3, 4), ()), ((1, 2), ())]
+    assert stim.DemInstruction("error", [0.2], dem[1].targets_copy()) in index
+    assert dem[4] in index
+    assert stim.DemInstruction("error", [0.5], dem[1].targets_copy()) not in index
+    assert index.get_errors(dem[1]) == [1, 3]
+    assert index.get_errors(((0,), (0,))) == [0]
+    assert index.get_errors(((5,), ())) == []
+
+    index_arrays = DemIndex(DemArrays.from_dem(dem))
+    assert index_arrays.keys == index.keys
+    assert index_arrays.probs == index.probs
+
+    return
+
+
+def test_DemIndex_in_dems_functions():
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) L0 D0
+        error(0.2) D1 ^ D2
+        error(0.3) D3 D4 D1
+        """
+    )
+    index = DemIndex(dem)
+
+    for instr in dem:
+        assert is_instr_in_dem(instr, index) == is_instr_in_dem(instr, dem)
+    instr = stim.DemInstruction("error", [0.3], dem[2].targets_copy()[:2])
+    assert not is_instr_in_dem(instr, index)
+
+    other_dem = stim.DetectorErrorModel("error(0.5) D0\nerror(0.2) D2 D1")
+    diff_1, diff_2 = dem_difference(DemArrays.from_dem(dem), other_dem)
+    assert diff_1 == stim.DetectorErrorModel("error(0.1) D0 L0\nerror(0.3) D1 D3 D4")
+    assert diff_2 == stim.DetectorErrorModel("error(0.5) D0")
+
+    return
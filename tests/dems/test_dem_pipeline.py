@@ -0,0 +1,51 @@
+from functools import partial
+
+import pytest
+import stim
+
+from qec_util.dems import (
+    DemArrays,
+    DemPipeline,
+    get_dem_subgraph,
+    observables_to_detectors,
+    only_errors,
+    remove_gauge_detectors,
+    remove_hyperedges,
+)
+
+
+def test_DemPipeline():
+    circuit = stim.Circuit.generated(
+        code_task="surface_code:rotated_memory_z",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.01,
+    )
+    dem = circuit.detector_error_model()
+    dets = list(range(12))
+
+    pipeline = DemPipeline(
+        only_errors,
+        remove_gauge_detectors,
+        partial(get_dem_subgraph, dets=dets),
+    ) + DemPipeline(remove_hyperedges, observables_to_detectors)
+
+    new_dem = pipeline(dem)
+
+    expected_dem = only_errors(dem)
+    expected_dem = remove_gauge_detectors(expected_dem)
+    expected_dem = get_dem_subgraph(expected_dem, dets)
+    expected_dem = remove_hyperedges(expected_dem)
+    expected_dem = observables_to_detectors(DemArrays.from_dem(expected_dem))
+
+    assert len(pipeline) == 5
+    assert isinstance(new_dem, stim.DetectorErrorModel)
+    assert DemArrays.from_dem(new_dem) == expected_dem
+    assert pipeline(DemArrays.from_dem(dem)) == expected_dem
+
+    with pytest.raises(TypeError):
+        _ = DemPipeline(only_errors, "remove_hyperedges")
+    with pytest.raises(TypeError):
+        _ = DemPipeline(lambda x: x.to_dem())(dem)
+
+    return
@@ -0,0 +1,62 @@
+import pytest
+import stim
+
+from qec_util.dems import (
+    DemArrays,
+    DemFileReader,
+    contains_only_edges,
+    get_dem_subgraph,
+    get_flippable_detectors,
+    get_flippable_observables,
+    get_max_weight_hyperedge,
+)
+
+
+def test_DemFileReader(tmp_path):
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) D0 D1 ^ D2 L0
+        detector(1, 2) D0
+        shift_detectors(0, 1) 3
+        repeat 3 {
+            error(0.2) D0 D1
+            repeat 2 {
+                error(0.3) D1 D2 D3
+                shift_detectors(1) 1
+            }
+            detector(0, 0) D0
+            shift_detectors(0, 2) 2
+        }
+        error[tag](0.25) D0 L1  # comment
+        """
+    )
+    file_name = tmp_path / "dem.dem"
+    dem.to_file(file_name)
+
+    for chunk_size in [1, 2, 100]:
+        reader = DemFileReader(file_name, chunk_size=chunk_size)
+        chunks = list(reader)
+        assert DemArrays.concatenate(chunks) == DemArrays.from_dem(dem)
+        assert list(reader) == chunks
+
+    reader = DemFileReader(file_name, chunk_size=2)
+    assert get_flippable_detectors(reader) == get_flippable_detectors(dem)
+    assert get_flippable_observables(reader) == get_flippable_observables(dem)
+    assert contains_only_edges(reader) == contains_only_edges(dem)
+    assert get_max_weight_hyperedge(reader) == get_max_weight_hyperedge(dem)
+    assert get_dem_subgraph(reader, [1, 5, 6]) == DemArrays.from_dem(
+        get_dem_subgraph(dem, [1, 5, 6])
+    )
+
+    with pytest.raises(FileExistsError):
+        _ = DemFileReader(tmp_path / "other.dem")
+    with pytest.raises(ValueError):
+        _ = DemFileReader(file_name, chunk_size=0)
+
+    file_name = tmp_path / "unclosed.dem"
+    with open(file_name, "w") as file:
+        file.write("repeat 2 {\nerror(0.1) D0\n")
+    with pytest.raises(ValueError):
+        _ = list(DemFileReader(file_name))
+
+    return
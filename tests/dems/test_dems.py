@@ -2,10 +2,14 @@ import numpy as np
 import pytest
 import stim
 
+from qec_util.dem_instrs import xor_probs
 from qec_util.dems import (
+    DemArrays,
     contains_only_edges,
     dem_difference,
+    dem_to_check_matrices,
     detectors_to_observables,
+    disjoint_graph_labels,
     disjoint_graphs,
     get_dem_subgraph,
     get_errors_triggering_detectors,
@@ -13,6 +17,7 @@ from qec_util.dems import (
     get_flippable_observables,
     get_max_weight_hyperedge,
     is_instr_in_dem,
+    merge_errors,
     observables_to_detectors,
     only_errors,
     prepare_distance2_dem_for_pymatching,
@@ -23,16 +28,20 @@ from qec_util.dems import (
 )
 
 
-def test_remove_gauge_detectors():
+@pytest.mark.parametrize(
+    "to_dem_type", [lambda dem: dem, DemArrays.from_dem], ids=["stim", "DemArrays"]
+)
+def test_remove_gauge_detectors(to_dem_type):
     dem = stim.DetectorErrorModel(
         """
         error(0.1) D0
-        error(0.5) D4 
+        error(0.5) D4
         error(0.2) D1 D2
+        error(0.5) L0
         """
     )
 
-    new_dem = remove_gauge_detectors(dem)
+    new_dem = remove_gauge_detectors(to_dem_type(dem))
 
     expected_dem = stim.DetectorErrorModel(
         """
@@ -41,7 +50,7 @@ def test_remove_gauge_detectors():
         """
     )
 
-    assert new_dem == expected_dem
+    assert new_dem == to_dem_type(expected_dem)
 
     dem = stim.DetectorErrorModel(
         """
@@ -51,7 +60,7 @@ def test_remove_gauge_detectors():
         """
     )
     with pytest.raises(ValueError):
-        _ = remove_gauge_detectors(dem)
+        _ = remove_gauge_detectors(to_dem_type(dem))
 
     dem = stim.DetectorErrorModel(
         """
@@ -61,7 +70,16 @@ def test_remove_gauge_detectors():
         """
     )
     with pytest.raises(ValueError):
-        _ = remove_gauge_detectors(dem)
+        _ = remove_gauge_detectors(to_dem_type(dem))
+
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.5) L0
+        error(0.2) D1 L0
+        """
+    )
+    with pytest.raises(ValueError):
+        _ = remove_gauge_detectors(to_dem_type(dem))
 
     return
 
@@ -206,6 +224,26 @@ def test_disjoint_graphs():
     return
 
 
+def test_disjoint_graph_labels():
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) L0 D0
+        error(0.2) D1 ^ D2
+        error(0.3) D3 D6 D1
+        error(0.5) D5 D7
+        detector(0) D8
+        """
+    )
+
+    labels = disjoint_graph_labels(dem)
+
+    expected_labels = np.array([0, 1, 1, 1, -1, 2, 1, 2, -1])
+    assert (labels == expected_labels).all()
+    assert disjoint_graphs(dem) == [[0], [1, 2, 3, 6], [5, 7]]
+
+    return
+
+
 def test_get_flippable_detectors():
     dem = stim.DetectorErrorModel(
         """
@@ -450,6 +488,37 @@ def test_prepare_distance2_dem_for_pymatching():
 
     assert new_dem == expected_dem
 
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) L1 D1
+        error(0.1) D0 L0
+        error(0.15) D0 L0
+        error(0.05) D0 ^ D2 D2
+        error(0.1) D0
+        detector(1) D0
+        """
+    )
+
+    new_dem = prepare_distance2_dem_for_pymatching(dem)
+
+    expected_dem = stim.DetectorErrorModel(
+        """
+        error(0.1) L1 D1
+        error(0.22) D0 L0
+        detector(1) D0
+        """
+    )
+
+    assert len(new_dem) == len(expected_dem)
+    for instr, expected_instr in zip(new_dem, expected_dem):
+        assert instr.targets_copy() == expected_instr.targets_copy()
+        assert np.isclose(instr.args_copy()[0], expected_instr.args_copy()[0])
+
+    with pytest.raises(ValueError):
+        _ = prepare_distance2_dem_for_pymatching(
+            stim.DetectorErrorModel("error(0.1) D0 D1 D2")
+        )
+
     return
 
 
@@ -589,6 +658,42 @@ def test_remove_fake_errors():
     return
 
 
+def test_remove_fake_errors_batch():
+    circuit = stim.Circuit(
+        """
+        R 0 1 2 3 4 5
+        Z_ERROR(0.1) 0 1
+        X_ERROR(0.2) 2 5
+        DEPOLARIZE1(0.1) 3
+        MX 0 1 2 3 4
+        M 5
+        DETECTOR rec[-6]
+        DETECTOR rec[-5]
+        DETECTOR rec[-4]
+        DETECTOR rec[-3]
+        DETECTOR rec[-2] rec[-6]
+        DETECTOR rec[-1]
+        """
+    )
+    dem = circuit.detector_error_model(allow_gauge_detectors=True)
+
+    # each instruction explained on its own
+    expected_dem = stim.DetectorErrorModel()
+    for instr in dem:
+        instr_dem = stim.DetectorErrorModel()
+        instr_dem.append(instr)
+        expected_dem += remove_fake_errors(circuit, instr_dem)
+
+    assert remove_fake_errors(circuit, dem) == expected_dem
+    assert remove_fake_errors(circuit, dem, num_workers=2) == expected_dem
+    assert len(expected_dem) == 4
+
+    with pytest.raises(ValueError):
+        _ = remove_fake_errors(circuit, dem, num_workers=0)
+
+    return
+
+
 def test_detectors_to_observables():
     dem = stim.DetectorErrorModel(
         """
@@ -673,3 +778,83 @@ def test_get_dem_subgraph():
     assert new_dem == expected_dem
 
     return
+
+
+def test_dem_to_check_matrices():
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) D0 D1 L0
+        detector(1, 2) D3
+        error(0.2) D1 ^ D1 D2
+        error(0.3) L1
+        """
+    )
+
+    det_matrix, obs_matrix, priors = dem_to_check_matrices(dem)
+
+    assert det_matrix.shape == (4, 3)
+    assert obs_matrix.shape == (2, 3)
+    assert (det_matrix.toarray() == [[1, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 0]]).all()
+    assert (obs_matrix.toarray() == [[1, 0, 0], [0, 0, 1]]).all()
+    assert np.allclose(priors, [0.1, 0.2, 0.3])
+
+    return
+
+
+def test_merge_errors():
+    dem = stim.DetectorErrorModel(
+        """
+        error(0.1) D1 D0
+        error(0.2) D0 D1
+        error(0.3) D2 ^ D0 D1 D2
+        error(0.5) D5
+        error(0.6) D5
+        error(0.7) D5 L0
+        detector(1) D0
+        error(0.4) D1 D0 L0
+        """
+    )
+
+    new_dem = merge_errors(dem)
+
+    expected_dem = stim.DetectorErrorModel(
+        """
+        error(0.404) D0 D1
+        error(0.5) D5
+        error(0.7) D5 L0
+        error(0.4) D0 D1 L0
+        detector(1) D0
+        """
+    )
+
+    assert len(new_dem) == len(expected_dem)
+    for instr, expected_instr in zip(new_dem, expected_dem):
+        assert instr.type == expected_instr.type
+        assert instr.targets_copy() == expected_instr.targets_copy()
+        assert np.isclose(instr.args_copy()[0], expected_instr.args_copy()[0])
+    assert new_dem[2] == expected_dem[2]
+
+    assert merge_errors(DemArrays.from_dem(dem)) == DemArrays.from_dem(new_dem)
+    assert merge_errors(stim.DetectorErrorModel()) == stim.DetectorErrorModel()
+
+    return
+
+
+def test_merge_errors_small_probs():
+    for prob in [0, 1e-17, 1e-12, 1e-9, 0.3, 0.5, 0.7]:
+        dem = stim.DetectorErrorModel(
+            f"""
+            error({prob}) D0
+            error({prob}) D0
+            error({prob}) D0
+            """
+        )
+
+        new_dem = merge_errors(dem)
+
+        assert len(new_dem) == 1
+        new_prob = new_dem[0].args_copy()[0]
+        assert np.isclose(new_prob, xor_probs(prob, prob, prob), rtol=1e-12, atol=0)
+        assert np.copysign(1, new_prob) == 1
+
+    return
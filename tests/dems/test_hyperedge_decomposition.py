@@ -31,6 +31,34 @@ def test_decompose_hyperedges_to_edges():
 
     assert decom_dem == expected_dem
 
+    decom_dem = decompose_hyperedges_to_edges(dem, num_workers=2)
+
+    assert decom_dem == expected_dem
+
+    return
+
+
+def test_decompose_hyperedges_to_edges_num_workers():
+    circuit = stim.Circuit.generated(
+        "color_code:memory_xyz",
+        distance=5,
+        rounds=3,
+        after_clifford_depolarization=0.001,
+    )
+    dem = circuit.detector_error_model()
+
+    decom_dem = decompose_hyperedges_to_edges(dem, ignore_decomposition_failures=True)
+    parallel_decom_dem = decompose_hyperedges_to_edges(
+        dem, ignore_decomposition_failures=True, num_workers=3
+    )
+
+    assert parallel_decom_dem == decom_dem
+
+    with pytest.raises(ValueError):
+        _ = decompose_hyperedges_to_edges(dem, num_workers=2)
+    with pytest.raises(ValueError):
+        _ = decompose_hyperedges_to_edges(dem, num_workers=0)
+
     return
 
 
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+import stim
+from pymatching import Matching
+
+from qec_util.samplers import sample_failures, sample_failures_importance
+
+
+def test_sample_failures_importance():
+    circuit = stim.Circuit.generated(
+        code_task="repetition_code:memory",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.005,
+    )
+    dem = circuit.detector_error_model()
+    mwpm = Matching(dem)
+
+    num_failures, num_samples_ps, num_samples, extra = sample_failures_importance(
+        dem, mwpm, boost=4, max_samples=20_000, seed=123, verbose=False
+    )
+    assert num_samples == 20_000
+    assert extra["num_failures_sampled"] > 0
+    assert num_failures / num_samples_ps == pytest.approx(extra["prob"])
+
+    ref_failures, _, ref_samples, _ = sample_failures(
+        dem, mwpm, max_samples=400_000, batch_size=50_000, seed=321, verbose=False
+    )
+    ref_prob = ref_failures / ref_samples
+    ref_std = np.sqrt(ref_prob * (1 - ref_prob) / ref_samples)
+    assert abs(extra["prob"] - ref_prob) < 5 * np.sqrt(extra["std"] ** 2 + ref_std**2)
+    # the boosted sampling is more precise than the direct one with the same samples
+    assert extra["std"] < np.sqrt(ref_prob * (1 - ref_prob) / num_samples)
+
+    # without boosting, the estimate corresponds to the direct sampling
+    num_failures, num_samples_ps, _, extra = sample_failures_importance(
+        dem, mwpm, boost=1, max_samples=5_000, verbose=False
+    )
+    assert num_failures == pytest.approx(extra["num_failures_sampled"])
+    assert num_samples_ps == pytest.approx(5_000)
+
+    # post-selection, discarding the shots with a logical error in the
+    # second copy of the repetition code
+    shifted_dem = stim.DetectorErrorModel(str(dem).replace("L0", "L1"))
+    ps_dem = dem + stim.DetectorErrorModel(f"shift_detectors {dem.num_detectors}")
+    ps_dem += shifted_dem
+    ps_mwpm = Matching(ps_dem)
+    funcs = dict(
+        decoding_failure=lambda x: x[:, 0],
+        post_selection=lambda x: ~x[:, 1],
+    )
+
+    num_failures, num_samples_ps, num_samples, extra = sample_failures_importance(
+        ps_dem, ps_mwpm, boost=4, max_samples=20_000, seed=123, verbose=False, **funcs
+    )
+    assert extra["num_samples_ps_sampled"] < num_samples
+    assert extra["num_failures_sampled"] > 0
+    assert num_failures / num_samples_ps == pytest.approx(extra["prob"])
+
+    ref_failures, ref_samples, _, _ = sample_failures(
+        ps_dem,
+        ps_mwpm,
+        max_samples=400_000,
+        batch_size=50_000,
+        seed=321,
+        verbose=False,
+        **funcs,
+    )
+    ref_prob = ref_failures / ref_samples
+    ref_std = np.sqrt(ref_prob * (1 - ref_prob) / ref_samples)
+    assert abs(extra["prob"] - ref_prob) < 5 * np.sqrt(extra["std"] ** 2 + ref_std**2)
+
+    with pytest.raises(ValueError):
+        _ = sample_failures_importance(dem, mwpm, boost=2)
+
+    return
@@ -1,4 +1,6 @@
+import json
 import pathlib
+import shutil
 import time
 
 import numpy as np
@@ -6,7 +8,9 @@ import pytest
 import stim
 from pymatching import Matching
 
+from qec_util.performance import confidence_interval_binomial
 from qec_util.samplers import (
+    checkpoint_file_name,
     merge_batches_in_file,
     merge_files,
     read_failures_from_file,
@@ -362,3 +366,353 @@ def test_merge_files(tmp_path: pathlib.Path):
     assert len(extra) == 3
 
     return
+
+
+def test_sampler_num_workers(tmp_path: pathlib.Path):
+    circuit = stim.Circuit.generated(
+        code_task="repetition_code:memory",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.01,
+    )
+    dem = circuit.detector_error_model()
+    mwpm = Matching(dem)
+
+    num_failures, num_samples_ps, num_samples, extra = sample_failures(
+        dem,
+        mwpm,
+        max_samples=10_000,
+        batch_size=1_000,
+        num_workers=3,
+        seed=123,
+        verbose=False,
+    )
+    assert num_samples == 10_000
+    assert num_samples_ps == 10_000
+    assert num_failures > 0
+    assert extra["seconds"] > 0
+
+    # decoder given as a class, built by each worker
+    num_failures, num_samples_ps, num_samples, extra = sample_failures(
+        dem,
+        Matching,
+        max_samples=5_000,
+        batch_size=500,
+        num_workers=2,
+        file_name=tmp_path / "tmp_file_workers.csv",
+        verbose=False,
+    )
+    read_failures, read_samples_ps, read_samples, read_extra = read_failures_from_file(
+        tmp_path / "tmp_file_workers.csv"
+    )
+    assert num_samples == read_samples == 5_000
+    assert num_failures == read_failures
+    assert num_samples_ps == read_samples_ps
+    assert np.isclose(extra["seconds"], read_extra["seconds"])
+
+    with pytest.raises(RuntimeError):
+        _ = sample_failures(
+            dem,
+            lambda _: None,
+            max_samples=1_000,
+            num_workers=2,
+            verbose=False,
+        )
+
+    return
+
+
+def test_sampler_batch_time():
+    circuit = stim.Circuit.generated(
+        code_task="repetition_code:memory",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.01,
+    )
+    dem = circuit.detector_error_model()
+    mwpm = Matching(dem)
+
+    num_failures, num_samples_ps, num_samples, _ = sample_failures(
+        dem,
+        mwpm,
+        max_samples=123_456,
+        batch_size=10,
+        batch_time=0.01,
+        verbose=False,
+    )
+    assert num_samples == 123_456
+    assert num_samples_ps == 123_456
+
+    num_failures, _, num_samples, _ = sample_failures(
+        dem,
+        mwpm,
+        max_failures=500,
+        batch_size=100,
+        batch_time=0.05,
+        verbose=False,
+    )
+    assert num_failures >= 500
+    assert num_failures < 520
+
+    return
+
+
+def test_sampler_batch_time_slow_sampler(tmp_path: pathlib.Path):
+    # the decoder is instantaneous, thus the time is spent in the sampling
+    rng = np.random.default_rng(0)
+    dem = stim.DetectorErrorModel()
+    for dets in rng.integers(0, 500, size=(20_000, 2)):
+        dem.append(
+            "error",
+            0.01,
+            [stim.target_relative_detector_id(d) for d in dets]
+            + [stim.target_logical_observable_id(0)],
+        )
+
+    class FastDecoder:
+        def decode_batch(self, defects):
+            return np.zeros((len(defects), 1), dtype=bool)
+
+    t0 = time.time()
+    _ = dem.compile_sampler(seed=0).sample(2_000)
+    rate = 2_000 / (time.time() - t0)
+    batch_time = 0.05
+    file_name = tmp_path / "tmp_file_slow_sampler.csv"
+
+    _ = sample_failures(
+        dem,
+        FastDecoder(),
+        max_samples=int(20 * rate * batch_time),
+        batch_size=100,
+        batch_time=batch_time,
+        file_name=file_name,
+        verbose=False,
+    )
+
+    with open(file_name, "r") as file:
+        batch_sizes = [int(line.split(",")[2]) for line in file.readlines()[1:]]
+    # without the sampling time, the batch size doubles after each batch
+    assert max(batch_sizes) < 4 * rate * batch_time
+
+    return
+
+
+def test_sampler_prefetch(tmp_path: pathlib.Path):
+    circuit = stim.Circuit.generated(
+        code_task="repetition_code:memory",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.01,
+    )
+    dem = circuit.detector_error_model()
+    mwpm = Matching(dem)
+
+    num_failures, num_samples_ps, num_samples, _ = sample_failures(
+        dem,
+        mwpm,
+        max_samples=10_000,
+        batch_size=1_000,
+        prefetch=3,
+        file_name=tmp_path / "tmp_file_prefetch.csv",
+        verbose=False,
+    )
+    read_failures, _, read_samples, _ = read_failures_from_file(
+        tmp_path / "tmp_file_prefetch.csv"
+    )
+    assert num_samples == read_samples == 10_000
+    assert num_failures == read_failures
+
+    # the pipeline must give the same results as the sequential sampling
+    outputs = [
+        sample_failures(
+            dem, mwpm, max_samples=5_000, prefetch=p, seed=42, verbose=False
+        )[:3]
+        for p in (0, 2)
+    ]
+    assert outputs[0] == outputs[1]
+
+    _, _, num_samples, _ = sample_failures(
+        dem,
+        mwpm,
+        max_samples=6_000,
+        batch_size=1_000,
+        prefetch=1,
+        num_workers=2,
+        verbose=False,
+    )
+    assert num_samples == 6_000
+
+    return
+
+
+def test_sampler_bit_packed():
+    circuit = stim.Circuit.generated(
+        code_task="surface_code:rotated_memory_z",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.01,
+    )
+    dem = circuit.detector_error_model()
+    mwpm = Matching(dem)
+
+    class UnpackedDecoder:
+        def decode_batch(self, defects):
+            assert defects.dtype == bool
+            return mwpm.decode_batch(defects)
+
+    outputs = [
+        sample_failures(
+            dem,
+            decoder,
+            max_samples=5_000,
+            seed=42,
+            bit_packed=bit_packed,
+            extra_metrics=lambda x: {"obs_0": x[:, 0] == 1},
+            verbose=False,
+        )[:3]
+        for decoder, bit_packed in [
+            (mwpm, False),
+            (mwpm, True),
+            (UnpackedDecoder(), True),
+        ]
+    ]
+    assert outputs[0] == outputs[1] == outputs[2]
+    assert outputs[0][0] > 0
+
+    with pytest.raises(TypeError):
+        _ = sample_failures(dem, mwpm, max_samples=5_000, bit_packed=1)
+
+    return
+
+
+def test_sampler_checkpoint(tmp_path: pathlib.Path):
+    circuit = stim.Circuit.generated(
+        code_task="repetition_code:memory",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.05,
+    )
+    dem = circuit.detector_error_model()
+    file_name = tmp_path / "tmp_file_ckpt.csv"
+
+    _ = sample_failures(
+        dem,
+        Matching,
+        max_samples=3_000,
+        file_name=file_name,
+        checkpoint=True,
+        verbose=False,
+    )
+    assert checkpoint_file_name(file_name).exists()
+    other_file_name = tmp_path / "tmp_file_ckpt_copy.csv"
+    shutil.copy(file_name, other_file_name)
+    shutil.copy(checkpoint_file_name(file_name), checkpoint_file_name(other_file_name))
+
+    # the seed is stored in the checkpoint
+    resumed = sample_failures(
+        dem,
+        Matching(dem),
+        max_samples=6_000,
+        file_name=file_name,
+        checkpoint=True,
+        verbose=False,
+    )
+    assert resumed[2] == 6_000
+
+    # resuming from the same checkpoint gives the same samples
+    other_resumed = sample_failures(
+        dem,
+        Matching,
+        max_samples=6_000,
+        file_name=other_file_name,
+        checkpoint=True,
+        verbose=False,
+    )
+    assert resumed[:3] == other_resumed[:3]
+
+    with open(checkpoint_file_name(file_name), "r") as file:
+        seed = json.load(file)["seed"]
+
+    with pytest.raises(ValueError):
+        _ = sample_failures(
+            dem,
+            Matching,
+            max_samples=9_000,
+            file_name=file_name,
+            checkpoint=True,
+            seed=seed + 1,
+        )
+    with pytest.raises(ValueError):
+        _ = sample_failures(
+            stim.DetectorErrorModel("error(0.1) D0 L0"),
+            Matching,
+            max_samples=9_000,
+            file_name=file_name,
+            checkpoint=True,
+        )
+    # decoder with a different configuration
+    other_dem = stim.Circuit.generated(
+        code_task="repetition_code:memory",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.01,
+    ).detector_error_model()
+    with pytest.raises(ValueError):
+        _ = sample_failures(
+            dem,
+            Matching(other_dem),
+            max_samples=9_000,
+            file_name=file_name,
+            checkpoint=True,
+        )
+    with pytest.raises(ValueError):
+        _ = sample_failures(
+            dem,
+            Matching,
+            max_samples=9_000,
+            file_name=file_name,
+            checkpoint=True,
+            decoder_config={"max_iter": 10},
+        )
+    with pytest.raises(ValueError):
+        _ = sample_failures(dem, Matching, max_samples=9_000, checkpoint=True)
+
+    return
+
+
+def test_sampler_target_rel_ci_width():
+    circuit = stim.Circuit.generated(
+        code_task="repetition_code:memory",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.05,
+    )
+    dem = circuit.detector_error_model()
+    mwpm = Matching(dem)
+
+    num_failures, num_samples_ps, num_samples, _ = sample_failures(
+        dem, mwpm, batch_size=200, target_rel_ci_width=0.2, verbose=False
+    )
+    lower, upper = confidence_interval_binomial(num_failures, num_samples_ps)
+    assert (upper - lower) * num_samples_ps / num_failures <= 0.2
+    # about '(2 * 1.96 / 0.2)**2 = 384' failures are needed
+    assert num_failures < 450
+
+    _, _, num_samples, extra = sample_failures(
+        dem,
+        mwpm,
+        batch_size=100,
+        batch_time=1,
+        extra_metrics=lambda x: {"zeros": x[:, 0] == 0},
+        target_rel_ci_width_metrics={"zeros": 0.01},
+        verbose=False,
+    )
+    lower, upper = confidence_interval_binomial(extra["zeros"], num_samples)
+    assert (upper - lower) * num_samples / extra["zeros"] <= 0.01
+
+    with pytest.raises(ValueError):
+        _ = sample_failures(dem, mwpm, target_rel_ci_width_metrics={"zeros": 0.01})
+    with pytest.raises(ValueError):
+        _ = sample_failures(dem, mwpm, target_rel_ci_width=-1)
+
+    return
@@ -0,0 +1,147 @@
+import pathlib
+
+import numpy as np
+import stim
+from pymatching import Matching
+
+from qec_util.samplers import (
+    FailuresFileReader,
+    merge_batches_in_file,
+    merge_files,
+    read_failures_from_file,
+    sample_failures,
+)
+from qec_util.samplers.storage import is_binary_file
+
+
+def test_binary_file(tmp_path: pathlib.Path):
+    circuit = stim.Circuit.generated(
+        code_task="repetition_code:memory",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.01,
+    )
+    dem = circuit.detector_error_model()
+    mwpm = Matching(dem)
+    extra_metrics = lambda x: {"test": np.ones(len(x), dtype=bool)}
+    file_name = tmp_path / "tmp_file.bin"
+
+    num_failures, num_samples_ps, num_samples, extra = sample_failures(
+        dem,
+        mwpm,
+        max_samples=1_000,
+        batch_size=100,
+        file_name=file_name,
+        extra_metrics=extra_metrics,
+        verbose=False,
+    )
+
+    assert is_binary_file(file_name)
+    read_failures, read_samples_ps, read_samples, read_extra = read_failures_from_file(
+        file_name
+    )
+    assert num_failures == read_failures
+    assert num_samples_ps == read_samples_ps
+    assert num_samples == read_samples == 1_000
+    assert read_extra["test"] == 1_000
+    assert extra == read_extra
+
+    _, _, read_samples, read_extra = read_failures_from_file(
+        file_name, max_num_samples=250
+    )
+    assert read_samples == 300
+    assert read_extra["test"] == 300
+
+    # continue sampling from the file
+    _, _, num_samples, _ = sample_failures(
+        dem,
+        mwpm,
+        max_samples=2_000,
+        batch_size=100,
+        file_name=file_name,
+        extra_metrics=extra_metrics,
+        verbose=False,
+    )
+    assert num_samples == 2_000
+
+    merge_batches_in_file(file_name)
+    assert file_name.stat().st_size < 200
+    _, _, read_samples, read_extra = read_failures_from_file(file_name)
+    assert read_samples == 2_000
+    assert read_extra["test"] == 2_000
+
+    return
+
+
+def test_merge_files_binary(tmp_path: pathlib.Path):
+    contents = "num_failures_ps,num_samples_ps,num_samples,seconds,m1,m2\n"
+    contents += "1,10,10,0.003,2,4\n"
+    with open(tmp_path / "tmp_file_1.csv", "w") as file:
+        file.write(contents)
+
+    contents = "num_failures_ps,num_samples_ps,num_samples,seconds,m1,m2\n"
+    contents += "5,20,20,0.004,1,0\n"
+    with open(tmp_path / "tmp_file_2.csv", "w") as file:
+        file.write(contents)
+
+    assert not is_binary_file(tmp_path / "tmp_file_1.csv")
+
+    merge_files(
+        [tmp_path / "tmp_file_1.csv", tmp_path / "tmp_file_2.csv"],
+        tmp_path / "merged_file.bin",
+    )
+
+    assert is_binary_file(tmp_path / "merged_file.bin")
+    num_failures, num_samples_ps, num_samples, extra = read_failures_from_file(
+        tmp_path / "merged_file.bin"
+    )
+    assert num_failures == 6
+    assert num_samples_ps == 30
+    assert num_samples == 30
+    assert extra["m1"] == 3
+    assert extra["m2"] == 4
+    assert np.isclose(extra["seconds"], 0.007)
+    assert len(extra) == 3
+
+    return
+
+
+def test_failures_file_reader(tmp_path: pathlib.Path):
+    file_name = tmp_path / "tmp_file.csv"
+    contents = "num_failures_ps,num_samples_ps,num_samples,seconds,m1\n"
+    contents += "1,10,10,0.003,2\n"
+    with open(file_name, "w") as file:
+        file.write(contents)
+
+    reader = FailuresFileReader(file_name)
+    num_failures, num_samples_ps, num_samples, extra = reader.read()
+    assert (num_failures, num_samples_ps, num_samples) == (1, 10, 10)
+    assert extra == {"m1": 2, "seconds": 0.003}
+
+    # only complete lines are read
+    with open(file_name, "a") as file:
+        file.write("2,20,20,0.001,1\n3,30")
+    num_failures, num_samples_ps, num_samples, extra = reader.read()
+    assert (num_failures, num_samples_ps, num_samples) == (3, 30, 30)
+    assert extra["m1"] == 3
+
+    with open(file_name, "a") as file:
+        file.write(",30,0.001,0\n")
+    num_failures, num_samples_ps, num_samples, extra = reader.read()
+    assert (num_failures, num_samples_ps, num_samples) == (6, 60, 60)
+    assert extra == read_failures_from_file(file_name)[3]
+
+    # file rewritten
+    merge_batches_in_file(file_name)
+    with open(file_name, "a") as file:
+        file.write("1,1,1,0.001,1\n1,1,1,0.001,1\n1,1,1,0.001,1\n")
+    assert reader.read() == read_failures_from_file(file_name)
+
+    # file truncated
+    with open(file_name, "w") as file:
+        file.write("num_failures_ps,num_samples_ps,num_samples,seconds,m1\n")
+    num_failures, num_samples_ps, num_samples, extra = reader.read()
+    assert (num_failures, num_samples_ps, num_samples) == (0, 0, 0)
+    assert extra == {"m1": 0, "seconds": 0}
+
+    return
@@ -0,0 +1,117 @@
+import pathlib
+
+import numpy as np
+import pytest
+import stim
+from pymatching import Matching
+
+from qec_util.samplers import read_sweep_from_file, sample_failures_sweep
+from qec_util.samplers.sweeps import _priority
+
+
+def test_sample_failures_sweep(tmp_path: pathlib.Path):
+    tasks = {}
+    for prob in [0.01, 0.03]:
+        circuit = stim.Circuit.generated(
+            code_task="repetition_code:memory",
+            distance=3,
+            rounds=3,
+            after_clifford_depolarization=prob,
+        )
+        dem = circuit.detector_error_model()
+        tasks[f"p={prob}"] = dict(
+            dem=dem, decoder=Matching, target_rel_ci_width=0.2, max_samples=100_000
+        )
+    tasks["fixed"] = dict(dem=dem, decoder=Matching(dem), max_samples=3_000)
+    file_name = tmp_path / "tmp_sweep.csv"
+
+    results = sample_failures_sweep(
+        tasks, num_workers=2, batch_size=500, file_name=file_name, verbose=False
+    )
+
+    assert set(results) == set(tasks)
+    assert results["fixed"][2] == 3_000
+    stored = read_sweep_from_file(file_name)
+    for name in tasks:
+        assert stored[name][:3] == results[name][:3]
+        assert stored[name][3]["seconds"] == pytest.approx(
+            results[name][3]["seconds"], abs=1e-3
+        )
+    for name in ["p=0.01", "p=0.03"]:
+        num_failures, _, num_samples, extra = results[name]
+        assert num_failures > 0
+        assert extra["seconds"] > 0
+    # the point with the lower logical error probability requires more samples
+    assert results["p=0.01"][2] > results["p=0.03"][2]
+
+    # continue from the file
+    tasks["fixed"]["max_samples"] = 4_000
+    new_results = sample_failures_sweep(
+        tasks, batch_size=500, file_name=file_name, verbose=False
+    )
+    assert new_results["fixed"][2] == 4_000
+    assert new_results["p=0.01"][:3] == results["p=0.01"][:3]
+
+    with pytest.raises(ValueError):
+        _ = sample_failures_sweep({"a": dict(dem=dem, decoder=Matching)})
+    with pytest.raises(ValueError):
+        _ = sample_failures_sweep(
+            {"a": dict(dem=dem, decoder=Matching, target_rel_ci_width=0.1)}
+        )
+
+    return
+
+
+def test_sample_failures_sweep_resume_seed(tmp_path: pathlib.Path):
+    circuit = stim.Circuit.generated(
+        code_task="repetition_code:memory",
+        distance=3,
+        rounds=3,
+        after_clifford_depolarization=0.05,
+    )
+    dem = circuit.detector_error_model()
+    tasks = {"a": dict(dem=dem, decoder=Matching, max_samples=2_000)}
+    file_name = tmp_path / "tmp_sweep.csv"
+
+    _ = sample_failures_sweep(
+        tasks, batch_size=500, file_name=file_name, seed=123, verbose=False
+    )
+    tasks["a"]["max_samples"] = 4_000
+    _ = sample_failures_sweep(
+        tasks, batch_size=500, file_name=file_name, seed=123, verbose=False
+    )
+
+    # the resumed batches are not a copy of the stored ones
+    with open(file_name, "r") as file:
+        batches = [line.split(",")[1] for line in file.readlines()[1:]]
+    assert len(batches) == 8
+    assert batches[:4] != batches[4:]
+
+    return
+
+
+def test_priority():
+    no_extra = {"seconds": 0}
+    target_task = dict(target_rel_ci_width=0.2, max_samples=10**9)
+    fixed_task = dict(max_samples=1_000)
+
+    # same normalization for tasks with and without target
+    target_priority = _priority(target_task, (100, 1_000, 1_000, no_extra), 0)
+    fixed_priority = _priority(fixed_task, (10, 900, 900, no_extra), 0)
+    assert target_priority is not None and fixed_priority is not None
+    assert target_priority > fixed_priority
+    fixed_priority = _priority(fixed_task, (10, 100, 100, no_extra), 0)
+    assert target_priority < fixed_priority
+
+    # tasks without failures have a finite priority, thus they do not
+    # take the workers from tasks with less progress
+    zero_priority = _priority(target_task, (0, 10**6, 10**6, no_extra), 0)
+    assert np.isfinite(zero_priority[0])
+    assert zero_priority < _priority(fixed_task, (0, 5, 5, no_extra), 0)
+    assert zero_priority > target_priority
+
+    # finished tasks
+    assert _priority(fixed_task, (10, 1_000, 1_000, no_extra), 0) is None
+    assert _priority(target_task, (10_000, 10**6, 10**6, no_extra), 0) is None
+
+    return